@@ -16,9 +16,17 @@
 """
 OpenStack Swift client library used internally
 """
+import errno
+import io
+import json
+import os
 import socket
 import requests
 import logging
+import random
+import select
+import ssl
+import tempfile
 import warnings
 
 from distutils.version import StrictVersion
@@ -26,6 +34,10 @@ from requests.exceptions import RequestException, SSLError
 from six.moves import http_client
 from six.moves.urllib.parse import quote as _quote, unquote
 from six.moves.urllib.parse import urljoin, urlparse, urlunparse
+from collections import OrderedDict
+from email.utils import mktime_tz, parsedate_tz
+from hashlib import md5, sha256
+from threading import Lock
 from time import sleep, time
 import six
 
@@ -43,6 +55,13 @@ AUTH_VERSIONS_V2 = ('2.0', '2', 2)
 AUTH_VERSIONS_V3 = ('3.0', '3', 3)
 USER_METADATA_TYPE = tuple('x-%s-meta-' % type_ for type_ in
                            ('container', 'account', 'object'))
+# Swift ignores the Range header of requests with more ranges than this
+DEFAULT_MAX_RANGES = 50
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
 
 try:
     from logging import NullHandler
@@ -259,6 +278,22 @@ class _ObjectBody(object):
     def read(self, length=None):
         return self.resp.read(length)
 
+    def readinto(self, buf):
+        """
+        Read up to ``len(buf)`` bytes into the writable buffer ``buf``,
+        without allocating a new bytes object when the response supports it.
+
+        :returns: the number of bytes read, which is 0 at the end of the body
+        """
+        readinto = getattr(self.resp, 'readinto', None)
+        if readinto is not None:
+            return readinto(buf)
+        data = self.resp.read(len(buf))
+        if isinstance(data, six.text_type):
+            data = data.encode('utf-8')
+        memoryview(buf)[:len(data)] = data
+        return len(data)
+
     def __iter__(self):
         return self
 
@@ -313,43 +348,217 @@ class _RetryBody(_ObjectBody):
         except (socket.error, RequestException):
             if self.conn.attempts > self.conn.retries:
                 raise
-        if (not buf and self.bytes_read < self.expected_length and
-                self.conn.attempts <= self.conn.retries):
-            self.headers['Range'] = 'bytes=%d-' % self.bytes_read
-            self.headers['If-Match'] = self.resp.getheader('ETag')
-            hdrs, body = self.conn._retry(None, get_object,
-                                          self.container, self.obj,
-                                          resp_chunk_size=self.chunk_size,
-                                          query_string=self.query_string,
-                                          response_dict=self.response_dict,
-                                          headers=self.headers,
-                                          attempts=self.conn.attempts)
-            expected_range = 'bytes %d-%d/%d' % (
-                self.bytes_read,
-                self.expected_length - 1,
-                self.expected_length)
-            if 'content-range' not in hdrs:
-                # Server didn't respond with partial content; manually seek
-                logger.warning('Received 200 while retrying %s/%s; seeking...',
-                               self.container, self.obj)
-                to_read = self.bytes_read
-                while to_read > 0:
-                    buf = body.resp.read(min(to_read, self.chunk_size))
-                    to_read -= len(buf)
-            elif hdrs['content-range'] != expected_range:
-                msg = ('Expected range "%s" while retrying %s/%s '
-                       'but got "%s"' % (expected_range, self.container,
-                                         self.obj, hdrs['content-range']))
-                raise ClientException(msg)
-            self.resp = body.resp
+        if not buf and self._can_resume():
+            self._resume()
             buf = self.read(length)
         return buf
 
+    def readinto(self, buf):
+        if not len(buf):
+            return 0
+        nbytes = 0
+        try:
+            nbytes = super(_RetryBody, self).readinto(buf)
+            self.bytes_read += nbytes
+        except (socket.error, RequestException):
+            if self.conn.attempts > self.conn.retries:
+                raise
+        if not nbytes and self._can_resume():
+            self._resume()
+            nbytes = self.readinto(buf)
+        return nbytes
+
+    def _can_resume(self):
+        return (self.bytes_read < self.expected_length and
+                self.conn.attempts <= self.conn.retries)
+
+    def _resume(self):
+        self.headers['Range'] = 'bytes=%d-' % self.bytes_read
+        self.headers['If-Match'] = self.resp.getheader('ETag')
+        hdrs, body = self.conn._retry(None, get_object,
+                                      self.container, self.obj,
+                                      resp_chunk_size=self.chunk_size,
+                                      query_string=self.query_string,
+                                      response_dict=self.response_dict,
+                                      headers=self.headers,
+                                      attempts=self.conn.attempts)
+        expected_range = 'bytes %d-%d/%d' % (
+            self.bytes_read,
+            self.expected_length - 1,
+            self.expected_length)
+        if 'content-range' not in hdrs:
+            # Server didn't respond with partial content; manually seek
+            logger.warning('Received 200 while retrying %s/%s; seeking...',
+                           self.container, self.obj)
+            to_read = self.bytes_read
+            while to_read > 0:
+                buf = body.resp.read(min(to_read, self.chunk_size))
+                to_read -= len(buf)
+        elif hdrs['content-range'] != expected_range:
+            msg = ('Expected range "%s" while retrying %s/%s '
+                   'but got "%s"' % (expected_range, self.container,
+                                     self.obj, hdrs['content-range']))
+            raise ClientException(msg)
+        self.resp = body.resp
+
+
+class _CachedObjectBody(_ObjectBody):
+    """
+    The body of an object read from an :class:`ObjectCache`, which is closed
+    once all of it has been read.
+    """
+
+    def read(self, length=None):
+        buf = self.resp.read(length)
+        if not buf or length is None or length < 0:
+            self.resp.close()
+        return buf
+
+    def readinto(self, buf):
+        nbytes = self.resp.readinto(buf)
+        if not nbytes:
+            self.resp.close()
+        return nbytes
+
+
+class _CacheFill(object):
+    """
+    Wraps the body of an object being downloaded, writing it to an
+    :class:`ObjectCache` as it is read.
+    """
+
+    def __init__(self, body, writer):
+        self.body = body
+        self.writer = writer
+
+    @property
+    def resp(self):
+        return self.body.resp
+
+    def read(self, length=None):
+        buf = self.body.read(length)
+        if buf:
+            self.writer.write(buf)
+        if not buf or length is None or length < 0:
+            self.writer.commit()
+        return buf
+
+    def readinto(self, buf):
+        nbytes = self.body.readinto(buf)
+        if nbytes:
+            self.writer.write(memoryview(buf)[:nbytes])
+        else:
+            self.writer.commit()
+        return nbytes
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        buf = self.read(self.body.chunk_size)
+        if not buf:
+            raise StopIteration()
+        return buf
+
+    def __next__(self):
+        return self.next()
+
+
+class _EndpointResponse(object):
+    """
+    Wraps the response of a streamed object GET made through an
+    :class:`EndpointPool`, so that its endpoint is only released once the
+    body has been read, or closed, or has failed to be read.
+    """
+
+    def __init__(self, resp, pool, url):
+        self.resp = resp
+        self._pool = pool
+        self._url = url
+
+    def _release(self, failed=False):
+        url, self._url = self._url, None
+        if url is not None:
+            self._pool.release(url, failed)
+
+    def read(self, length=None):
+        try:
+            buf = self.resp.read(length)
+        except Exception:
+            self._release(failed=True)
+            raise
+        if not buf or length is None or length < 0:
+            self._release()
+        return buf
+
+    def readinto(self, buf):
+        try:
+            nbytes = _ObjectBody(self.resp, None).readinto(buf)
+        except Exception:
+            self._release(failed=True)
+            raise
+        if not nbytes:
+            self._release()
+        return nbytes
+
+    def close(self):
+        self._release()
+        if hasattr(self.resp, 'close'):
+            self.resp.close()
+
+    def __getattr__(self, name):
+        return getattr(self.resp, name)
+
+
+class _ReplaySocket(object):
+    """
+    Stands in for the socket of a response whose status line has already
+    been read, so that an ``HTTPResponse`` can still parse all of it.
+    """
+    def __init__(self, line, fp):
+        self._line = line
+        self._fp = fp
+
+    def makefile(self, *args, **kwargs):
+        return self
+
+    def readline(self, *args):
+        if self._line is not None:
+            line, self._line = self._line, None
+            return line
+        return self._fp.readline(*args)
+
+    def __getattr__(self, name):
+        return getattr(self._fp, name)
+
+
+class _ReadResponse(object):
+    """
+    The raw side of a response read in full before its connection was
+    closed.
+    """
+    def __init__(self, resp, body):
+        self._resp = resp
+        self._body = io.BytesIO(body)
+
+    def getheader(self, name, default=None):
+        return self._resp.getheader(name, default)
+
+    def read(self, *args, **kwargs):
+        return self._body.read(*args)
+
+    def readinto(self, buf):
+        return self._body.readinto(buf)
+
+    def close(self):
+        self._body.close()
+
 
 class HTTPConnection(object):
     def __init__(self, url, proxy=None, cacert=None, insecure=False,
                  cert=None, cert_key=None, ssl_compression=False,
-                 default_user_agent=None, timeout=None):
+                 default_user_agent=None, timeout=None,
+                 expect_continue=None, host_header=None):
         """
         Make an HTTPConnection or HTTPSConnection
 
@@ -374,6 +583,16 @@ class HTTPConnection(object):
                                    a call to request().
         :param timeout: socket read timeout value, passed directly to
                         the requests library.
+        :param expect_continue: If set, PUTs from :func:`put_object` send
+                                ``Expect: 100-continue`` and wait up to this
+                                many seconds for the server to ask for the
+                                body before sending it, so that the body of
+                                a refused request isn't sent. These PUTs
+                                share a connection of their own, which is
+                                kept open between them. Not used through a
+                                proxy.
+        :param host_header: If set, the ``Host`` header to send with each
+                            request, rather than the host of ``url``.
         :raises ClientException: Unable to handle protocol scheme
         """
         self.url = url
@@ -416,6 +635,9 @@ class HTTPConnection(object):
         self.default_user_agent = default_user_agent
         if timeout:
             self.requests_args['timeout'] = timeout
+        self.expect_continue = expect_continue
+        self.host_header = host_header
+        self._continue_conn = None
 
     def _request(self, *arg, **kwarg):
         """Final wrapper before requests call, to be patched in tests"""
@@ -431,6 +653,8 @@ class HTTPConnection(object):
         # set a default User-Agent header if it wasn't passed in
         if 'user-agent' not in headers:
             headers['user-agent'] = self.default_user_agent
+        if self.host_header and 'host' not in headers:
+            headers['host'] = self.host_header
         url = "%s://%s%s" % (
             self.parsed_url.scheme,
             self.parsed_url.netloc,
@@ -446,8 +670,155 @@ class HTTPConnection(object):
         :param data: Use data generator for chunked-transfer
         :param files: Use files for default transfer
         """
+        if (self.expect_continue and data is not None and not files and
+                'proxies' not in self.requests_args and
+                not requests.utils.get_environ_proxies(self.url)):
+            return self._put_expecting_continue(full_path, data, headers)
         return self.request('PUT', full_path, data, headers, files)
 
+    def _put_expecting_continue(self, full_path, data, headers):
+        """
+        PUT ``data``, sending only the headers, with
+        ``Expect: 100-continue``, until the server asks for the body or
+        ``expect_continue`` seconds have passed. If the server responds
+        first, the body isn't sent.
+
+        The request is made on a connection of its own, outside the
+        requests session, which is kept for the next such request unless
+        the body wasn't sent or the server is closing it.
+        """
+        if headers is None:
+            headers = {}
+        else:
+            headers = encode_meta_headers(headers)
+        if 'user-agent' not in headers:
+            headers['user-agent'] = self.default_user_agent
+        if self.host_header and 'host' not in headers:
+            headers['host'] = self.host_header
+        chunked = not any(name.lower() == 'content-length'
+                          for name in headers)
+        has_host = any(name.lower() == 'host' for name in headers)
+        conn, self._continue_conn = self._continue_conn, None
+        if conn is None or self._is_dropped(conn):
+            if conn is not None:
+                conn.close()
+            conn = self._expect_continue_connection()
+        reuse = False
+        try:
+            conn.putrequest('PUT', full_path, skip_host=has_host,
+                            skip_accept_encoding=True)
+            for name, value in headers.items():
+                conn.putheader(name, value)
+            if chunked:
+                conn.putheader('Transfer-Encoding', 'chunked')
+            conn.putheader('Expect', '100-continue')
+            conn.endheaders()
+            raw = self._await_continue(conn)
+            sent = raw is None
+            if sent:
+                self._send_body(conn, data, chunked)
+                raw = conn.getresponse()
+            body = raw.read()
+            # A request whose body wasn't sent leaves the connection
+            # unusable
+            reuse = sent and not raw.will_close
+        except ssl.SSLError as err:
+            raise SSLError(err)
+        except http_client.HTTPException as err:
+            raise requests.exceptions.ConnectionError(err)
+        finally:
+            if reuse:
+                self._continue_conn = conn
+            else:
+                conn.close()
+
+        self.resp = requests.Response()
+        self.resp.status_code = raw.status
+        self.resp.reason = raw.reason
+        self.resp.headers = requests.structures.CaseInsensitiveDict(
+            raw.getheaders())
+        self.resp.raw = _ReadResponse(raw, body)
+        self.resp.url = "%s://%s%s" % (
+            self.parsed_url.scheme, self.parsed_url.netloc, full_path)
+        self.resp.request = requests.Request(
+            'PUT', self.resp.url, headers=headers).prepare()
+        return self.resp
+
+    def _expect_continue_connection(self):
+        timeout = self.requests_args.get('timeout')
+        if self.parsed_url.scheme == 'http':
+            return http_client.HTTPConnection(
+                self.parsed_url.hostname, self.port, timeout=timeout)
+        verify = self.requests_args['verify']
+        context = ssl.create_default_context(
+            cafile=verify if isinstance(verify, six.string_types)
+            else requests.certs.where())
+        if not verify:
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+        cert = self.requests_args.get('cert')
+        if isinstance(cert, tuple):
+            context.load_cert_chain(*cert)
+        elif cert:
+            context.load_cert_chain(cert)
+        return http_client.HTTPSConnection(
+            self.parsed_url.hostname, self.port, timeout=timeout,
+            context=context)
+
+    @staticmethod
+    def _is_dropped(conn):
+        # There's nothing to read from an idle connection unless the server
+        # has closed it
+        return (conn.sock is None or
+                bool(select.select([conn.sock], [], [], 0)[0]))
+
+    def close_expect_continue(self):
+        """Close the connection kept for ``Expect: 100-continue`` PUTs."""
+        conn, self._continue_conn = self._continue_conn, None
+        if conn is not None:
+            conn.close()
+
+    def _await_continue(self, conn):
+        """
+        Wait for the server to ask for the body of a request.
+
+        :returns: None if the body should be sent, or the response if the
+                  server has already responded.
+        """
+        if not select.select([conn.sock], [], [], self.expect_continue)[0]:
+            # Servers needn't support 100-continue, so send it anyway
+            return None
+        fp = conn.sock.makefile('rb')
+        line = fp.readline(65537)
+        if line.split(None, 2)[1:2] == [b'100']:
+            # Skip the headers of the interim response
+            while fp.readline(65537) not in (b'\r\n', b'\n', b''):
+                pass
+            fp.close()
+            return None
+        raw = conn.response_class(_ReplaySocket(line, fp), method='PUT')
+        raw.begin()
+        return raw
+
+    @staticmethod
+    def _send_body(conn, data, chunked):
+        if hasattr(data, 'read') and not chunked:
+            # A LengthWrapper, which returns '' once it's all been read
+            chunks = iter(lambda: data.read(65536) or b'', b'')
+        else:
+            chunks = data
+        for chunk in chunks:
+            if not chunk:
+                continue
+            if chunked:
+                conn.send(('%x\r\n' % len(chunk)).encode('ascii'))
+                conn.send(chunk)
+                conn.send(b'\r\n')
+            else:
+                conn.send(chunk)
+        if chunked:
+            conn.send(b'0\r\n\r\n')
+
     def getresponse(self):
         """Adapt requests response to httplib interface"""
         self.resp.status = self.resp.status_code
@@ -470,9 +841,16 @@ class HTTPConnection(object):
                 self.resp.close()
             return chunk
 
+        def releasing_readinto(buf):
+            nbytes = self.resp.raw.readinto(buf)
+            if not nbytes:
+                self.resp.close()
+            return nbytes
+
         self.resp.getheaders = getheaders
         self.resp.getheader = getheader
         self.resp.read = releasing_read
+        self.resp.readinto = releasing_readinto
 
         return self.resp
 
@@ -1128,7 +1506,8 @@ def delete_container(url, token, container, http_conn=None,
 
 def get_object(url, token, container, name, http_conn=None,
                resp_chunk_size=None, query_string=None,
-               response_dict=None, headers=None, service_token=None):
+               response_dict=None, headers=None, service_token=None,
+               object_cache=None):
     """
     Get an object
 
@@ -1148,6 +1527,11 @@ def get_object(url, token, container, name, http_conn=None,
     :param headers: an optional dictionary with additional headers to include
                     in the request
     :param service_token: service auth token
+    :param object_cache: an optional :class:`ObjectCache`. If the request
+                         can be cached, and the cache has a copy of the
+                         object that is still current, it is returned
+                         instead of the object being downloaded; otherwise
+                         the object is added to the cache as it is read.
     :returns: a tuple of (response headers, the object's contents) The response
               headers will be a dict and all header names will be lowercase.
     :raises ClientException: HTTP GET request failed
@@ -1161,32 +1545,322 @@ def get_object(url, token, container, name, http_conn=None,
         path += '?' + query_string
     method = 'GET'
     headers = headers.copy() if headers else {}
+    cached = None
+    if object_cache is not None and \
+            object_cache.cacheable(query_string, headers):
+        cache_key = object_cache.key(url, container, name)
+        cached = object_cache.lookup(cache_key)
+        if cached is not None:
+            headers['If-None-Match'] = cached[0]['etag']
+    else:
+        object_cache = None
     headers['X-Auth-Token'] = token
     if service_token:
         headers['X-Service-Token'] = service_token
-    conn.request(method, path, '', headers)
-    resp = conn.getresponse()
+    try:
+        conn.request(method, path, '', headers)
+        resp = conn.getresponse()
+    except Exception:
+        if cached is not None:
+            cached[1].close()
+        raise
 
     parsed_response = {}
     store_response(resp, parsed_response)
+    if object_cache is not None:
+        parsed_response['object_cache'] = 'miss'
+        if cached is not None and resp.status == 304:
+            parsed_response['object_cache'] = 'hit'
     if response_dict is not None:
         response_dict.update(parsed_response)
 
+    if cached is not None:
+        cached_headers, cached_fp = cached
+        if resp.status == 304:
+            resp.read()
+            http_log(('%s%s' % (url.replace(parsed.path, ''), path), method,),
+                     {'headers': headers}, resp, None)
+            object_cache.record_hit(cache_key)
+            object_body = _CachedObjectBody(cached_fp, resp_chunk_size)
+            if not resp_chunk_size:
+                object_body = object_body.read()
+            return dict(cached_headers), object_body
+        cached_fp.close()
+    if object_cache is not None:
+        object_cache.record_miss()
+
     if resp.status < 200 or resp.status >= 300:
         body = resp.read()
         http_log(('%s%s' % (url.replace(parsed.path, ''), path), method,),
                  {'headers': headers}, resp, body)
         raise ClientException.from_response(resp, 'Object GET failed', body)
+    writer = None
+    if object_cache is not None:
+        writer = object_cache.writer(cache_key, parsed_response['headers'])
     if resp_chunk_size:
         object_body = _ObjectBody(resp, resp_chunk_size)
+        if writer is not None:
+            object_body = _CacheFill(object_body, writer)
     else:
         object_body = resp.read()
+        if writer is not None:
+            writer.write(object_body)
+            writer.commit()
     http_log(('%s%s' % (url.replace(parsed.path, ''), path), method,),
              {'headers': headers}, resp, None)
 
     return parsed_response['headers'], object_body
 
 
+class _ResponseReader(object):
+    """
+    Buffered line and exact-length reads from a response.
+    """
+
+    def __init__(self, resp, chunk_size):
+        self.resp = resp
+        self.chunk_size = chunk_size
+        self.buf = b''
+
+    def _fill(self):
+        chunk = self.resp.read(self.chunk_size)
+        if not chunk:
+            return False
+        self.buf += chunk
+        return True
+
+    def readline(self):
+        while b'\n' not in self.buf:
+            if not self._fill():
+                line, self.buf = self.buf, b''
+                return line
+        line, self.buf = self.buf.split(b'\n', 1)
+        return line + b'\n'
+
+    def read(self, length=None):
+        """
+        Read ``length`` bytes, or fewer at the end of the response. Reads
+        everything that is left if ``length`` is None.
+        """
+        pieces = [self.buf]
+        have = len(self.buf)
+        while length is None or have < length:
+            chunk = self.resp.read(self.chunk_size)
+            if not chunk:
+                break
+            pieces.append(chunk)
+            have += len(chunk)
+        data = b''.join(pieces)
+        if length is None:
+            self.buf = b''
+            return data
+        self.buf = data[length:]
+        return data[:length]
+
+    def skip(self, length):
+        while length > 0:
+            if not self.buf and not self._fill():
+                return
+            skipped = min(length, len(self.buf))
+            self.buf = self.buf[skipped:]
+            length -= skipped
+
+
+def _parse_content_range(value):
+    if isinstance(value, six.binary_type):
+        value = value.decode('latin-1')
+    try:
+        unit, spec = value.strip().split(None, 1)
+        first_last, _length = spec.split('/', 1)
+        first, last = first_last.split('-', 1)
+        if unit.lower() != 'bytes':
+            raise ValueError(unit)
+        return int(first), int(last)
+    except ValueError:
+        raise ClientException('Invalid Content-Range: %r' % value)
+
+
+def _iter_byteranges(reader, boundary):
+    """
+    Parse a multipart/byteranges body, yielding ``(start, end, data)`` for
+    each part. Only one part is held in memory at a time.
+    """
+    delimiter = b'--' + boundary
+    terminator = delimiter + b'--'
+    line = reader.readline()
+    while line.strip() != delimiter:
+        if not line or line.strip() == terminator:
+            return
+        line = reader.readline()
+    while True:
+        headers = {}
+        line = reader.readline()
+        while line.strip():
+            key, _, value = line.partition(b':')
+            headers[key.strip().lower()] = value.strip()
+            line = reader.readline()
+        if b'content-range' not in headers:
+            raise ClientException(
+                'Missing Content-Range in multipart/byteranges part')
+        start, end = _parse_content_range(headers[b'content-range'])
+        data = reader.read(end - start + 1)
+        if len(data) != end - start + 1:
+            raise ClientException(
+                'Truncated multipart/byteranges part for bytes %d-%d' % (
+                    start, end))
+        yield start, end, data
+        line = reader.readline()
+        while line and not line.strip():
+            line = reader.readline()
+        if not line or line.strip() == terminator:
+            return
+        if line.strip() != delimiter:
+            raise ClientException(
+                'Invalid multipart/byteranges boundary: %r' % line)
+
+
+def _iter_body_ranges(reader, ranges):
+    """
+    Serve sorted ``ranges`` from a whole object body, for servers that
+    ignore the Range header. Bytes are only kept until every range that
+    needs them has been served.
+    """
+    buf = b''
+    buf_start = 0
+    for start, end in ranges:
+        if start > buf_start:
+            skip = start - buf_start
+            if skip > len(buf):
+                reader.skip(skip - len(buf))
+                buf = b''
+            else:
+                buf = buf[skip:]
+            buf_start = start
+        if end is None:
+            buf += reader.read()
+        elif end >= buf_start + len(buf):
+            buf += reader.read(end + 1 - buf_start - len(buf))
+        data = buf[start - buf_start:None if end is None else
+                   end + 1 - buf_start]
+        if data:
+            yield start, start + len(data) - 1, data
+
+
+def _multipart_boundary(content_type):
+    media_type, _, params = content_type.partition(';')
+    if media_type.strip().lower() != 'multipart/byteranges':
+        return None
+    for param in params.split(';'):
+        key, _, value = param.strip().partition('=')
+        if key.strip().lower() == 'boundary':
+            return value.strip().strip('"').encode('latin-1')
+    raise ClientException('Missing boundary in %r' % content_type)
+
+
+def _range_header(ranges):
+    return 'bytes=' + ','.join(
+        '%d-' % start if end is None else '%d-%d' % (start, end)
+        for start, end in ranges)
+
+
+def _range_groups(ranges, max_ranges):
+    ranges = sorted((int(start), None if end is None else int(end))
+                    for start, end in ranges)
+    if not ranges:
+        raise ValueError('At least one range is required')
+    for start, end in ranges:
+        if start < 0 or (end is not None and end < start):
+            raise ValueError('Invalid range %r' % ((start, end),))
+    if max_ranges < 1:
+        raise ValueError('max_ranges should be a positive integer')
+    return [ranges[i:i + max_ranges]
+            for i in range(0, len(ranges), max_ranges)]
+
+
+def get_object_ranges(url, token, container, name, ranges, http_conn=None,
+                      query_string=None, response_dict=None, headers=None,
+                      service_token=None, max_ranges=DEFAULT_MAX_RANGES,
+                      resp_chunk_size=65536):
+    """
+    Get several byte ranges of an object with multi-range requests
+
+    :param url: storage URL
+    :param token: auth token
+    :param container: container name that the object is in
+    :param name: object name to get
+    :param ranges: a list of ``(start, end)`` byte offsets; ``end`` is
+                   included and may be None to read to the end of the object
+    :param http_conn: a tuple of (parsed url, HTTPConnection object),
+                      (If None, it will create the conn object)
+    :param query_string: if set will be appended with '?' to generated path
+    :param response_dict: an optional dictionary into which to place
+                     the response - status, reason and headers - of the
+                     first request
+    :param headers: an optional dictionary with additional headers to include
+                    in the request
+    :param service_token: service auth token
+    :param max_ranges: the most ranges to ask for in one request; more
+                       ranges are split across several requests
+    :param resp_chunk_size: the number of bytes to read from the response
+                            at a time
+    :returns: a tuple of (response headers of the first request, an iterator
+              of ``(start, end, data)`` tuples). The parts are in order of
+              their start offset, and you must finish iterating over them
+              before making another request with ``http_conn``.
+    :raises ClientException: HTTP GET request failed
+    :raises ValueError: a range is invalid
+    """
+    groups = _range_groups(ranges, max_ranges)
+    if not http_conn:
+        http_conn = http_connection(url)
+    kwargs = dict(http_conn=http_conn, query_string=query_string,
+                  headers=headers, service_token=service_token,
+                  resp_chunk_size=resp_chunk_size)
+    rheaders, parts = _get_object_range_group(
+        url, token, container, name, groups[0],
+        response_dict=response_dict, **kwargs)
+
+    def iter_parts():
+        for part in parts:
+            yield part
+        for group in groups[1:]:
+            _rheaders, more_parts = _get_object_range_group(
+                url, token, container, name, group, **kwargs)
+            for part in more_parts:
+                yield part
+    return rheaders, iter_parts()
+
+
+def _get_object_range_group(url, token, container, name, ranges, http_conn,
+                            query_string=None, response_dict=None,
+                            headers=None, service_token=None,
+                            resp_chunk_size=65536):
+    headers = dict(headers or {})
+    headers['Range'] = _range_header(ranges)
+    rheaders, body = get_object(
+        url, token, container, name, http_conn=http_conn,
+        resp_chunk_size=resp_chunk_size, query_string=query_string,
+        response_dict=response_dict, headers=headers,
+        service_token=service_token)
+    reader = _ResponseReader(body.resp, resp_chunk_size)
+    boundary = _multipart_boundary(rheaders.get('content-type', ''))
+    if boundary is not None:
+        parts = _iter_byteranges(reader, boundary)
+    elif 'content-range' in rheaders:
+        # A single range, or several that the server coalesced into one
+        start, end = _parse_content_range(rheaders['content-range'])
+        parts = _iter_body_ranges(
+            reader, [(max(r_start, start) - start,
+                      None if r_end is None else min(r_end, end) - start)
+                     for r_start, r_end in ranges
+                     if r_start <= end and (r_end is None or r_end >= start)])
+        parts = ((p_start + start, p_end + start, data)
+                 for p_start, p_end, data in parts)
+    else:
+        parts = _iter_body_ranges(reader, ranges)
+    return rheaders, parts
+
+
 def head_object(url, token, container, name, http_conn=None,
                 service_token=None, headers=None):
     """
@@ -1519,6 +2193,636 @@ def get_capabilities(http_conn):
     return parse_api_response(resp_headers, body)
 
 
+def _retry_after(err):
+    """
+    Return the delay in seconds requested by a Retry-After header in the
+    response that caused ``err``, or None.
+    """
+    headers = getattr(err, 'http_response_headers', None) or {}
+    for header, value in headers.items():
+        if header.lower() == 'retry-after':
+            break
+    else:
+        return None
+    try:
+        return max(float(value), 0)
+    except (TypeError, ValueError):
+        pass
+    parsed = parsedate_tz(value)
+    if parsed is None:
+        return None
+    return max(mktime_tz(parsed) - time(), 0)
+
+
+class _SharedState(object):
+    """
+    Mixin for state that is shared between connections. Copies of the
+    options that hold it (e.g. a :class:`~swiftclient.service.SwiftService`'s
+    options, which are deep-copied for each connection) share it too, rather
+    than copying it.
+    """
+    def __deepcopy__(self, memo):
+        return self
+
+
+class RetryBudget(object):
+    """
+    A limit on the rate of retries, which may be shared between connections.
+
+    Each successful request adds ``ratio`` tokens to the budget, up to
+    ``max_tokens``, and each retry spends a whole token; when the budget is
+    empty requests fail without being retried. The budget starts with
+    ``reserve`` tokens so that occasional errors can always be retried.
+    """
+    def __init__(self, ratio=0.1, reserve=10, max_tokens=100):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self._tokens = float(min(reserve, max_tokens))
+        self._lock = Lock()
+
+    def deposit(self):
+        with self._lock:
+            self._tokens = min(self._tokens + self.ratio, self.max_tokens)
+
+    def withdraw(self):
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+class RetryPolicy(_SharedState):
+    """
+    Decides whether and when a failed :class:`Connection` request is retried.
+
+    A single policy may be shared between many connections, e.g. by all of
+    the connections used by a :class:`~swiftclient.service.SwiftService`, in
+    which case its ``budget`` limits the rate of retries across all of them.
+
+    :param starting_backoff: initial delay between retries (seconds)
+    :param max_backoff: maximum delay between retries (seconds)
+    :param jitter: None for plain exponential backoff, ``'full'`` to pick
+                   each delay at random between zero and the exponential
+                   backoff, or ``'decorrelated'`` to pick each delay at
+                   random between ``starting_backoff`` and three times the
+                   previous delay.
+    :param retry_on_ratelimit: retry 498 (rate limited) responses.
+    :param respect_retry_after: wait at least as long as a response's
+                                Retry-After header asks, up to
+                                ``max_backoff``.
+    :param status_rules: a dict mapping HTTP status codes to True (retry) or
+                         False (fail immediately), overriding the default of
+                         retrying 408 and 5xx responses.
+    :param method_rules: a dict mapping :class:`Connection` method names,
+                         e.g. ``'put_object'``, to the maximum number of
+                         times that requests made by that method are
+                         retried.
+    :param budget: an optional :class:`RetryBudget`.
+    """
+    FULL_JITTER = 'full'
+    DECORRELATED_JITTER = 'decorrelated'
+
+    def __init__(self, starting_backoff=1, max_backoff=64, jitter=None,
+                 retry_on_ratelimit=False, respect_retry_after=True,
+                 status_rules=None, method_rules=None, budget=None):
+        if jitter not in (None, self.FULL_JITTER, self.DECORRELATED_JITTER):
+            raise ValueError('Unknown retry jitter: %r' % (jitter,))
+        self.starting_backoff = starting_backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.retry_on_ratelimit = retry_on_ratelimit
+        self.respect_retry_after = respect_retry_after
+        self.status_rules = dict(status_rules or {})
+        self.method_rules = dict(method_rules or {})
+        self.budget = budget
+
+    def retry_status(self, status):
+        """
+        Return True if a request that failed with HTTP ``status`` may be
+        retried.
+        """
+        if status in self.status_rules:
+            return self.status_rules[status]
+        if status == 408 or 500 <= status <= 599:
+            return True
+        return self.retry_on_ratelimit and status == 498
+
+    def allow_retry(self, method, retries):
+        """
+        Return True if the request may be retried, given the name of the
+        :class:`Connection` method that made it and the number of times that
+        it has already been retried.
+        """
+        if retries >= self.method_rules.get(method, retries + 1):
+            return False
+        if self.budget is not None:
+            return self.budget.withdraw()
+        return True
+
+    def record_success(self):
+        if self.budget is not None:
+            self.budget.deposit()
+
+    def backoff(self, retries, previous=None, err=None):
+        """
+        Return the delay in seconds before the next retry.
+
+        :param retries: the number of retries made so far.
+        :param previous: the delay before the previous retry, if any.
+        :param err: the exception that caused the retry, if any.
+        """
+        if self.jitter == self.DECORRELATED_JITTER:
+            delay = random.uniform(
+                self.starting_backoff,
+                (previous or self.starting_backoff) * 3)
+        else:
+            delay = self.starting_backoff * 2 ** retries
+            if self.jitter == self.FULL_JITTER:
+                delay = random.uniform(
+                    0, min(delay, self.max_backoff))
+        delay = min(delay, self.max_backoff)
+        if self.respect_retry_after and err is not None:
+            retry_after = _retry_after(err)
+            if retry_after is not None:
+                delay = max(delay, min(retry_after, self.max_backoff))
+        return delay
+
+
+class CircuitBreaker(_SharedState):
+    """
+    Makes requests to a failing endpoint fail fast rather than be retried.
+
+    A single breaker may be shared between many connections, and tracks
+    each endpoint (the host and port of a connection's storage URL)
+    separately. After ``failure_threshold`` consecutive connection errors or
+    5xx responses from an endpoint its circuit opens, and requests to it
+    fail immediately. Once ``reset_timeout`` seconds have passed the circuit
+    is half-open: a single probe request is allowed through every
+    ``probe_interval`` seconds, and the circuit closes again as soon as one
+    succeeds, or re-opens if one fails.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30,
+                 probe_interval=1):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.probe_interval = probe_interval
+        self._endpoints = {}
+        self._lock = Lock()
+
+    def _state(self, endpoint, now):
+        ep = self._endpoints.get(endpoint)
+        if ep is None or ep['opened_at'] is None:
+            return self.CLOSED
+        if now < ep['opened_at'] + self.reset_timeout:
+            return self.OPEN
+        return self.HALF_OPEN
+
+    def state(self, endpoint):
+        with self._lock:
+            return self._state(endpoint, time())
+
+    def before_request(self, endpoint):
+        """
+        Check that a request may be made to ``endpoint``.
+
+        :raises ClientException: the endpoint's circuit is open, or is
+                                 half-open and a probe was made recently.
+        """
+        with self._lock:
+            now = time()
+            state = self._state(endpoint, now)
+            if state == self.CLOSED:
+                return
+            ep = self._endpoints[endpoint]
+            if state == self.HALF_OPEN and now >= ep['next_probe']:
+                ep['next_probe'] = now + self.probe_interval
+                return
+        raise ClientException('Circuit breaker %s for %s' % (state, endpoint))
+
+    def record_success(self, endpoint):
+        with self._lock:
+            ep = self._endpoints.pop(endpoint, None)
+        if ep is not None and ep['opened_at'] is not None:
+            logger.info('Circuit breaker closed for %s', endpoint)
+
+    def record_failure(self, endpoint):
+        with self._lock:
+            now = time()
+            state = self._state(endpoint, now)
+            ep = self._endpoints.setdefault(
+                endpoint, {'failures': 0, 'opened_at': None, 'next_probe': 0})
+            ep['failures'] += 1
+            if (state == self.CLOSED and
+                    ep['failures'] < self.failure_threshold):
+                return
+            ep['opened_at'] = now
+        if state != self.OPEN:
+            logger.info('Circuit breaker opened for %s after %d failures',
+                        endpoint, ep['failures'])
+
+
+class EndpointPool(_SharedState):
+    """
+    Spreads the requests of the connections sharing it over several proxy
+    endpoints for the same account.
+
+    ``endpoints`` are the base URLs of the proxies, such as
+    ``https://proxy1:8080``, each of which can stand in for the scheme, host
+    and port of a connection's storage URL; any path is ignored. With
+    ``resolve``, every address (A and AAAA record) that the storage URL's
+    host name resolves to is an endpoint too; addresses are looked up again
+    every ``resolve_ttl`` seconds. Only ``http`` storage URLs are resolved,
+    as the certificate of an ``https`` endpoint is checked against its host
+    name. Requests to resolved addresses still have the storage URL's host
+    as their ``Host``.
+
+    A request holds its endpoint until its response has been received, or
+    for streamed object downloads, until the body has been read or closed.
+
+    Each request goes to the endpoint with the fewest outstanding requests
+    (``'least-outstanding'``), or to each endpoint in turn
+    (``'round-robin'``). An endpoint that fails ``eject_threshold`` requests
+    in a row, with connection errors or 5xx responses, is left out for
+    ``eject_time`` seconds, and is ejected again if the first request after
+    that fails too. If every endpoint has been ejected, the one due back
+    soonest is used.
+    """
+    LEAST_OUTSTANDING = 'least-outstanding'
+    ROUND_ROBIN = 'round-robin'
+    STRATEGIES = (LEAST_OUTSTANDING, ROUND_ROBIN)
+
+    def __init__(self, endpoints=None, strategy=LEAST_OUTSTANDING,
+                 resolve=False, eject_threshold=3, eject_time=30,
+                 resolve_ttl=300):
+        if strategy not in self.STRATEGIES:
+            raise ValueError('strategy should be one of: %s'
+                             % ', '.join(self.STRATEGIES))
+        self.endpoints = []
+        for endpoint in endpoints or ():
+            parsed = urlparse(endpoint)
+            if parsed.scheme not in ('http', 'https') or not parsed.netloc:
+                raise ValueError('Invalid endpoint: %r' % (endpoint,))
+            endpoint = self._base(parsed)
+            if endpoint not in self.endpoints:
+                self.endpoints.append(endpoint)
+        self.strategy = strategy
+        self.resolve = resolve
+        self.eject_threshold = eject_threshold
+        self.eject_time = eject_time
+        self.resolve_ttl = resolve_ttl
+        self._endpoints = {}
+        self._resolved = {}
+        self._next = 0
+        self._lock = Lock()
+
+    @staticmethod
+    def _base(parsed):
+        # The key of an endpoint, as given and as found in request URLs
+        return '%s://%s' % (parsed.scheme.lower(), parsed.netloc.lower())
+
+    def _resolve(self, parsed):
+        port = parsed.port or 80
+        try:
+            addresses = socket.getaddrinfo(parsed.hostname, port, 0,
+                                           socket.SOCK_STREAM)
+        except socket.gaierror as err:
+            logger.warning('Unable to resolve %s: %s', parsed.hostname, err)
+            return []
+        endpoints = []
+        for family, _type, _proto, _name, sockaddr in addresses:
+            host = sockaddr[0]
+            if family == socket.AF_INET6:
+                host = '[%s]' % host
+            endpoint = 'http://%s:%d' % (host, port)
+            if endpoint not in endpoints:
+                endpoints.append(endpoint)
+        return endpoints
+
+    def _candidates(self, parsed):
+        endpoints = list(self.endpoints)
+        if self.resolve and parsed.scheme == 'http':
+            expires, resolved = self._resolved.get(parsed.netloc, (0, None))
+            if expires <= time():
+                resolved = self._resolve(parsed)
+                self._resolved[parsed.netloc] = (
+                    time() + self.resolve_ttl, resolved)
+            endpoints.extend(e for e in resolved if e not in endpoints)
+        return endpoints or [self._base(parsed)]
+
+    def _endpoint(self, endpoint):
+        return self._endpoints.setdefault(endpoint, {
+            'outstanding': 0, 'failures': 0, 'ejected_until': 0})
+
+    def acquire(self, url):
+        """
+        Choose an endpoint for a request to ``url``, a storage URL.
+
+        :returns: ``url`` on the chosen endpoint, which must be passed to
+                  :meth:`release` once the request has been made.
+        """
+        parsed = urlparse(url)
+        candidates = self._candidates(parsed)
+        with self._lock:
+            now = time()
+            states = [(e, self._endpoint(e)) for e in candidates]
+            healthy = [(e, state) for e, state in states
+                       if state['ejected_until'] <= now]
+            if not healthy:
+                healthy = [min(states, key=lambda s: s[1]['ejected_until'])]
+            # Start from the next endpoint in turn, which also breaks ties
+            start = self._next % len(healthy)
+            self._next += 1
+            healthy = healthy[start:] + healthy[:start]
+            if self.strategy == self.LEAST_OUTSTANDING:
+                endpoint, state = min(healthy,
+                                      key=lambda s: s[1]['outstanding'])
+            else:
+                endpoint, state = healthy[0]
+            state['outstanding'] += 1
+        return endpoint + urlunparse(('', '') + tuple(parsed[2:]))
+
+    def release(self, url, failed=False):
+        """
+        Record the end of a request to ``url``, as returned by
+        :meth:`acquire`, and whether its endpoint failed it.
+        """
+        endpoint = self._base(urlparse(url))
+        with self._lock:
+            state = self._endpoint(endpoint)
+            state['outstanding'] = max(0, state['outstanding'] - 1)
+            if not failed:
+                state['failures'] = 0
+                return
+            state['failures'] += 1
+            if state['failures'] < self.eject_threshold:
+                return
+            state['ejected_until'] = time() + self.eject_time
+        logger.info('Ejected %s for %ss after %d failures', endpoint,
+                    self.eject_time, state['failures'])
+
+    def host_header(self, url, pool_url):
+        """
+        :returns: The ``Host`` header for a request to ``url``, a storage
+                  URL, that :meth:`acquire` sent to ``pool_url``: the host of
+                  ``url`` if ``pool_url`` is one of its resolved addresses,
+                  and otherwise None.
+        """
+        parsed = urlparse(url)
+        endpoint = self._base(urlparse(pool_url))
+        if endpoint in self.endpoints or endpoint == self._base(parsed):
+            return None
+        return parsed.netloc
+
+    def ejected(self):
+        """
+        :returns: The endpoints currently left out after failing.
+        """
+        with self._lock:
+            now = time()
+            return sorted(endpoint for endpoint, state in
+                          self._endpoints.items()
+                          if state['ejected_until'] > now)
+
+
+class ObjectCache(_SharedState):
+    """
+    A read-through cache of object bodies on local disk, which may be shared
+    between connections, and between processes using the same directory.
+
+    Objects are cached by account, container and name, along with their
+    headers. A :class:`Connection` with a cache sends the etag of its cached
+    copy of an object as ``If-None-Match``, and on a 304 response returns
+    the cached copy rather than downloading the object again. Range and
+    conditional requests, and requests with a query string, are not cached.
+
+    Each object is written to a temporary file, which is renamed into place
+    once the whole object has been downloaded and checked, so a partial copy
+    is never read. Once the cache holds more than ``max_size`` bytes, the
+    least recently used objects are removed until it is back under 90% of
+    ``max_size``, holding a lock file (where ``fcntl`` is available) so that
+    only one process evicts at a time. Each process estimates the size of
+    the cache from what it has added, so the cache may grow somewhat past
+    ``max_size`` while several processes fill it.
+
+    ``hits`` and ``misses`` count the cacheable requests made through this
+    instance, and each request's response dict has an ``object_cache`` of
+    ``'hit'`` or ``'miss'``.
+    """
+    # Temporary files of downloads that were never finished are removed
+    # when they are this old
+    STALE_TEMP_AGE = 3600
+
+    def __init__(self, path, max_size=2 ** 30):
+        self.path = path
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._objects_dir = os.path.join(path, 'objects')
+        self._temp_dir = os.path.join(path, 'tmp')
+        self._size = None
+        self._lock = Lock()
+        for dirpath in (self._objects_dir, self._temp_dir):
+            try:
+                os.makedirs(dirpath)
+            except OSError as err:
+                if err.errno != errno.EEXIST:
+                    raise
+
+    @staticmethod
+    def cacheable(query_string=None, headers=None):
+        """
+        Return True if an object GET with this query string and these
+        headers may be served from the cache.
+        """
+        if query_string:
+            return False
+        return not any(
+            k.lower() == 'range' or k.lower().startswith('if-')
+            for k in (headers or {}))
+
+    @staticmethod
+    def key(url, container, name):
+        account = urlparse(url).path.rstrip('/')
+        return sha256(json.dumps(
+            [account, container, name]).encode('utf-8')).hexdigest()
+
+    def _object_path(self, key):
+        return os.path.join(self._objects_dir, key[:2], key)
+
+    def lookup(self, key):
+        """
+        Return the cached copy of an object as a tuple of its headers and an
+        open file positioned at the start of its body, or None.
+        """
+        try:
+            fp = open(self._object_path(key), 'rb')
+        except IOError as err:
+            if err.errno != errno.ENOENT:
+                raise
+            return None
+        try:
+            headers = json.loads(fp.readline().decode('utf-8'))
+        except ValueError:
+            fp.close()
+            return None
+        return headers, fp
+
+    def record_hit(self, key):
+        with self._lock:
+            self.hits += 1
+        try:
+            # Mark it as recently used
+            os.utime(self._object_path(key), None)
+        except OSError:
+            pass  # it has just been evicted
+
+    def record_miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def writer(self, key, headers):
+        """
+        Return a :class:`_CacheWriter` to add an object with these headers
+        to the cache, or None if it can't be cached.
+        """
+        try:
+            size = int(headers['content-length'])
+        except (KeyError, ValueError):
+            return None
+        if 'etag' not in headers or size > self.max_size:
+            return None
+        try:
+            return _CacheWriter(self, key, headers, size)
+        except (IOError, OSError) as err:
+            logger.warning('Unable to cache object: %s', err)
+            return None
+
+    def _add(self, key, temp_path, size):
+        path = self._object_path(key)
+        try:
+            os.makedirs(os.path.dirname(path))
+        except OSError as err:
+            if err.errno != errno.EEXIST:
+                raise
+        # Atomically replaces any older copy
+        getattr(os, 'replace', os.rename)(temp_path, path)
+        with self._lock:
+            if self._size is not None:
+                self._size += size
+            evict = self._size is None or self._size > self.max_size
+        if evict:
+            self.evict()
+
+    def evict(self):
+        """
+        Remove the least recently used objects until the cache is under 90%
+        of ``max_size``, and any stale temporary files.
+        """
+        with open(os.path.join(self.path, 'lock'), 'a') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            now = time()
+            for name in os.listdir(self._temp_dir):
+                temp_path = os.path.join(self._temp_dir, name)
+                try:
+                    if os.stat(temp_path).st_mtime < \
+                            now - self.STALE_TEMP_AGE:
+                        os.unlink(temp_path)
+                except OSError:
+                    pass
+            entries = []
+            for dirpath, _dirs, names in os.walk(self._objects_dir):
+                for name in names:
+                    path = os.path.join(dirpath, name)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    entries.append((st.st_mtime, st.st_size, path))
+            size = sum(entry[1] for entry in entries)
+            if size > self.max_size:
+                entries.sort()
+                for _mtime, entry_size, path in entries:
+                    if size <= 0.9 * self.max_size:
+                        break
+                    try:
+                        os.unlink(path)
+                    except OSError:
+                        continue
+                    size -= entry_size
+        with self._lock:
+            self._size = size
+
+
+class _CacheWriter(object):
+    """
+    Writes a downloaded object to a temporary file in an
+    :class:`ObjectCache`, which is added to the cache once all of the object
+    has been written and its length and md5 match its headers.
+    """
+    def __init__(self, cache, key, headers, size):
+        self.cache = cache
+        self.key = key
+        self.size = size
+        self.written = 0
+        fd, self.temp_path = tempfile.mkstemp(dir=cache._temp_dir)
+        self.fp = os.fdopen(fd, 'wb')
+        header_line = json.dumps(headers).encode('utf-8') + b'\n'
+        self.fp.write(header_line)
+        self.header_size = len(header_line)
+        self.expected_md5 = headers['etag'].strip('"')
+        if 'x-object-manifest' in headers or \
+                'x-static-large-object' in headers:
+            # The etag isn't the md5 of the body
+            self.md5 = None
+        else:
+            self.md5 = md5()
+
+    def write(self, data):
+        if self.fp is None:
+            return
+        try:
+            self.fp.write(data)
+        except (IOError, OSError) as err:
+            logger.warning('Unable to cache object: %s', err)
+            self.discard()
+            return
+        if self.md5 is not None:
+            self.md5.update(data)
+        self.written += len(data)
+
+    def commit(self):
+        if self.fp is None:
+            return
+        if self.written != self.size or (
+                self.md5 is not None and
+                self.md5.hexdigest() != self.expected_md5):
+            self.discard()
+            return
+        try:
+            self.fp.close()
+            self.fp = None
+            self.cache._add(self.key, self.temp_path,
+                            self.header_size + self.size)
+        except (IOError, OSError) as err:
+            logger.warning('Unable to cache object: %s', err)
+            self.discard()
+
+    def discard(self):
+        if self.fp is not None:
+            self.fp.close()
+            self.fp = None
+        try:
+            os.unlink(self.temp_path)
+        except OSError:
+            pass
+
+
 class Connection(object):
 
     """
@@ -1540,7 +2844,9 @@ class Connection(object):
                  os_options=None, auth_version="1", cacert=None,
                  insecure=False, cert=None, cert_key=None,
                  ssl_compression=True, retry_on_ratelimit=False,
-                 timeout=None, session=None):
+                 timeout=None, session=None, retry_policy=None,
+                 circuit_breaker=None, object_cache=None,
+                 expect_continue=None, endpoint_pool=None):
         """
         :param authurl: authentication URL
         :param user: user name to authenticate as
@@ -1576,6 +2882,23 @@ class Connection(object):
                                    after a backoff.
         :param timeout: The connect timeout for the HTTP connection.
         :param session: A keystoneauth session object.
+        :param retry_policy: A :class:`RetryPolicy` to decide whether and
+                             when to retry failed requests. If given,
+                             starting_backoff, max_backoff and
+                             retry_on_ratelimit are ignored. The
+                             connection's attributes of those names are
+                             those of its retry policy.
+        :param circuit_breaker: An optional :class:`CircuitBreaker`. If
+                                given, the state of the storage URL's
+                                circuit is added to response dicts as
+                                ``circuit_state``.
+        :param object_cache: An optional :class:`ObjectCache` for
+                             :meth:`get_object` to read objects through.
+        :param expect_continue: If set, object PUTs wait up to this many
+                                seconds for a ``100 Continue`` before sending
+                                the body; see :class:`HTTPConnection`.
+        :param endpoint_pool: An optional :class:`EndpointPool` to choose
+                              the proxy endpoint of each request from.
         """
         self.session = session
         self.authurl = authurl
@@ -1585,8 +2908,6 @@ class Connection(object):
         self.http_conn = None
         self.attempts = 0
         self.snet = snet
-        self.starting_backoff = starting_backoff
-        self.max_backoff = max_backoff
         self.auth_version = auth_version
         self.os_options = dict(os_options or {})
         if tenant_name:
@@ -1606,18 +2927,54 @@ class Connection(object):
         self.cert_key = cert_key
         self.ssl_compression = ssl_compression
         self.auth_end_time = 0
-        self.retry_on_ratelimit = retry_on_ratelimit
         self.timeout = timeout
+        self.retry_policy = retry_policy or RetryPolicy(
+            starting_backoff=starting_backoff, max_backoff=max_backoff,
+            retry_on_ratelimit=retry_on_ratelimit)
+        self.circuit_breaker = circuit_breaker
+        self.object_cache = object_cache
+        self.expect_continue = expect_continue
+        self.endpoint_pool = endpoint_pool
+        # The connections to each of the endpoint pool's endpoints
+        self._pool_conns = {}
+
+    @property
+    def starting_backoff(self):
+        return self.retry_policy.starting_backoff
+
+    @starting_backoff.setter
+    def starting_backoff(self, value):
+        self.retry_policy.starting_backoff = value
+
+    @property
+    def max_backoff(self):
+        return self.retry_policy.max_backoff
+
+    @max_backoff.setter
+    def max_backoff(self, value):
+        self.retry_policy.max_backoff = value
+
+    @property
+    def retry_on_ratelimit(self):
+        return self.retry_policy.retry_on_ratelimit
+
+    @retry_on_ratelimit.setter
+    def retry_on_ratelimit(self, value):
+        self.retry_policy.retry_on_ratelimit = value
 
     def close(self):
-        if (self.http_conn and isinstance(self.http_conn, tuple)
-                and len(self.http_conn) > 1):
-            conn = self.http_conn[1]
-            if hasattr(conn, 'close') and callable(conn.close):
-                # XXX: Our HTTPConnection object has no close, should be
-                # trying to close the requests.Session here?
-                conn.close()
-                self.http_conn = None
+        for http_conn in [self.http_conn] + list(self._pool_conns.values()):
+            if (http_conn and isinstance(http_conn, tuple)
+                    and len(http_conn) > 1):
+                conn = http_conn[1]
+                if isinstance(conn, HTTPConnection):
+                    conn.close_expect_continue()
+                if hasattr(conn, 'close') and callable(conn.close):
+                    # XXX: Our HTTPConnection object has no close, should be
+                    # trying to close the requests.Session here?
+                    conn.close()
+                    self.http_conn = None
+        self._pool_conns.clear()
 
     def get_auth(self):
         self.url, self.token = get_auth(self.authurl, self.user, self.key,
@@ -1649,14 +3006,19 @@ class Connection(object):
                         insecure=self.insecure,
                         timeout=self.timeout)
 
-    def http_connection(self, url=None):
+    def http_connection(self, url=None, host_header=None):
+        kwargs = {}
+        if self.expect_continue:
+            kwargs['expect_continue'] = self.expect_continue
+        if host_header:
+            kwargs['host_header'] = host_header
         return http_connection(url if url else self.url,
                                cacert=self.cacert,
                                insecure=self.insecure,
                                cert=self.cert,
                                cert_key=self.cert_key,
                                ssl_compression=self.ssl_compression,
-                               timeout=self.timeout)
+                               timeout=self.timeout, **kwargs)
 
     def _add_response_dict(self, target_dict, kwargs):
         if target_dict is not None and 'response_dict' in kwargs:
@@ -1666,39 +3028,95 @@ class Connection(object):
             else:
                 target_dict['response_dicts'] = [response_dict]
             target_dict.update(response_dict)
+        if target_dict is not None and self.circuit_breaker and self.url:
+            target_dict['circuit_state'] = self.circuit_breaker.state(
+                urlparse(self.url).netloc)
+
+    @staticmethod
+    def _streamed_body(rv):
+        if not (isinstance(rv, tuple) and len(rv) == 2):
+            return False
+        return isinstance(rv[1], _CacheFill) or (
+            isinstance(rv[1], _ObjectBody) and
+            not isinstance(rv[1], _CachedObjectBody))
 
     def _retry(self, reset_func, func, *args, **kwargs):
         retried_auth = False
-        backoff = self.starting_backoff
+        policy = self.retry_policy
+        breaker = self.circuit_breaker
+        pool = self.endpoint_pool
+        method = getattr(func, '__name__', None)
+        backoff = None
+        retries = 0
         caller_response_dict = kwargs.pop('response_dict', None)
         self.attempts = kwargs.pop('attempts', 0)
         while self.attempts <= self.retries or retried_auth:
             self.attempts += 1
+            err = None
+            endpoint = None
+            pool_url = None
+            pool_failed = True
             try:
                 if not self.url or not self.token:
                     self.url, self.token = self.get_auth()
                     self.http_conn = None
+                    self._pool_conns.clear()
                 if self.service_auth and not self.service_token:
                     self.url, self.service_token = self.get_service_auth()
                     self.http_conn = None
+                    self._pool_conns.clear()
                 self.auth_end_time = time()
+                url = self.url
+                if pool:
+                    url = pool_url = pool.acquire(self.url)
+                    self.http_conn = self._pool_conns.get(url)
+                if breaker:
+                    endpoint = urlparse(url).netloc
+                    breaker.before_request(endpoint)
                 if not self.http_conn:
-                    self.http_conn = self.http_connection()
+                    host_header = None
+                    if pool:
+                        host_header = pool.host_header(self.url, url)
+                    self.http_conn = self.http_connection(url, host_header)
+                    if pool:
+                        self._pool_conns[url] = self.http_conn
                 kwargs['http_conn'] = self.http_conn
                 if caller_response_dict is not None:
                     kwargs['response_dict'] = {}
-                rv = func(self.url, self.token, *args,
+                rv = func(url, self.token, *args,
                           service_token=self.service_token, **kwargs)
+                pool_failed = False
+                if pool_url is not None and self._streamed_body(rv):
+                    # The endpoint is busy until the body has been read
+                    body = rv[1].body if isinstance(rv[1], _CacheFill) \
+                        else rv[1]
+                    body.resp = _EndpointResponse(body.resp, pool, pool_url)
+                    pool_url = None
+                if endpoint:
+                    breaker.record_success(endpoint)
                 self._add_response_dict(caller_response_dict, kwargs)
+                policy.record_success()
                 return rv
             except SSLError:
                 raise
             except (socket.error, RequestException):
+                if endpoint:
+                    breaker.record_failure(endpoint)
                 self._add_response_dict(caller_response_dict, kwargs)
-                if self.attempts > self.retries:
+                if (self.attempts > self.retries or
+                        not policy.allow_retry(method, retries)):
                     raise
                 self.http_conn = None
-            except ClientException as err:
+                self._pool_conns.pop(pool_url, None)
+            except ClientException as e:
+                err = e
+                if err.http_status is not None:
+                    pool_failed = 500 <= err.http_status <= 599
+                if endpoint and err.http_status is not None:
+                    if 500 <= err.http_status <= 599:
+                        breaker.record_failure(endpoint)
+                    else:
+                        breaker.record_success(endpoint)
                 self._add_response_dict(caller_response_dict, kwargs)
                 if err.http_status == 401:
                     if self.session:
@@ -1714,16 +3132,18 @@ class Connection(object):
                     retried_auth = True
                 elif self.attempts > self.retries or err.http_status is None:
                     raise
+                elif not (policy.retry_status(err.http_status) and
+                          policy.allow_retry(method, retries)):
+                    raise
                 elif err.http_status == 408:
                     self.http_conn = None
-                elif 500 <= err.http_status <= 599:
-                    pass
-                elif self.retry_on_ratelimit and err.http_status == 498:
-                    pass
-                else:
-                    raise
+                    self._pool_conns.pop(pool_url, None)
+            finally:
+                if pool_url is not None:
+                    pool.release(pool_url, pool_failed)
+            backoff = policy.backoff(retries, backoff, err)
+            retries += 1
             sleep(backoff)
-            backoff = min(backoff * 2, self.max_backoff)
             if reset_func:
                 reset_func(func, *args, **kwargs)
 
@@ -1796,7 +3216,10 @@ class Connection(object):
                                      resp_chunk_size=resp_chunk_size,
                                      query_string=query_string,
                                      response_dict=response_dict,
-                                     headers=headers)
+                                     headers=headers,
+                                     object_cache=self.object_cache)
+        if isinstance(body, _CachedObjectBody):
+            return rheaders, body
         is_not_range_request = (
             not headers or 'range' not in (k.lower() for k in headers))
         retry_is_possible = (
@@ -1804,13 +3227,46 @@ class Connection(object):
             self.attempts <= self.retries and
             rheaders.get('transfer-encoding') is None)
         if retry_is_possible:
-            body = _RetryBody(body.resp, self, container, obj,
-                              resp_chunk_size=resp_chunk_size,
-                              query_string=query_string,
-                              response_dict=response_dict,
-                              headers=headers)
+            retry_body = _RetryBody(body.resp, self, container, obj,
+                                    resp_chunk_size=resp_chunk_size,
+                                    query_string=query_string,
+                                    response_dict=response_dict,
+                                    headers=headers)
+            if isinstance(body, _CacheFill):
+                # Keep filling the cache from the retrying body
+                body.body = retry_body
+            else:
+                body = retry_body
         return rheaders, body
 
+    def get_object_ranges(self, container, obj, ranges, query_string=None,
+                          response_dict=None, headers=None,
+                          max_ranges=DEFAULT_MAX_RANGES,
+                          resp_chunk_size=65536):
+        """
+        Wrapper for :func:`get_object_ranges`
+
+        Each request is retried on its own, so when the ranges are split
+        across several requests, the later requests are made (and may be
+        retried) while the parts are iterated over.
+        """
+        groups = _range_groups(ranges, max_ranges)
+        kwargs = dict(query_string=query_string, headers=headers,
+                      max_ranges=max_ranges, resp_chunk_size=resp_chunk_size)
+        rheaders, parts = self._retry(
+            None, get_object_ranges, container, obj, groups[0],
+            response_dict=response_dict, **kwargs)
+
+        def iter_parts():
+            for part in parts:
+                yield part
+            for group in groups[1:]:
+                _rheaders, more_parts = self._retry(
+                    None, get_object_ranges, container, obj, group, **kwargs)
+                for part in more_parts:
+                    yield part
+        return rheaders, iter_parts()
+
     def put_object(self, container, obj, contents, content_length=None,
                    etag=None, chunk_size=None, content_type=None,
                    headers=None, query_string=None, response_dict=None):
@@ -1870,3 +3326,160 @@ class Connection(object):
         url = scheme + '://' + netloc + '/info'
         http_conn = self.http_connection(url)
         return get_capabilities(http_conn)
+
+
+class SwiftFile(io.RawIOBase):
+    """
+    Seekable, read-only file-like view of an object.
+
+    Data is fetched with ranged GETs a block at a time and kept in a small
+    LRU cache of blocks, so libraries that seek around an object (to read a
+    footer or an index, say) only download the parts they read. Missing
+    blocks that are next to each other are fetched with a single request,
+    and sequential reads fetch a few blocks ahead.
+
+    The object is HEADed when the file is opened, and every GET sends
+    ``If-Match`` with its etag, so a :class:`ClientException` with status
+    412 is raised if the object is replaced while it is being read.
+
+    Wrap it in an :class:`io.BufferedReader` for efficient small reads.
+    """
+
+    def __init__(self, connection, container, obj, block_size=2 ** 20,
+                 cache_blocks=32, readahead=4, headers=None):
+        """
+        :param connection: the :class:`Connection` to make requests with
+        :param container: the name of the container the object is in
+        :param obj: the name of the object to read
+        :param block_size: the number of bytes fetched and cached at a time
+        :param cache_blocks: the most blocks to keep in the cache
+        :param readahead: the number of extra blocks to fetch when the
+                          object is being read sequentially
+        :param headers: an optional dictionary with additional headers to
+                        include in each request
+        """
+        super(SwiftFile, self).__init__()
+        if block_size < 1 or cache_blocks < 1 or readahead < 0:
+            raise ValueError('block_size and cache_blocks must be positive '
+                             'and readahead must not be negative')
+        self.conn = connection
+        self.container = container
+        self.obj = obj
+        self.block_size = block_size
+        self.cache_blocks = cache_blocks
+        self.readahead = readahead
+        self.headers = dict(headers or {})
+        self.headers.pop('Range', None)
+        resp_headers = self.conn.head_object(container, obj,
+                                             headers=dict(self.headers))
+        self.size = int(resp_headers['content-length'])
+        self.etag = resp_headers.get('etag')
+        if self.etag:
+            self.headers['If-Match'] = self.etag
+        self._pos = 0
+        self._seq_pos = 0
+        self._cache = OrderedDict()
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        self._checkClosed()
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        self._checkClosed()
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = self.size + offset
+        else:
+            raise ValueError('invalid whence (%r)' % (whence,))
+        if pos < 0:
+            raise ValueError('negative seek position %d' % pos)
+        self._pos = pos
+        return pos
+
+    def close(self):
+        self._cache.clear()
+        super(SwiftFile, self).close()
+
+    def readinto(self, b):
+        self._checkClosed()
+        end = min(self._pos + len(b), self.size)
+        if end <= self._pos:
+            return 0
+        first = self._pos // self.block_size
+        last = (end - 1) // self.block_size
+        blocks = self._get_blocks(first, last, self._pos == self._seq_pos)
+
+        view = memoryview(b)
+        copied = 0
+        for index in range(first, last + 1):
+            block = blocks[index]
+            block_start = index * self.block_size
+            lo = max(self._pos, block_start) - block_start
+            hi = min(end, block_start + len(block)) - block_start
+            view[copied:copied + hi - lo] = block[lo:hi]
+            copied += hi - lo
+        self._pos = self._seq_pos = end
+        return copied
+
+    def _get_blocks(self, first, last, sequential):
+        blocks = {}
+        missing = []
+        for index in range(first, last + 1):
+            if index in self._cache:
+                # Mark as most recently used
+                blocks[index] = self._cache[index] = self._cache.pop(index)
+            else:
+                missing.append(index)
+        if missing and sequential:
+            last_block = (self.size - 1) // self.block_size
+            missing.extend(
+                index for index in range(
+                    last + 1, min(last + self.readahead, last_block) + 1)
+                if index not in self._cache)
+
+        # Fetch each run of adjacent missing blocks with one request
+        run_start = None
+        for i, index in enumerate(missing):
+            if run_start is None:
+                run_start = index
+            if i + 1 == len(missing) or missing[i + 1] != index + 1:
+                fetched = self._fetch(run_start, index)
+                blocks.update(
+                    (b, block) for b, block in fetched.items()
+                    if b <= last)
+                for b, block in sorted(fetched.items()):
+                    self._cache[b] = block
+                run_start = None
+
+        while len(self._cache) > self.cache_blocks:
+            self._cache.popitem(last=False)
+        return blocks
+
+    def _fetch(self, first, last):
+        start = first * self.block_size
+        end = min((last + 1) * self.block_size, self.size) - 1
+        headers = dict(self.headers)
+        headers['Range'] = 'bytes=%d-%d' % (start, end)
+        resp_headers, body = self.conn.get_object(
+            self.container, self.obj, headers=headers)
+        if 'content-range' not in resp_headers:
+            # Server ignored the range and sent the whole object
+            body = body[start:end + 1]
+        if len(body) != end + 1 - start:
+            raise ClientException(
+                'Expected %d bytes of %s/%s from offset %d but got %d' % (
+                    end + 1 - start, self.container, self.obj, start,
+                    len(body)))
+        return dict(
+            (first + i, body[offset:offset + self.block_size])
+            for i, offset in enumerate(
+                range(0, len(body), self.block_size)))
@@ -19,7 +19,13 @@ import six
 import sys
 
 from concurrent.futures import ThreadPoolExecutor
-from six.moves.queue import PriorityQueue
+from itertools import groupby
+from six.moves.queue import PriorityQueue, Queue, Empty as QueueEmpty
+from threading import Lock, Thread
+from time import time
+
+# Kinds of message passed to the buffered output writer thread
+_MSG, _RAW, _ERROR, _COUNT = range(4)
 
 
 class OutputManager(object):
@@ -42,15 +48,35 @@ class OutputManager(object):
     encountered exceptions or otherwise called :meth:`error` on this instance.
     The swift command-line tool uses this to exit non-zero if any error strings
     were printed.
+
+    In buffered mode a single writer thread is used instead: messages are
+    queued, and normal output is written and flushed in batches once
+    ``flush_size`` characters have accumulated or the oldest message has
+    waited ``flush_interval`` seconds. Pending normal output is always
+    written before an error or warning message, so messages still appear in
+    the order in which they were submitted. If a write fails, the exception
+    is kept in :attr:`self.write_error` and the writer carries on, so later
+    errors are still printed and counted.
     """
     DEFAULT_OFFSET = 14
+    DEFAULT_FLUSH_INTERVAL = 0.1
+    DEFAULT_FLUSH_SIZE = 2 ** 16
 
-    def __init__(self, print_stream=None, error_stream=None):
+    def __init__(self, print_stream=None, error_stream=None, buffered=False,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL,
+                 flush_size=DEFAULT_FLUSH_SIZE):
         """
         :param print_stream: The stream to which :meth:`print_msg` sends
                              formatted messages.
         :param error_stream: The stream to which :meth:`error` sends formatted
                              messages.
+        :param buffered: If True, write output in batches from a single writer
+                         thread rather than writing (and flushing) each
+                         message as it is submitted.
+        :param flush_interval: The maximum time in seconds that buffered
+                               output is held before being flushed.
+        :param flush_size: The amount of buffered output (in characters or
+                           bytes) that triggers a flush.
 
         On Python 2, Unicode messages are encoded to utf8.
         """
@@ -60,16 +86,114 @@ class OutputManager(object):
         self.error_stream = error_stream or sys.stderr
         self.error_print_pool = ThreadPoolExecutor(max_workers=1)
         self.error_count = 0
+        # The first exception raised writing buffered output, if any
+        self.write_error = None
+
+        self.buffered = buffered
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self._write_queue = Queue()
+        self._writer = None
+        self._writer_lock = Lock()
 
     def __enter__(self):
         return self
 
     def __exit__(self, exc_type, exc_value, traceback):
+        if self._writer is not None:
+            self._write_queue.put(None)
+            self._writer.join()
         self.error_print_pool.__exit__(exc_type, exc_value, traceback)
         self.print_pool.__exit__(exc_type, exc_value, traceback)
 
+    def _queue_write(self, kind, data, count=0):
+        if self._writer is None:
+            with self._writer_lock:
+                if self._writer is None:
+                    writer = Thread(target=self._buffered_writer)
+                    writer.daemon = True
+                    writer.start()
+                    self._writer = writer
+        self._write_queue.put((kind, data, count))
+
+    def _buffered_writer(self):
+        pending = []
+        pending_size = 0
+        deadline = None
+        while True:
+            try:
+                if pending:
+                    item = self._write_queue.get(
+                        timeout=max(0, deadline - time()))
+                else:
+                    item = self._write_queue.get()
+            except QueueEmpty:
+                # flush_interval has passed since the oldest pending message
+                item = (_MSG, None, 0)
+
+            if item is not None and item[0] == _COUNT:
+                self.error_count += item[2]
+                continue
+
+            if item is None or item[1] is None or item[0] == _ERROR:
+                self._guarded_write(self._write_batch, pending)
+                pending = []
+                pending_size = 0
+                if item is None:
+                    return
+                if item[0] == _ERROR:
+                    self.error_count += item[2]
+                    self._guarded_write(self._print, item[1],
+                                        self.error_stream)
+                continue
+
+            kind, data, _count = item
+            if kind == _MSG:
+                if six.PY2 and isinstance(data, six.text_type):
+                    data = data.encode('utf8')
+                data = '%s\n' % data
+            if not pending:
+                deadline = time() + self.flush_interval
+            pending.append(data)
+            pending_size += len(data)
+            if pending_size >= self.flush_size:
+                self._guarded_write(self._write_batch, pending)
+                pending = []
+                pending_size = 0
+
+    def _guarded_write(self, write, *args):
+        # A failed write (e.g. EPIPE when output is piped to head) mustn't
+        # stop the writer thread, or later errors would go uncounted
+        try:
+            write(*args)
+        except Exception as err:
+            if self.write_error is None:
+                self.write_error = err
+
+    def _write_batch(self, batch):
+        if not batch:
+            return
+        stream = self.print_stream
+        for raw, run in groupby(batch,
+                                lambda data: isinstance(data, bytes)):
+            if raw:
+                data = b''.join(run)
+                if six.PY3:
+                    # Don't let raw bytes overtake text still held in the
+                    # stream's own buffer
+                    stream.flush()
+                    stream = stream.buffer
+                stream.write(data)
+                stream = self.print_stream
+            else:
+                stream.write(''.join(run))
+        stream.flush()
+
     def print_raw(self, data):
-        self.print_pool.submit(self._write, data, self.print_stream)
+        if self.buffered:
+            self._queue_write(_RAW, data)
+        else:
+            self.print_pool.submit(self._write, data, self.print_stream)
 
     def _write(self, data, stream):
         if six.PY3:
@@ -82,7 +206,10 @@ class OutputManager(object):
     def print_msg(self, msg, *fmt_args):
         if fmt_args:
             msg = msg % fmt_args
-        self.print_pool.submit(self._print, msg)
+        if self.buffered:
+            self._queue_write(_MSG, msg)
+        else:
+            self.print_pool.submit(self._print, msg)
 
     def print_items(self, items, offset=DEFAULT_OFFSET, skip_missing=False):
         template = '%%%ds: %%s' % offset
@@ -94,7 +221,10 @@ class OutputManager(object):
     def error(self, msg, *fmt_args):
         if fmt_args:
             msg = msg % fmt_args
-        self.error_print_pool.submit(self._print_error, msg)
+        if self.buffered:
+            self._queue_write(_ERROR, msg, count=1)
+        else:
+            self.error_print_pool.submit(self._print_error, msg)
 
     def get_error_count(self):
         return self.error_count
@@ -110,11 +240,27 @@ class OutputManager(object):
         self.error_count += count
         return self._print(item, stream=self.error_stream)
 
+    def count_error(self):
+        """
+        Count an error that was reported through :meth:`print_msg` rather
+        than :meth:`error`, e.g. as part of machine-readable output.
+        """
+        if self.buffered:
+            self._queue_write(_COUNT, None, count=1)
+        else:
+            self.error_print_pool.submit(self._count_error)
+
+    def _count_error(self):
+        self.error_count += 1
+
     def warning(self, msg, *fmt_args):
         # print to error stream but do not increment error count
         if fmt_args:
             msg = msg % fmt_args
-        self.error_print_pool.submit(self._print_error, msg, count=0)
+        if self.buffered:
+            self._queue_write(_ERROR, msg)
+        else:
+            self.error_print_pool.submit(self._print_error, msg, count=0)
 
 
 class MultiThreadingManager(object):
@@ -125,7 +271,7 @@ class MultiThreadingManager(object):
 
     def __init__(self, create_connection, segment_threads=10,
                  object_dd_threads=10, object_uu_threads=10,
-                 container_threads=10):
+                 container_threads=10, disk_threads=4):
         """
         :param segment_threads: The number of threads allocated to segment
                                 uploads
@@ -135,6 +281,8 @@ class MultiThreadingManager(object):
                                   upload/update based jobs
         :param container_threads: The number of threads allocated to
                                   container/account level jobs
+        :param disk_threads: The number of threads allocated to writing
+                             downloaded objects to disk
         """
         self.segment_pool = ConnectionThreadPoolExecutor(
             create_connection, max_workers=segment_threads)
@@ -144,6 +292,7 @@ class MultiThreadingManager(object):
             create_connection, max_workers=object_uu_threads)
         self.container_pool = ConnectionThreadPoolExecutor(
             create_connection, max_workers=container_threads)
+        self.disk_pool = ThreadPoolExecutor(max_workers=disk_threads)
 
     def __enter__(self):
         return self
@@ -153,6 +302,7 @@ class MultiThreadingManager(object):
         self.object_dd_pool.__exit__(exc_type, exc_value, traceback)
         self.object_uu_pool.__exit__(exc_type, exc_value, traceback)
         self.container_pool.__exit__(exc_type, exc_value, traceback)
+        self.disk_pool.__exit__(exc_type, exc_value, traceback)
 
 
 class ConnectionThreadPoolExecutor(ThreadPoolExecutor):
@@ -17,40 +17,61 @@ import logging
 
 import os
 
-from concurrent.futures import as_completed, CancelledError, TimeoutError
+from collections import deque
+from concurrent.futures import (
+    as_completed, CancelledError, FIRST_COMPLETED, TimeoutError, wait
+)
 from copy import deepcopy
+from email.utils import mktime_tz, parsedate_tz
 from errno import EEXIST, ENOENT
-from hashlib import md5
+from functools import partial
+from hashlib import md5, new as new_hash
+from itertools import chain, cycle, islice
 from os import environ, makedirs, stat, utime
 from os.path import (
-    basename, dirname, getmtime, getsize, isdir, join, sep as os_path_sep
+    basename, dirname, isdir, join, sep as os_path_sep
 )
+import tarfile
 from posixpath import join as urljoin
-from random import shuffle
+from random import randrange, shuffle
+from stat import S_ISDIR
 from time import time
-from threading import Thread
-from six import Iterator, StringIO, string_types, text_type
+from threading import Condition, Event, Thread, local
+from six import BytesIO, Iterator, StringIO, string_types, text_type
 from six.moves.queue import Queue
-from six.moves.queue import Empty as QueueEmpty
+from six.moves.queue import Empty as QueueEmpty, Full as QueueFull
 from six.moves.urllib.parse import quote
 
 import json
 
 
-from swiftclient import Connection
+from swiftclient import (
+    CircuitBreaker, Connection, EndpointPool, ObjectCache, RetryBudget,
+    RetryPolicy
+)
 from swiftclient.command_helpers import (
     stat_account, stat_container, stat_object
 )
 from swiftclient.utils import (
-    config_true_value, ReadableToIterable, LengthWrapper, EMPTY_ETAG,
-    parse_api_response, report_traceback, n_groups, split_request_headers,
-    n_at_a_time
+    config_true_value, ContentDefinedChunker, ReadableToIterable,
+    LengthWrapper, EMPTY_ETAG, parse_api_response, report_traceback,
+    n_groups, split_request_headers, compression_available,
+    CompressingIterable, Decompressor, COMPRESSION_CODECS, COMPRESSION_META,
+    UNCOMPRESSED_MD5_META, UNCOMPRESSED_SIZE_META
 )
 from swiftclient.exceptions import ClientException
 from swiftclient.multithreading import MultiThreadingManager
 
 
 DISK_BUFFER = 2 ** 16
+# Each download thread reads object bodies into a ring of this many buffers
+DOWNLOAD_BUFFERS = 4
+# Downloads of at least this size are preallocated on disk, where supported
+PREALLOCATE_MIN_SIZE = 2 ** 20
+# How often a resumable download records how much it has safely written
+RESUME_CHECKPOINT = 2 ** 26
+# How many chunks of an object may be downloaded ahead of the thread reading it
+QUEUED_CHUNKS = 16
 logger = logging.getLogger("swiftclient.service")
 
 
@@ -144,6 +165,19 @@ def _build_default_global_options():
         "user": environ.get('ST_USER'),
         "key": environ.get('ST_KEY'),
         "retries": 5,
+        "retry_jitter": None,
+        "retry_policy": None,
+        "retry_budget": False,
+        "circuit_breaker": None,
+        "circuit_breaker_threshold": None,
+        "object_cache": None,
+        "object_cache_dir": None,
+        "object_cache_size": 1024,
+        "expect_continue": None,
+        "endpoints": None,
+        "endpoint_strategy": 'least-outstanding',
+        "resolve_endpoints": False,
+        "endpoint_pool": None,
         "os_username": environ.get('OS_USERNAME'),
         "os_user_id": environ.get('OS_USER_ID'),
         "os_user_domain_name": environ.get('OS_USER_DOMAIN_NAME'),
@@ -169,7 +203,10 @@ def _build_default_global_options():
         'segment_threads': 10,
         'object_dd_threads': 10,
         'object_uu_threads': 10,
-        'container_threads': 10
+        'container_threads': 10,
+        'disk_threads': 4,
+        'max_in_flight': 1000,
+        'container_cache_ttl': 0
     }
 
 _default_global_options = _build_default_global_options()
@@ -178,6 +215,9 @@ _default_local_options = {
     'sync_to': None,
     'sync_key': None,
     'use_slo': False,
+    'segment_dedup': None,
+    'content_chunking': False,
+    'resume_dir': None,
     'segment_size': None,
     'segment_container': None,
     'leave_segments': False,
@@ -205,9 +245,29 @@ _default_local_options = {
     'destination': None,
     'fresh_metadata': False,
     'ignore_mtime': False,
+    'resume_download': False,
+    'preallocate': True,
+    'fadvise': False,
+    'group_by': None,
+    'compress': None,
+    'decompress': True,
 }
 
 POLICY = 'X-Storage-Policy'
+DEDUP_SEGMENT_PREFIX = '_dedup/'
+# Marks manifests that reference deduplicated segments, with the hash used
+DEDUP_META = 'x-object-meta-segment-dedup'
+DEDUP_HASHES = ('md5', 'sha256')
+# segment_size value asking for segment sizes to be chosen automatically
+AUTO_SEGMENT_SIZE = 'auto'
+# Automatically chosen segments are no smaller than this...
+AUTO_SEGMENT_MIN_SIZE = 2 ** 24
+# ...and take at least this many seconds to upload at the measured rate, so
+# that per-request overheads stay small
+AUTO_SEGMENT_MIN_TIME = 5
+# Swift's defaults, for clusters that don't publish their limits
+DEFAULT_MAX_FILE_SIZE = 5368709122
+DEFAULT_MAX_MANIFEST_SEGMENTS = 1000
 KNOWN_DIR_MARKERS = (
     'application/directory',  # Preferred
     'text/directory',  # Historically relevant
@@ -235,17 +295,88 @@ def get_future_result(f, timeout=86400):
 
 
 def interruptable_as_completed(fs, timeout=86400):
-    while True:
+    # Track outstanding futures in a set so that each completion costs O(1);
+    # the caller's sequence is left untouched.
+    pending = set(fs)
+    while pending:
         try:
-            for f in as_completed(fs, timeout=timeout):
-                fs.remove(f)
+            for f in as_completed(pending, timeout=timeout):
+                pending.discard(f)
                 yield f
-            return
         except TimeoutError:
             # Do nothing here, we only have a timeout to allow interruption
             pass
 
 
+def _is_not_found(err):
+    return isinstance(err, ClientException) and err.http_status == 404
+
+
+def _parse_group_by(group_by):
+    """
+    Parse a listing ``group_by`` option.
+
+    :param group_by: None, ``'content_type'``, ``'prefix'`` or
+                     ``'prefix:<depth>'``.
+    :returns: A tuple of (field, depth); field is None if no grouping was
+              requested.
+    :raises SwiftError: if the option is not understood.
+    """
+    if not group_by:
+        return None, 0
+    field, _sep, depth = group_by.partition(':')
+    if field == 'content_type' and not _sep:
+        return field, 0
+    if field == 'prefix':
+        try:
+            depth = int(depth) if _sep else 1
+        except ValueError:
+            depth = 0
+        if depth > 0:
+            return field, depth
+    raise SwiftError('Invalid group_by option %r; expected "content_type", '
+                     '"prefix" or "prefix:<depth>"' % group_by)
+
+
+def _sum_listing(items, group_by=None, delimiter=None):
+    """
+    Total up the object count and bytes of a page of listing results.
+
+    Account listings contribute the count and bytes of each container;
+    container listings count each object once. Pseudo-directory (subdir)
+    entries are ignored.
+
+    :param items: A list of listing dicts, as returned by get_account or
+                  get_container.
+    :param group_by: An optional grouping, as accepted by
+                     :func:`_parse_group_by`.
+    :param delimiter: The delimiter used to split names into prefixes;
+                      defaults to '/'.
+    :returns: A dict mapping each group (the empty string when not grouping)
+              to a dict with 'count' and 'bytes' keys.
+    """
+    field, depth = _parse_group_by(group_by)
+    delimiter = delimiter or '/'
+    totals = {}
+    for item in items:
+        if 'subdir' in item:
+            continue
+        if field == 'content_type':
+            group = item.get('content_type', '').split(';', 1)[0]
+        elif field == 'prefix':
+            group = ''.join(p + delimiter for p in
+                            item['name'].split(delimiter, depth)[:-1])
+        else:
+            group = ''
+        try:
+            group_totals = totals[group]
+        except KeyError:
+            group_totals = totals[group] = {'count': 0, 'bytes': 0}
+        group_totals['count'] += item.get('count', 1)
+        group_totals['bytes'] += item.get('bytes', 0)
+    return totals
+
+
 def get_conn(options):
     """
     Return a connection building it from the options.
@@ -261,7 +392,12 @@ def get_conn(options):
                       insecure=options['insecure'],
                       cert=options['os_cert'],
                       cert_key=options['os_key'],
-                      ssl_compression=options['ssl_compression'])
+                      ssl_compression=options['ssl_compression'],
+                      retry_policy=options.get('retry_policy'),
+                      circuit_breaker=options.get('circuit_breaker'),
+                      object_cache=options.get('object_cache'),
+                      expect_continue=options.get('expect_continue'),
+                      endpoint_pool=options.get('endpoint_pool'))
 
 
 def mkdirs(path):
@@ -292,12 +428,94 @@ def split_headers(options, prefix=''):
     return headers
 
 
+class _SegmentJournal(object):
+    """
+    A local record of the segments of a large object upload that have been
+    uploaded, so that an interrupted upload can be resumed.
+
+    The journal is a file of JSON lines in the given directory. The first
+    line describes the upload, and each following line describes one
+    uploaded segment. A journal is only used again for an identical upload
+    (same file, size, mtime, destination and segmenting options).
+    """
+    def __init__(self, directory, upload):
+        self.upload = upload
+        header = json.dumps(upload, sort_keys=True)
+        self._header = header
+        key = md5(header.encode('utf-8')).hexdigest()
+        self.directory = directory
+        self.path = join(directory, key + '.journal')
+        self._fp = None
+        self._valid = False
+
+    def load(self):
+        """
+        :returns: A dict of segment index to the recorded segment, each a
+                  dict with ``segment_index``, ``segment_start``,
+                  ``segment_size``, ``segment_location`` and
+                  ``segment_etag`` keys.
+        """
+        entries = {}
+        try:
+            with open(self.path) as fp:
+                if fp.readline().rstrip('\n') != self._header:
+                    return entries
+                self._valid = True
+                for line in fp:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A partial line, if we died while writing it
+                        continue
+                    entries[entry['segment_index']] = entry
+        except (IOError, OSError) as err:
+            if err.errno != ENOENT:
+                raise
+        return entries
+
+    def record(self, segment_start, result):
+        if self._fp is None:
+            mkdirs(self.directory)
+            if self._valid:
+                self._fp = open(self.path, 'a')
+            else:
+                self._fp = open(self.path, 'w')
+                self._fp.write(self._header + '\n')
+        self._fp.write(json.dumps({
+            'segment_index': result['segment_index'],
+            'segment_start': segment_start,
+            'segment_size': result['segment_size'],
+            'segment_location': result['segment_location'],
+            'segment_etag': result['segment_etag'],
+        }, sort_keys=True) + '\n')
+        self._fp.flush()
+
+    def close(self):
+        if self._fp is not None:
+            self._fp.close()
+            self._fp = None
+
+    def remove(self):
+        self.close()
+        try:
+            os.unlink(self.path)
+        except OSError as err:
+            if err.errno != ENOENT:
+                raise
+
+
 class SwiftUploadObject(object):
     """
     Class for specifying an object upload, allowing the object source, name and
     options to be specified separately for each individual object.
+
+    A ``stat_result`` for a path source may be given if the caller has
+    already stat'ed the file (e.g. while scanning a directory); it is then
+    used for the size and mtime of the upload instead of stat'ing the file
+    again.
     """
-    def __init__(self, source, object_name=None, options=None):
+    def __init__(self, source, object_name=None, options=None,
+                 stat_result=None):
         if isinstance(source, string_types):
             self.object_name = object_name or source
         elif source is None or hasattr(source, 'read'):
@@ -316,6 +534,7 @@ class SwiftUploadObject(object):
         self.object_name = self.object_name.lstrip('/')
         self.options = options
         self.source = source
+        self.stat_result = stat_result
 
 
 class SwiftPostObject(object):
@@ -368,15 +587,60 @@ class SwiftCopyObject(object):
                 )
 
 
+_thread_local = local()
+
+
+def _download_buffers():
+    """
+    :returns: This thread's ring of ``DOWNLOAD_BUFFERS`` preallocated
+              buffers, each of ``DISK_BUFFER`` bytes.
+    """
+    buffers = getattr(_thread_local, 'download_buffers', None)
+    if buffers is None:
+        buffers = _thread_local.download_buffers = [
+            bytearray(DISK_BUFFER) for _ in range(DOWNLOAD_BUFFERS)]
+    return buffers
+
+
+def _window_shuffle(items, size):
+    """
+    Shuffle an iterable within a sliding window of ``size`` items, so that
+    items are moved at most about ``size`` places without the whole iterable
+    having to be read first.
+    """
+    window = []
+    for item in items:
+        if len(window) < size:
+            window.append(item)
+            continue
+        i = randrange(size)
+        yield window[i]
+        window[i] = item
+    shuffle(window)
+    for item in window:
+        yield item
+
+
 class _SwiftReader(object):
     """
     Class for downloading objects from swift and raising appropriate
     errors on failures caused by either invalid md5sum or size of the
     data read.
+
+    With ``decompress``, an object compressed by the client is decompressed
+    as it is read; the md5sum and size are still checked against the
+    compressed data, as stored.
     """
-    def __init__(self, path, body, headers, checksum=True):
+    def __init__(self, path, body, headers, checksum=True, decompress=False):
         self._path = path
         self._body = body
+        self._decompressor = None
+        if decompress and headers.get(COMPRESSION_META):
+            try:
+                self._decompressor = Decompressor(headers[COMPRESSION_META])
+            except ValueError as err:
+                raise SwiftError('Error downloading {0}: {1}'.format(
+                    path, err))
         self._actual_read = 0
         self._content_length = None
         self._actual_md5 = None
@@ -411,8 +675,47 @@ class _SwiftReader(object):
             if self._actual_md5:
                 self._actual_md5.update(chunk)
             self._actual_read += len(chunk)
+            if self._decompressor is not None:
+                chunk = self._decompress(chunk)
+                if not chunk:
+                    continue
             yield chunk
         self._check_contents()
+        if self._decompressor is not None:
+            chunk = self._decompressor.flush()
+            if chunk:
+                yield chunk
+
+    def _decompress(self, chunk):
+        try:
+            return self._decompressor.decompress(chunk)
+        except ValueError as err:
+            raise SwiftError('Error downloading {0}: {1}'.format(
+                self._path, err))
+
+    def iter_into(self, buffers):
+        """
+        Read the body into each of ``buffers`` in turn, yielding a memoryview
+        of the bytes read each time. A view is only valid until
+        ``len(buffers)`` more have been yielded, as its buffer is then reused.
+        Bodies that can't read into a buffer, or that are decompressed, are
+        iterated over instead.
+        """
+        readinto = getattr(self._body, 'readinto', None)
+        if readinto is None or self._decompressor is not None:
+            for chunk in self:
+                yield chunk
+            return
+        for buf in cycle(buffers):
+            nbytes = readinto(buf)
+            if not nbytes:
+                break
+            view = memoryview(buf)[:nbytes]
+            if self._actual_md5:
+                self._actual_md5.update(view)
+            self._actual_read += nbytes
+            yield view
+        self._check_contents()
 
     def _check_contents(self):
         if self._actual_md5 and self._expected_md5:
@@ -429,10 +732,442 @@ class _SwiftReader(object):
                                  self._path, self._actual_read,
                                  self._content_length))
 
+    def resume(self, fp, offset):
+        """
+        Account for the first ``offset`` bytes of the object having already
+        been downloaded, before reading the rest of it from the body.
+
+        :param fp: A file object positioned at the start of the bytes already
+                   downloaded. They are only read if they need to be hashed to
+                   check the object's md5sum.
+        :param offset: The number of bytes already downloaded.
+        """
+        if self._actual_md5:
+            remaining = offset
+            while remaining:
+                data = fp.read(min(DISK_BUFFER, remaining))
+                if not data:
+                    raise SwiftError('Error resuming download of {0}: partial '
+                                     'file is too short'.format(self._path))
+                self._actual_md5.update(data)
+                remaining -= len(data)
+        self._actual_read += offset
+
     def bytes_read(self):
         return self._actual_read
 
 
+class _PartialDownload(object):
+    """
+    A download written to ``<filename>.part``, which is only renamed to
+    ``<filename>`` once complete, so that an interrupted download can be
+    resumed by a later process.
+
+    A sidecar file, ``<filename>.part.json``, records the etag and length of
+    the object being downloaded and how many bytes of the partial file are
+    known to be on disk. It is updated every ``RESUME_CHECKPOINT`` bytes,
+    and when the download fails.
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self.part_path = filename + '.part'
+        self.state_path = self.part_path + '.json'
+        self.completed = False
+        self._fp = None
+        self._state = None
+        self._checkpointed = 0
+
+    def load(self):
+        """
+        :returns: A dict with ``etag``, ``content_length`` and ``offset``
+                  keys for a download that may be resumed, or None.
+        """
+        try:
+            with open(self.state_path) as fp:
+                state = json.load(fp)
+            part_size = os.path.getsize(self.part_path)
+        except (IOError, OSError, ValueError):
+            return None
+        if not state.get('etag') or state.get('offset', 0) <= 0:
+            return None
+        # Never trust bytes beyond the end of the partial file. If the
+        # download had finished, ask for the last byte again rather than for
+        # an unsatisfiable range.
+        state['offset'] = min(state['offset'], part_size,
+                              state['content_length'] - 1)
+        if state['offset'] <= 0:
+            return None
+        return state
+
+    def open(self, offset, etag, content_length):
+        """
+        Open the partial file for writing from ``offset``, discarding
+        anything after it.
+        """
+        if offset:
+            self._fp = open(self.part_path, 'r+b', DISK_BUFFER)
+            self._fp.seek(offset)
+            self._fp.truncate()
+        else:
+            self._fp = open(self.part_path, 'wb', DISK_BUFFER)
+        if etag:
+            self._state = {'etag': etag, 'content_length': content_length,
+                           'offset': offset}
+        self._checkpointed = offset
+        return self
+
+    def fileno(self):
+        return self._fp.fileno()
+
+    def flush(self):
+        self._fp.flush()
+
+    def write(self, chunk):
+        self._fp.write(chunk)
+        if self._state is not None:
+            self._state['offset'] += len(chunk)
+            if (self._state['offset'] - self._checkpointed >=
+                    RESUME_CHECKPOINT):
+                self._checkpoint()
+
+    def _checkpoint(self):
+        self._fp.flush()
+        os.fsync(self._fp.fileno())
+        tmp_path = self.state_path + '.tmp'
+        with open(tmp_path, 'w') as fp:
+            json.dump(self._state, fp)
+        if os.path.exists(self.state_path):
+            # os.rename won't replace an existing file on Windows
+            os.unlink(self.state_path)
+        os.rename(tmp_path, self.state_path)
+        self._checkpointed = self._state['offset']
+
+    def close(self):
+        """
+        Close the partial file, recording how much of it was written so
+        that the download can be resumed.
+        """
+        if self._fp is None:
+            return
+        try:
+            if (self._state is not None and
+                    self._state['offset'] > self._checkpointed):
+                self._checkpoint()
+        finally:
+            self._fp.close()
+            self._fp = None
+
+    def complete(self):
+        """
+        Move the finished download into place.
+        """
+        self._fp.close()
+        self._fp = None
+        if os.path.exists(self.filename):
+            os.unlink(self.filename)
+        os.rename(self.part_path, self.filename)
+        self._remove(self.state_path)
+        self.completed = True
+
+    def discard(self):
+        """
+        Remove the partial file, so that the next download starts afresh.
+        """
+        if self._fp is not None:
+            self._fp.close()
+            self._fp = None
+        self._remove(self.part_path)
+        self._remove(self.state_path)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.unlink(path)
+        except OSError as err:
+            if err.errno != ENOENT:
+                raise
+
+
+class _DirectoryCache(object):
+    """
+    Directories known to exist, so that downloading many objects into the
+    same directory only checks for (and creates) it once.
+    """
+    def __init__(self):
+        self._dirs = set()
+
+    def makedirs(self, path):
+        if path not in self._dirs:
+            if not isdir(path):
+                mkdirs(path)
+            self._dirs.add(path)
+
+    def forget(self, path):
+        self._dirs.discard(path)
+
+
+class _DiskWriter(object):
+    """
+    Runs the disk operations of one download in order on a shared pool of
+    disk threads, so that a slow disk doesn't stop the network thread from
+    reading the object, and disk threads are only busy while there is data
+    to write.
+
+    At most ``max_pending`` operations are queued; :meth:`submit` blocks
+    once that many are waiting. Once an operation fails, the rest are
+    dropped and :meth:`submit` raises its error.
+    """
+    def __init__(self, pool, max_pending):
+        self._pool = pool
+        self._max_pending = max(1, max_pending)
+        self._pending = deque()
+        self._draining = False
+        self._cond = Condition()
+        self.error = None
+
+    def submit(self, fn, *args):
+        with self._cond:
+            while (self.error is None and
+                    len(self._pending) >= self._max_pending):
+                self._cond.wait()
+            if self.error is not None:
+                raise self.error
+            self._pending.append((fn, args))
+            if not self._draining:
+                self._draining = True
+                self._pool.submit(self._drain)
+
+    def _drain(self):
+        while True:
+            with self._cond:
+                if not self._pending:
+                    self._draining = False
+                    self._cond.notify_all()
+                    return
+                fn, args = self._pending.popleft()
+                self._cond.notify_all()
+            try:
+                fn(*args)
+            except Exception as err:
+                with self._cond:
+                    self.error = err
+                    self._pending.clear()
+                    self._draining = False
+                    self._cond.notify_all()
+                return
+
+    def join(self):
+        """
+        Wait for the queued operations to finish.
+        """
+        with self._cond:
+            while self._draining:
+                self._cond.wait()
+
+
+class _QueuedBody(object):
+    """
+    An object passed from the thread downloading it to the thread reading
+    it: its headers and then the chunks of its body go through a bounded
+    queue, so that later objects can be fetched while an earlier one is read
+    without holding any of them in full.
+
+    The reader reads the body as a file object; it ends once the download
+    job has finished and the queue is empty, and raises the job's exception
+    if it failed.
+    """
+    def __init__(self, path, max_chunks, abort):
+        self.path = path
+        self.future = None
+        self._queue = Queue(max_chunks)
+        self._abort = abort
+        self._chunk = b''
+        self._offset = 0
+
+    def put(self, item):
+        while not self._abort.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return
+            except QueueFull:
+                pass
+        raise SwiftError('Download of {0} cancelled'.format(self.path))
+
+    def get(self):
+        """
+        Return the next item from the download, or None once it has ended.
+        """
+        while True:
+            try:
+                return self._queue.get(timeout=0.1)
+            except QueueEmpty:
+                if self.future.done():
+                    # Everything the job put is in the queue by now
+                    try:
+                        return self._queue.get_nowait()
+                    except QueueEmpty:
+                        return None
+
+    def read(self, size=-1):
+        parts = []
+        while size:
+            if self._offset >= len(self._chunk):
+                chunk = self.get()
+                if chunk is None:
+                    self.future.result()
+                    break
+                self._chunk, self._offset = chunk, 0
+            end = len(self._chunk) if size < 0 else self._offset + size
+            part = self._chunk[self._offset:end]
+            self._offset += len(part)
+            if size > 0:
+                size -= len(part)
+            parts.append(part)
+        return b''.join(parts)
+
+    def drain(self):
+        """
+        Discard the rest of the body, waiting for the download to finish.
+        """
+        while self.get() is not None:
+            pass
+
+    def cancel(self):
+        """
+        Stop this download, and the others sharing its abort event.
+        """
+        self._abort.set()
+
+
+class _DownloadFile(object):
+    """
+    The disk side of a download: creating its directory, opening, writing
+    and closing the file, and setting its mtime.
+    """
+    def __init__(self, path, out_file, options, headers, part_download,
+                 offset, content_length, dir_cache):
+        self.path = path
+        self.out_file = out_file
+        self.options = options
+        self.headers = headers
+        self.part_download = part_download
+        self.offset = offset
+        self.content_length = int(content_length or 0)
+        self.dir_cache = dir_cache
+        self.fp = None
+        # Where the data written so far ends, and whether space beyond it
+        # was preallocated
+        self._end = offset
+        self._preallocated = False
+        content_type = headers.get('content-type', '').split(';', 1)[0]
+        self.dir_marker = content_type in KNOWN_DIR_MARKERS
+        self.no_file = options['no_download']
+        self.pseudodir = not (self.dir_marker or self.no_file or
+                              part_download is not None or out_file or
+                              basename(path))
+
+    def open(self):
+        if self.dir_marker:
+            if not self.no_file and self.out_file != "-":
+                self.dir_cache.makedirs(self.path)
+            return
+
+        dirpath = None
+        if not (self.no_file or self.out_file):
+            dirpath = dirname(self.path)
+            if dirpath:
+                self.dir_cache.makedirs(dirpath)
+        if self.no_file or self.pseudodir:
+            return
+
+        try:
+            self.fp = self._open()
+        except (IOError, OSError) as err:
+            if err.errno != ENOENT or not dirpath:
+                raise
+            # The directory was removed since we created it
+            self.dir_cache.forget(dirpath)
+            self.dir_cache.makedirs(dirpath)
+            self.fp = self._open()
+
+        remaining = self.content_length - self.offset
+        if (self.options['preallocate'] and
+                remaining >= PREALLOCATE_MIN_SIZE and
+                hasattr(os, 'posix_fallocate')):
+            try:
+                os.posix_fallocate(self.fp.fileno(), self.offset, remaining)
+                self._preallocated = True
+            except OSError:
+                pass  # e.g. not supported by the filesystem
+        self._fadvise('POSIX_FADV_SEQUENTIAL')
+
+    def _open(self):
+        if self.part_download is not None:
+            return self.part_download.open(
+                self.offset, self.headers.get('etag'), self.content_length)
+        return open(self.out_file or self.path, 'wb', DISK_BUFFER)
+
+    def _fadvise(self, advice):
+        if (self.fp is None or not self.options['fadvise'] or
+                not hasattr(os, 'posix_fadvise')):
+            return
+        try:
+            os.posix_fadvise(self.fp.fileno(), 0, 0, getattr(os, advice))
+        except OSError:
+            pass
+
+    def write(self, chunk):
+        if self.fp is not None:
+            self.fp.write(chunk)
+            self._end += len(chunk)
+
+    def _truncate(self):
+        # A download that fails part way through shouldn't leave the rest of
+        # the preallocated space looking like downloaded data
+        if self._preallocated:
+            self.fp.flush()
+            os.ftruncate(self.fp.fileno(), self._end)
+            self._preallocated = False
+
+    def complete(self):
+        if self.fp is not None:
+            self.fp.flush()
+            self._truncate()
+            # Written pages needn't stay in the page cache
+            self._fadvise('POSIX_FADV_DONTNEED')
+            if self.fp is self.part_download:
+                self.part_download.complete()
+        self.close()
+
+    def discard(self):
+        if self.fp is not None and self.fp is self.part_download:
+            # The data doesn't match the object; don't resume from it
+            self.part_download.discard()
+            self._preallocated = False
+
+    def close(self):
+        if self.fp is None:
+            return
+        try:
+            self._truncate()
+        finally:
+            fp, self.fp = self.fp, None
+            fp.close()
+        if ('x-object-meta-mtime' in self.headers and not self.no_file
+                and not self.options['ignore_mtime']
+                and (fp is not self.part_download or
+                     self.part_download.completed)):
+            try:
+                mtime = float(self.headers['x-object-meta-mtime'])
+            except ValueError:
+                pass  # no real harm; couldn't trust it anyway
+            else:
+                if self.options['out_file']:
+                    utime(self.options['out_file'], (mtime, mtime))
+                else:
+                    utime(self.path, (mtime, mtime))
+
+
 class SwiftService(object):
     """
     Service for performing swift operations
@@ -449,15 +1184,50 @@ class SwiftService(object):
                 **_default_local_options
             )
         process_options(self._options)
+        if self._options['retry_policy'] is None:
+            # All of this service's connections share one policy, and so
+            # any retry budget
+            budget = RetryBudget() if self._options['retry_budget'] else None
+            self._options['retry_policy'] = RetryPolicy(
+                jitter=self._options['retry_jitter'], budget=budget)
+        if (self._options['circuit_breaker'] is None and
+                self._options['circuit_breaker_threshold']):
+            self._options['circuit_breaker'] = CircuitBreaker(
+                failure_threshold=self._options['circuit_breaker_threshold'])
+        if (self._options['object_cache'] is None and
+                self._options['object_cache_dir']):
+            self._options['object_cache'] = ObjectCache(
+                self._options['object_cache_dir'],
+                max_size=self._options['object_cache_size'] * 2 ** 20)
+        if (self._options['endpoint_pool'] is None and
+                (self._options['endpoints'] or
+                 self._options['resolve_endpoints'])):
+            try:
+                self._options['endpoint_pool'] = EndpointPool(
+                    self._options['endpoints'],
+                    strategy=self._options['endpoint_strategy'],
+                    resolve=self._options['resolve_endpoints'])
+            except ValueError as err:
+                raise SwiftError(str(err))
         create_connection = lambda: get_conn(self._options)
         self.thread_manager = MultiThreadingManager(
             create_connection,
             segment_threads=self._options['segment_threads'],
             object_dd_threads=self._options['object_dd_threads'],
             object_uu_threads=self._options['object_uu_threads'],
-            container_threads=self._options['container_threads']
+            container_threads=self._options['container_threads'],
+            disk_threads=self._options['disk_threads']
         )
+        self._dir_cache = _DirectoryCache()
         self.capabilities_cache = {}  # Each instance should have its own cache
+        # Containers known to exist: {container: (expiry time, policy)}
+        self._container_cache = {}
+        # (min_segment_size, max_file_size, max_manifest_segments), from the
+        # cluster capabilities
+        self._segment_limits = None
+        # Moving average of the rate (bytes/s) at which single segments
+        # upload, used to choose segment sizes automatically
+        self._segment_throughput = None
 
     def __enter__(self):
         self.thread_manager.__enter__()
@@ -466,6 +1236,177 @@ class SwiftService(object):
     def __exit__(self, exc_type, exc_val, exc_tb):
         self.thread_manager.__exit__(exc_type, exc_val, exc_tb)
 
+    # Container cache methods
+    #
+    def _container_cached(self, container, policy=None):
+        """
+        Check whether a container is known to exist, so that there is no need
+        to try to create it.
+
+        :param container: The container name.
+        :param policy: The storage policy the container is required to have,
+                       or None for any policy.
+        :returns: True if the container was created or found within the last
+                  ``container_cache_ttl`` seconds (with the given policy, if
+                  one was given).
+        """
+        entry = self._container_cache.get(container)
+        if entry is None:
+            return False
+        expires, cached_policy = entry
+        if expires <= time():
+            self._container_cache.pop(container, None)
+            return False
+        return policy is None or policy == cached_policy
+
+    def _cached_container_policy(self, container):
+        if not self._container_cached(container):
+            return None
+        return self._container_cache.get(container, (0, None))[1]
+
+    def _cache_container(self, container, policy=None, options=None):
+        ttl = (options or self._options)['container_cache_ttl']
+        if ttl and ttl > 0:
+            self._container_cache[container] = (time() + ttl, policy)
+
+    def _uncache_container(self, container):
+        self._container_cache.pop(container, None)
+
+    @staticmethod
+    def _resumable_segments(conn, seg_container, entries, segment_prefix):
+        """
+        Check the segments recorded in an upload journal against the segment
+        container.
+
+        :param conn: The swift connection to use.
+        :param seg_container: The segment container.
+        :param entries: The journal entries, keyed by segment index.
+        :param segment_prefix: The prefix shared by all the upload's segment
+                               names, used to list the segment container. If
+                               None, each segment is HEADed instead.
+        :returns: The entries for segments that still exist with the
+                  recorded size and etag.
+        """
+        if not entries:
+            return {}
+        location_prefix = '/%s/' % seg_container
+        existing = {}
+        try:
+            if segment_prefix is not None:
+                _headers, listing = conn.get_container(
+                    seg_container, prefix=segment_prefix, full_listing=True)
+                for o in listing:
+                    existing[o['name']] = (o['hash'], o['bytes'])
+            else:
+                for entry in entries.values():
+                    name = entry['segment_location'][len(location_prefix):]
+                    try:
+                        headers = conn.head_object(seg_container, name)
+                    except ClientException as err:
+                        if err.http_status != 404:
+                            raise
+                        continue
+                    existing[name] = (
+                        headers.get('etag', '').strip('"'),
+                        int(headers.get('content-length', -1)))
+        except ClientException as err:
+            if err.http_status != 404:
+                raise
+        resumable = {}
+        for index, entry in entries.items():
+            location = entry['segment_location']
+            if not location.startswith(location_prefix):
+                continue
+            name = location[len(location_prefix):]
+            if existing.get(name) == (entry['segment_etag'],
+                                      entry['segment_size']):
+                resumable[index] = entry
+        return resumable
+
+    def _get_segment_limits(self):
+        """
+        :returns: A tuple of the cluster's ``min_segment_size``,
+                  ``max_file_size`` and ``max_manifest_segments``, each 0 if
+                  unknown.
+        """
+        if self._segment_limits is None:
+            limits = (0, 0, 0)
+            try:
+                caps = self.capabilities()['capabilities']
+                slo = caps.get('slo', {})
+                limits = (
+                    int(slo.get('min_segment_size', 0)),
+                    int(caps.get('swift', {}).get('max_file_size', 0)),
+                    int(slo.get('max_manifest_segments', 0)))
+            except Exception:
+                logger.debug('Unable to get segment size limits',
+                             exc_info=True)
+            self._segment_limits = limits
+        return self._segment_limits
+
+    def _record_segment_throughput(self, segment_result):
+        elapsed = (segment_result.get('finish_time', 0) -
+                   segment_result.get('start_time', 0))
+        if elapsed <= 0 or not segment_result['segment_size']:
+            return
+        rate = segment_result['segment_size'] / float(elapsed)
+        if self._segment_throughput is None:
+            self._segment_throughput = rate
+        else:
+            self._segment_throughput += 0.3 * (rate - self._segment_throughput)
+
+    def _auto_segment_size(self, full_size, options):
+        """
+        Choose a segment size for an upload.
+
+        Segments are spread evenly over rounds of ``segment_threads``
+        parallel uploads, using as few rounds as the cluster's
+        ``max_file_size`` allows. They are no smaller than the cluster's
+        ``min_segment_size``, ``AUTO_SEGMENT_MIN_SIZE``, or what takes
+        ``AUTO_SEGMENT_MIN_TIME`` seconds to upload at the measured rate.
+        SLOs use larger segments rather than more than
+        ``max_manifest_segments`` of them, for as long as ``max_file_size``
+        allows.
+
+        :param full_size: The size of the object, or None if not known.
+        :param options: The upload options.
+        :returns: The segment size, in bytes.
+        """
+        min_segment_size, max_file_size, max_manifest_segments = \
+            self._get_segment_limits()
+        max_file_size = max_file_size or DEFAULT_MAX_FILE_SIZE
+        max_manifest_segments = (max_manifest_segments or
+                                 DEFAULT_MAX_MANIFEST_SEGMENTS)
+        smallest = max(min_segment_size, AUTO_SEGMENT_MIN_SIZE)
+        if self._segment_throughput:
+            smallest = max(smallest, int(
+                self._segment_throughput * AUTO_SEGMENT_MIN_TIME))
+        smallest = min(smallest, max_file_size)
+        if full_size is None:
+            return smallest
+
+        threads = max(1, int(options['segment_threads']))
+        rounds = max(1, -(-full_size // (threads * max_file_size)))
+        size = max(-(-full_size // (threads * rounds)), smallest)
+        if options['use_slo']:
+            size = max(size, -(-full_size // max_manifest_segments))
+        return min(size, max_file_size)
+
+    def _content_chunker(self, segment_size):
+        """
+        Build a chunker for content-defined segments averaging
+        ``segment_size`` bytes, within the cluster's limits on segment size.
+        """
+        min_size = segment_size // 4
+        max_size = segment_size * 2
+        min_segment_size, max_file_size, _max_manifest_segments = \
+            self._get_segment_limits()
+        if min_segment_size:
+            min_size = max(min_size, min_segment_size)
+        if max_file_size:
+            max_size = min(max_size, max_file_size)
+        return ContentDefinedChunker(segment_size, min_size, max_size)
+
     # Stat related methods
     #
     def stat(self, container=None, objects=None, options=None):
@@ -865,19 +1806,35 @@ class SwiftService(object):
                                 'long': False,
                                 'prefix': None,
                                 'delimiter': None,
-                                'header': []
+                                'header': [],
+                                'totals': False,
+                                'group_by': None
                             }
 
+                        If 'totals' or 'group_by' is set, each part also
+                        carries a 'totals' dict mapping each group to the
+                        'count' and 'bytes' of that part of the listing.
+                        'group_by' may be 'content_type' (containers only),
+                        'prefix' or 'prefix:<depth>'.
+
         :returns: A generator for returning the results of the list operation
                   on an account or container. Each result yielded from the
                   generator is either a 'list_account_part' or
                   'list_container_part', containing part of the listing.
+
+        :raises SwiftError:
         """
         if options is not None:
             options = dict(self._options, **options)
         else:
             options = self._options
 
+        group_field, _ = _parse_group_by(options.get('group_by'))
+        if container is None and group_field == 'content_type':
+            raise SwiftError(
+                'Grouping by content_type is only allowed for container '
+                'listings')
+
         rq = Queue(maxsize=10)  # Just stop list running away consuming memory
 
         if container is None:
@@ -902,6 +1859,7 @@ class SwiftService(object):
         marker = ''
         error = None
         req_headers = split_headers(options.get('header', []))
+        totals = options.get('totals') or options.get('group_by')
         try:
             while True:
                 _, items = conn.get_account(
@@ -913,7 +1871,9 @@ class SwiftService(object):
                     result_queue.put(None)
                     return
 
-                if options['long']:
+                # Container metadata is only needed to print each container,
+                # so don't HEAD every container when only reporting totals
+                if options['long'] and not totals:
                     for i in items:
                         name = i['name']
                         i['meta'] = conn.head_container(name)
@@ -926,6 +1886,9 @@ class SwiftService(object):
                     'listing': items,
                     'marker': marker,
                 }
+                if totals:
+                    res['totals'] = _sum_listing(
+                        items, options.get('group_by'))
                 result_queue.put(res)
 
                 marker = items[-1].get('name', items[-1].get('subdir'))
@@ -963,6 +1926,7 @@ class SwiftService(object):
         marker = options.get('marker', '')
         error = None
         req_headers = split_headers(options.get('header', []))
+        totals = options.get('totals') or options.get('group_by')
         try:
             while True:
                 _, items = conn.get_container(
@@ -982,6 +1946,10 @@ class SwiftService(object):
                     'marker': marker,
                     'listing': items,
                 }
+                if totals:
+                    res['totals'] = _sum_listing(
+                        items, options.get('group_by'),
+                        options['delimiter'])
                 result_queue.put(res)
 
                 marker = items[-1].get('name', items[-1].get('subdir'))
@@ -1025,7 +1993,9 @@ class SwiftService(object):
         of objects.
 
         :param container: The container to download from.
-        :param objects: A list of object names to download (a list of strings).
+        :param objects: A list, or any other iterable, of object names to
+                        download (strings). Names are only taken from the
+                        iterable as earlier downloads complete.
         :param options: A dictionary containing options to override the global
                         options specified during the service object creation::
 
@@ -1040,6 +2010,10 @@ class SwiftService(object):
                                 'checksum': True,
                                 'out_file': None,
                                 'remove_prefix': False,
+                                'resume_download': False,
+                                'preallocate': True,
+                                'fadvise': False,
+                                'decompress': True,
                                 'shuffle' : False
                             }
 
@@ -1063,19 +2037,8 @@ class SwiftService(object):
                     options_copy = deepcopy(options)
                     options_copy["long"] = False
 
-                    for part in self.list(options=options_copy):
-                        if part["success"]:
-                            containers = [i['name'] for i in part["listing"]]
-
-                            if options['shuffle']:
-                                shuffle(containers)
-
-                            for con in containers:
-                                for res in self._download_container(
-                                        con, options_copy):
-                                    yield res
-                        else:
-                            raise part["error"]
+                    for res in self._download_account(options_copy):
+                        yield res
 
                 # If we see a 404 here, the listing of the account failed
                 except ClientException as err:
@@ -1094,17 +2057,26 @@ class SwiftService(object):
             if '/' in container:
                 raise SwiftError('\'/\' in container name',
                                  container=container)
-            if options['out_file'] and len(objects) > 1:
+            objects = iter(objects)
+            first_objects = list(islice(objects, 2))
+            if options['out_file'] and len(first_objects) > 1:
                 options['out_file'] = None
 
-            o_downs = [
-                self.thread_manager.object_dd_pool.submit(
-                    self._download_object_job, container, obj, options
-                ) for obj in objects
-            ]
+            rq = Queue()
+            submit = self.thread_manager.object_dd_pool.submit
+            jobs = ((partial(submit, self._download_object_job, container,
+                             obj, options),
+                     {'action': 'download_object', 'container': container,
+                      'object': obj})
+                    for obj in chain(first_objects, objects))
+            self._start_job_watcher(jobs, rq, options, Event())
 
-            for o_down in interruptable_as_completed(o_downs):
-                yield o_down.result()
+            res = get_from_queue(rq)
+            while res is not None:
+                if isinstance(res, Exception):
+                    raise res
+                yield res
+                res = get_from_queue(rq)
 
     def _download_object_job(self, conn, container, obj, options):
         out_file = options['out_file']
@@ -1140,6 +2112,17 @@ class SwiftService(object):
                         md5sum.update(data)
                     req_headers['If-None-Match'] = md5sum.hexdigest()
 
+        part_download = None
+        resume_state = None
+        if (not options['skip_identical'] and options['resume_download']
+                and not options['no_download'] and out_file != '-'
+                and basename(out_file or path)):
+            part_download = _PartialDownload(out_file or path)
+            resume_state = part_download.load()
+            if resume_state is not None:
+                req_headers['Range'] = 'bytes=%d-' % resume_state['offset']
+                req_headers['If-Match'] = resume_state['etag']
+
         try:
             start_time = time()
             get_args = {'resp_chunk_size': DISK_BUFFER,
@@ -1154,23 +2137,35 @@ class SwiftService(object):
             try:
                 headers, body = conn.get_object(container, obj, **get_args)
             except ClientException as e:
-                if not options['skip_identical']:
+                if resume_state is not None and e.http_status in (412, 416):
+                    # The object has changed since the partial download
+                    # began, so start again from the beginning
+                    part_download.discard()
+                    resume_state = None
+                    del req_headers['Range']
+                    del req_headers['If-Match']
+                    results_dict.clear()
+                    headers, body = conn.get_object(
+                        container, obj, **get_args)
+                elif not options['skip_identical']:
                     raise
-                if e.http_status != 304:  # Only handling Not Modified
+                elif e.http_status != 304:  # Only handling Not Modified
                     raise
-
-                headers = results_dict['headers']
-                if 'x-object-manifest' in headers:
-                    # DLO: most likely it has more than one page worth of
-                    #      segments and we have an empty file locally
-                    body = []
-                elif config_true_value(headers.get('x-static-large-object')):
-                    # SLO: apparently we have a copy of the manifest locally?
-                    #      provide no chunking data to force a fresh download
-                    body = [b'[]']
                 else:
-                    # Normal object: let it bubble up
-                    raise
+                    headers = results_dict['headers']
+                    if 'x-object-manifest' in headers:
+                        # DLO: most likely it has more than one page worth of
+                        #      segments and we have an empty file locally
+                        body = []
+                    elif config_true_value(
+                            headers.get('x-static-large-object')):
+                        # SLO: apparently we have a copy of the manifest
+                        #      locally? provide no chunking data to force a
+                        #      fresh download
+                        body = [b'[]']
+                    else:
+                        # Normal object: let it bubble up
+                        raise
 
             if options['skip_identical']:
                 if config_true_value(headers.get('x-static-large-object')) or \
@@ -1191,10 +2186,49 @@ class SwiftService(object):
                     get_args['response_dict'].clear()
                     headers, body = conn.get_object(container, obj, **get_args)
 
+            decompress = (options['decompress'] and
+                          bool(headers.get(COMPRESSION_META)))
+            if decompress and part_download is not None:
+                # What's on disk is decompressed, so can't be resumed with a
+                # range of the compressed object
+                part_download.discard()
+                part_download = None
+                if resume_state is not None:
+                    resume_state = None
+                    del req_headers['Range']
+                    del req_headers['If-Match']
+                    results_dict.clear()
+                    headers, body = conn.get_object(
+                        container, obj, **get_args)
+
             headers_receipt = time()
 
-            obj_body = _SwiftReader(path, body, headers,
-                                    options.get('checksum', True))
+            offset = 0
+            content_length = headers.get('content-length')
+            if decompress:
+                # The length on disk isn't known
+                content_length = None
+            reader_headers = headers
+            if resume_state is not None:
+                expected_range = 'bytes %d-%d/%d' % (
+                    resume_state['offset'], resume_state['content_length'] - 1,
+                    resume_state['content_length'])
+                if headers.get('content-range') == expected_range:
+                    offset = resume_state['offset']
+                    content_length = resume_state['content_length']
+                    # Check the whole object, not just the range we got
+                    reader_headers = dict(headers)
+                    del reader_headers['content-range']
+                    reader_headers['content-length'] = str(content_length)
+                # Otherwise the server sent the whole object
+
+            obj_body = _SwiftReader(path, body, reader_headers,
+                                    options.get('checksum', True),
+                                    decompress)
+            if offset:
+                part_path = part_download.part_path
+                with open(part_path, 'rb', DISK_BUFFER) as part_fp:
+                    obj_body.resume(part_fp, offset)
 
             no_file = options['no_download']
             if out_file == "-" and not no_file:
@@ -1208,51 +2242,31 @@ class SwiftService(object):
                 }
                 return res
 
-            fp = None
+            download_file = _DownloadFile(
+                path, out_file, options, headers, part_download, offset,
+                content_length, self._dir_cache)
+            pseudodir = pseudodir or download_file.pseudodir
+            # Leave room in the ring of buffers for the chunk being written
+            # and the one being read
+            writer = _DiskWriter(self.thread_manager.disk_pool,
+                                 DOWNLOAD_BUFFERS - 2)
             try:
-                content_type = headers.get('content-type', '').split(';', 1)[0]
-                if content_type in KNOWN_DIR_MARKERS:
-                    make_dir = not no_file and out_file != "-"
-                    if make_dir and not isdir(path):
-                        mkdirs(path)
-
-                else:
-                    make_dir = not (no_file or out_file)
-                    if make_dir:
-                        dirpath = dirname(path)
-                        if dirpath and not isdir(dirpath):
-                            mkdirs(dirpath)
-
-                    if not no_file:
-                        if out_file:
-                            fp = open(out_file, 'wb', DISK_BUFFER)
-                        else:
-                            if basename(path):
-                                fp = open(path, 'wb', DISK_BUFFER)
-                            else:
-                                pseudodir = True
-
-                for chunk in obj_body:
-                    if fp is not None:
-                        fp.write(chunk)
-
+                writer.submit(download_file.open)
+                try:
+                    for chunk in obj_body.iter_into(_download_buffers()):
+                        writer.submit(download_file.write, chunk)
+                except SwiftError:
+                    writer.submit(download_file.discard)
+                    raise
+                writer.submit(download_file.complete)
+                writer.join()
+                if writer.error is not None:
+                    raise writer.error
                 finish_time = time()
-
             finally:
                 bytes_read = obj_body.bytes_read()
-                if fp is not None:
-                    fp.close()
-                    if ('x-object-meta-mtime' in headers and not no_file
-                            and not options['ignore_mtime']):
-                        try:
-                            mtime = float(headers['x-object-meta-mtime'])
-                        except ValueError:
-                            pass  # no real harm; couldn't trust it anyway
-                        else:
-                            if options['out_file']:
-                                utime(options['out_file'], (mtime, mtime))
-                            else:
-                                utime(path, (mtime, mtime))
+                writer.join()
+                download_file.close()
 
             res = {
                 'action': 'download_object',
@@ -1269,6 +2283,8 @@ class SwiftService(object):
                 'attempts': conn.attempts,
                 'response_dict': results_dict
             }
+            if offset:
+                res['resumed_from'] = offset
             return res
 
         except Exception as err:
@@ -1289,6 +2305,107 @@ class SwiftService(object):
             }
             return res
 
+    def _account_containers(self, options):
+        for part in self.list(options=options):
+            if not part["success"]:
+                raise part["error"]
+            containers = [i['name'] for i in part["listing"]]
+            if options['shuffle']:
+                shuffle(containers)
+            for con in containers:
+                yield con
+
+    @staticmethod
+    def _download_list_page_job(conn, container, marker, options):
+        try:
+            _, items = conn.get_container(
+                container, marker=marker, prefix=options['prefix'],
+                delimiter=options['delimiter'],
+                headers=split_headers(options['header'])
+            )
+        except ClientException as err:
+            if err.http_status != 404:
+                raise
+            raise SwiftError(
+                'Container %r not found' % container,
+                container=container, exc=err
+            )
+        return [o["name"] for o in items]
+
+    def _download_account(self, options):
+        """
+        Download every container in the account.
+
+        Listings of up to ``container_threads`` containers are fetched
+        concurrently, and their objects are fed into one bounded queue of
+        downloads so that the object threads stay busy across container
+        boundaries.
+        """
+        containers = self._account_containers(options)
+        # Containers to list next, as (container, marker) tuples
+        to_list = deque()
+        listings = {}
+        pending = deque()
+        downloads = set()
+        max_listings = options['container_threads']
+        max_downloads = 2 * options['object_dd_threads']
+        # Only list further pages while few downloads are waiting
+        max_pending = 10 * options['object_dd_threads']
+        error = None
+
+        while True:
+            while (error is None and len(listings) < max_listings and
+                   len(pending) < max_pending):
+                if not to_list:
+                    try:
+                        to_list.append((next(containers), ''))
+                    except StopIteration:
+                        break
+                container, marker = to_list.popleft()
+                listing = self.thread_manager.container_pool.submit(
+                    self._download_list_page_job, container, marker, options
+                )
+                listings[listing] = container
+
+            while error is None and pending and \
+                    len(downloads) < max_downloads:
+                container, obj = pending.popleft()
+                downloads.add(self.thread_manager.object_dd_pool.submit(
+                    self._download_object_job, container, obj, options
+                ))
+
+            if not (listings or downloads):
+                break
+
+            done, _ = wait(set(listings) | downloads, timeout=86400,
+                           return_when=FIRST_COMPLETED)
+            for f in done:
+                if f in downloads:
+                    downloads.remove(f)
+                    yield f.result()
+                    continue
+                container = listings.pop(f)
+                try:
+                    objects = f.result()
+                except Exception as err:
+                    # Allow the downloads already started to finish
+                    logger.exception(err)
+                    error = error or err
+                    continue
+                if objects:
+                    to_list.append((container, objects[-1]))
+                    if options["shuffle"]:
+                        shuffle(objects)
+                    pending.extend((container, obj) for obj in objects)
+
+            if error is not None:
+                for f in listings:
+                    f.cancel()
+                listings.clear()
+
+        if error is not None:
+            raise error
+
     def _submit_page_downloads(self, container, page_generator, options):
         try:
             list_page = next(page_generator)
@@ -1309,60 +2426,369 @@ class SwiftService(object):
 
             return o_downs
         else:
-            raise list_page["error"]
+            raise list_page["error"]
+
+    def _download_container(self, container, options):
+        _page_generator = self.list(container=container, options=options)
+        try:
+            next_page_downs = self._submit_page_downloads(
+                container, _page_generator, options
+            )
+        except ClientException as err:
+            if err.http_status != 404:
+                raise
+            raise SwiftError(
+                'Container %r not found' % container,
+                container=container, exc=err
+            )
+
+        error = None
+        while next_page_downs:
+            page_downs = next_page_downs
+            next_page_downs = None
+
+            # Start downloading the next page of list results when
+            # we have completed 80% of the previous page
+            next_page_triggered = False
+            next_page_trigger_point = 0.8 * len(page_downs)
+
+            page_results_yielded = 0
+            for o_down in interruptable_as_completed(page_downs):
+                yield o_down.result()
+
+                # Do we need to start the next set of downloads yet?
+                if not next_page_triggered:
+                    page_results_yielded += 1
+                    if page_results_yielded >= next_page_trigger_point:
+                        try:
+                            next_page_downs = self._submit_page_downloads(
+                                container, _page_generator, options
+                            )
+                        except ClientException as err:
+                            # Allow the current page to finish downloading
+                            logger.exception(err)
+                            error = err
+                        except Exception:
+                            # Something unexpected went wrong - cancel
+                            # remaining downloads
+                            for _d in page_downs:
+                                _d.cancel()
+                            raise
+                        finally:
+                            # Stop counting and testing
+                            next_page_triggered = True
+
+        if error:
+            raise error
+
+    def download_archive(self, container, fileobj, objects=None,
+                         options=None):
+        """
+        Download objects from a container into a tar archive, written as a
+        stream to a file object.
+
+        Objects are fetched concurrently, up to twice ``object_dd_threads``
+        of them ahead of the one being written, but are added to the archive
+        in order, and only a few chunks of each are held in memory. An
+        object's ``x-object-meta-mtime`` is used as its mtime in the archive,
+        unless ``ignore_mtime`` is set; directory markers are added as
+        directories.
+
+        :param container: The container to download from.
+        :param fileobj: A file-like object to write the archive to. It only
+                        needs a ``write`` method, so may be a pipe or socket.
+        :param objects: A list of object names to add to the archive, in
+                        order. If None, every object in the container (or
+                        under ``prefix``) is added, in listing order.
+        :param options: A dictionary containing options to override the global
+                        options specified during the service object creation.
+                        The options used are those of :meth:`download`::
+
+                            {
+                                'marker': '',
+                                'prefix': None,
+                                'header': [],
+                                'checksum': True,
+                                'decompress': True,
+                                'remove_prefix': False,
+                                'ignore_mtime': False
+                            }
+
+        :returns: A generator returning a 'download_object' dictionary for
+                  each object, in the order they are added to the archive.
+                  An object that can't be downloaded is left out of the
+                  archive. If an object fails part way through, the archive
+                  can't be completed, so no more objects are added after its
+                  result.
+
+        :raises ClientException:
+        :raises SwiftError:
+        """
+        if options is not None:
+            options = dict(self._options, **options)
+        else:
+            options = self._options
+
+        if '/' in container:
+            raise SwiftError('\'/\' in container name',
+                             container=container)
+        if objects is None:
+            objects = self._iter_object_names(container, options)
+        objects = iter(objects)
+
+        abort = Event()
+        members = deque()
+        max_pending = 2 * options['object_dd_threads']
+        tar = tarfile.open(fileobj=fileobj, mode='w|',
+                           format=tarfile.PAX_FORMAT)
+        try:
+            while True:
+                for obj in islice(objects, max_pending - len(members)):
+                    path = obj
+                    if options['prefix'] and options['remove_prefix']:
+                        path = path[len(options['prefix']):].lstrip('/')
+                    member = _QueuedBody(path, QUEUED_CHUNKS, abort)
+                    member.future = self.thread_manager.object_dd_pool.submit(
+                        self._archive_object_job, container, obj, member,
+                        options
+                    )
+                    members.append(member)
+                if not members:
+                    break
+                res, written = self._add_archive_member(
+                    tar, members.popleft(), options)
+                yield res
+                if not written:
+                    # The archive ends part way through the member, so
+                    # nothing more can be added to it
+                    return
+            tar.close()
+        finally:
+            abort.set()
+            for member in members:
+                member.future.cancel()
+
+    def _iter_object_names(self, container, options):
+        for page in self.list(container=container, options=options):
+            if not page['success']:
+                err = page['error']
+                if isinstance(err, ClientException) and \
+                        err.http_status == 404:
+                    raise SwiftError('Container %r not found' % container,
+                                     container=container, exc=err)
+                raise err
+            for item in page['listing']:
+                if 'name' in item:
+                    yield item['name']
+
+    @staticmethod
+    def _archive_object_job(conn, container, obj, member, options):
+        results_dict = {}
+        req_headers = split_headers(options['header'], '')
+        obj_body = None
+        try:
+            start_time = time()
+            headers, body = conn.get_object(
+                container, obj, resp_chunk_size=DISK_BUFFER,
+                headers=req_headers, response_dict=results_dict)
+            headers_receipt = time()
+            obj_body = _SwiftReader(member.path, body, headers,
+                                    options.get('checksum', True),
+                                    options['decompress'])
+            member.put(headers)
+            for chunk in obj_body:
+                member.put(chunk)
+            finish_time = time()
+            return {
+                'action': 'download_object',
+                'success': True,
+                'container': container,
+                'object': obj,
+                'path': member.path,
+                'start_time': start_time,
+                'finish_time': finish_time,
+                'headers_receipt': headers_receipt,
+                'auth_end_time': conn.auth_end_time,
+                'read_length': obj_body.bytes_read(),
+                'attempts': conn.attempts,
+                'response_dict': results_dict
+            }
+        except Exception as err:
+            traceback, err_time = report_traceback()
+            logger.exception(err)
+            return {
+                'action': 'download_object',
+                'container': container,
+                'object': obj,
+                'success': False,
+                'error': err,
+                'traceback': traceback,
+                'error_timestamp': err_time,
+                'response_dict': results_dict,
+                'path': member.path,
+                'attempts': conn.attempts
+            }
+
+    @staticmethod
+    def _add_archive_member(tar, member, options):
+        """
+        Write an object to the archive as its download job passes it along.
+
+        :returns: A tuple of the job's result and whether the archive can
+                  still be added to.
+        """
+        headers = member.get()
+        if headers is None:
+            # The download failed before anything was written
+            res = member.future.result()
+            res['pseudodir'] = False
+            return res, True
+
+        info = tarfile.TarInfo(member.path)
+        info.mode = 0o644
+        info.mtime = time()
+        last_modified = parsedate_tz(headers.get('last-modified', ''))
+        if last_modified is not None:
+            info.mtime = mktime_tz(last_modified)
+        if 'x-object-meta-mtime' in headers and not options['ignore_mtime']:
+            try:
+                info.mtime = float(headers['x-object-meta-mtime'])
+            except ValueError:
+                pass  # fall back to when the object was last modified
+        pseudodir = (headers.get('content-type') in KNOWN_DIR_MARKERS or
+                     member.path.endswith('/'))
+        body = member
+        if pseudodir:
+            info.type = tarfile.DIRTYPE
+            info.mode = 0o755
+            info.name = member.path.rstrip('/')
+            body = None
+        elif 'content-length' in headers and not (
+                options['decompress'] and headers.get(COMPRESSION_META)):
+            info.size = int(headers['content-length'])
+        else:
+            # The size goes before the data, so it has to be known first;
+            # that of a decompressed object isn't known until the end
+            body = BytesIO(member.read())
+            info.size = len(body.getvalue())
 
-    def _download_container(self, container, options):
-        _page_generator = self.list(container=container, options=options)
         try:
-            next_page_downs = self._submit_page_downloads(
-                container, _page_generator, options
-            )
-        except ClientException as err:
-            if err.http_status != 404:
-                raise
-            raise SwiftError(
-                'Container %r not found' % container,
-                container=container, exc=err
-            )
-
-        error = None
-        while next_page_downs:
-            page_downs = next_page_downs
-            next_page_downs = None
+            if info.name:
+                tar.addfile(info, body)
+        except Exception as err:
+            member.cancel()
+            res = member.future.result()
+            if res['success']:
+                traceback, err_time = report_traceback()
+                logger.exception(err)
+                res.update(success=False, error=err, traceback=traceback,
+                           error_timestamp=err_time)
+            res['pseudodir'] = pseudodir
+            return res, False
+
+        # Wait for the job, which checks the body once it has all been read
+        member.drain()
+        res = member.future.result()
+        res['pseudodir'] = pseudodir
+        return res, True
+
+    def iter_objects(self, container, prefix=None, shuffle_buffer=0,
+                     prefetch=None, stream=False, options=None):
+        """
+        Read the objects in a container, or under a prefix, in turn.
+
+        The listing is streamed, and up to ``prefetch`` objects after the one
+        being read are downloaded concurrently, so that reading them isn't
+        held up waiting for each request in turn.
+
+        :param container: The container to read objects from.
+        :param prefix: Only read objects whose names begin with this.
+        :param shuffle_buffer: If greater than 1, objects are read in a random
+                               order, shuffled within a window of this many
+                               names from the listing.
+        :param prefetch: How many objects to download ahead of the one being
+                         read. Defaults to ``object_dd_threads``.
+        :param stream: If True, each object's body is a file-like object
+                       holding only a few chunks in memory at a time, which
+                       must be read before asking for the next object;
+                       whatever is left of it is then discarded. Otherwise
+                       it is the whole body, as bytes.
+        :param options: A dictionary containing options to override the global
+                        options specified during the service object creation.
+                        The ``header``, ``checksum`` and ``decompress``
+                        options are used as they are by :meth:`download`.
 
-            # Start downloading the next page of list results when
-            # we have completed 80% of the previous page
-            next_page_triggered = False
-            next_page_trigger_point = 0.8 * len(page_downs)
+        :returns: A generator of ``(name, headers, body)`` tuples. Objects
+                  deleted since they were listed are skipped.
 
-            page_results_yielded = 0
-            for o_down in interruptable_as_completed(page_downs):
-                yield o_down.result()
+        :raises ClientException:
+        :raises SwiftError:
+        """
+        if options is not None:
+            options = dict(self._options, **options)
+        else:
+            options = self._options
 
-                # Do we need to start the next set of downloads yet?
-                if not next_page_triggered:
-                    page_results_yielded += 1
-                    if page_results_yielded >= next_page_trigger_point:
-                        try:
-                            next_page_downs = self._submit_page_downloads(
-                                container, _page_generator, options
-                            )
-                        except ClientException as err:
-                            # Allow the current page to finish downloading
-                            logger.exception(err)
-                            error = err
-                        except Exception:
-                            # Something unexpected went wrong - cancel
-                            # remaining downloads
-                            for _d in page_downs:
-                                _d.cancel()
-                            raise
-                        finally:
-                            # Stop counting and testing
-                            next_page_triggered = True
+        if '/' in container:
+            raise SwiftError('\'/\' in container name',
+                             container=container)
+        names = self._iter_object_names(
+            container, dict(options, prefix=prefix, delimiter=None))
+        if shuffle_buffer > 1:
+            names = _window_shuffle(names, shuffle_buffer)
+        if prefetch is None:
+            prefetch = options['object_dd_threads']
+
+        abort = Event()
+        pending = deque()
+        try:
+            while True:
+                for name in islice(names, prefetch + 1 - len(pending)):
+                    body = _QueuedBody(name, QUEUED_CHUNKS, abort) \
+                        if stream else None
+                    future = self.thread_manager.object_dd_pool.submit(
+                        self._iter_object_job, container, name, body, options
+                    )
+                    if body is not None:
+                        body.future = future
+                    pending.append((name, future, body))
+                if not pending:
+                    break
+                name, future, body = pending.popleft()
+                try:
+                    if body is None:
+                        headers, data = future.result()
+                    else:
+                        data = body
+                        headers = body.get()
+                        if headers is None:
+                            future.result()
+                except ClientException as err:
+                    if err.http_status != 404:
+                        raise
+                    logger.warning('Object %r not found', name)
+                    continue
+                yield name, headers, data
+                if body is not None:
+                    body.drain()
+        finally:
+            abort.set()
+            for _name, future, _body in pending:
+                future.cancel()
 
-        if error:
-            raise error
+    @staticmethod
+    def _iter_object_job(conn, container, obj, body, options):
+        headers, obj_body = conn.get_object(
+            container, obj, resp_chunk_size=DISK_BUFFER,
+            headers=split_headers(options['header'], ''))
+        reader = _SwiftReader(obj, obj_body, headers, options['checksum'],
+                              options['decompress'])
+        if body is None:
+            return headers, b''.join(reader)
+        body.put(headers)
+        for chunk in reader:
+            body.put(chunk)
+        return headers, None
 
     # Upload related methods
     #
@@ -1372,11 +2798,13 @@ class SwiftService(object):
 
         :param container: The container (or pseudo-folder path) to put the
                           uploads into.
-        :param objects: A list of file/directory names (strings) or
-                        SwiftUploadObject instances containing a source for the
-                        created object, an object name, and an options dict
-                        (can be None) to override the options for that
-                        individual upload operation::
+        :param objects: A list, or any other iterable, of file/directory
+                        names (strings) or SwiftUploadObject instances
+                        containing a source for the created object, an object
+                        name, and an options dict (can be None) to override
+                        the options for that individual upload operation.
+                        Objects are only taken from the iterable as earlier
+                        uploads complete::
 
                             [
                                 '/path/to/file',
@@ -1404,11 +2832,15 @@ class SwiftService(object):
                                 'header': [],
                                 'segment_size': None,
                                 'use_slo': False,
+                                'segment_dedup': None,
+                                'content_chunking': False,
+                                'resume_dir': None,
                                 'segment_container': None,
                                 'leave_segments': False,
                                 'changed': None,
                                 'skip_identical': False,
                                 'fail_fast': False,
+                                'compress': None,
                                 'dir_marker': False  # Only for None sources
                             }
 
@@ -1422,11 +2854,33 @@ class SwiftService(object):
         else:
             options = self._options
 
-        try:
-            segment_size = int(0 if options['segment_size'] is None else
-                               options['segment_size'])
-        except ValueError:
-            raise SwiftError('Segment size should be an integer value')
+        if options['segment_size'] == AUTO_SEGMENT_SIZE:
+            # Chosen for each object as it is uploaded
+            segment_size = AUTO_SEGMENT_SIZE
+        else:
+            try:
+                segment_size = int(0 if options['segment_size'] is None else
+                                   options['segment_size'])
+            except ValueError:
+                raise SwiftError('Segment size should be an integer value')
+
+        if options['segment_dedup']:
+            if options['segment_dedup'] not in DEDUP_HASHES:
+                raise SwiftError(
+                    'segment_dedup should be one of: %s'
+                    % ', '.join(DEDUP_HASHES))
+            if not options['use_slo']:
+                raise SwiftError('segment_dedup can only be used with SLO '
+                                 'uploads (use_slo)')
+
+        if options['compress']:
+            if options['compress'] not in COMPRESSION_CODECS:
+                raise SwiftError(
+                    'compress should be one of: %s'
+                    % ', '.join(COMPRESSION_CODECS))
+            if not compression_available(options['compress']):
+                raise SwiftError('The zstandard package is needed for zstd '
+                                 'compression')
 
         # Incase we have a psudeo-folder path for <container> arg, derive
         # the container name from the top path and prepend the rest to
@@ -1437,28 +2891,43 @@ class SwiftService(object):
         # fails, it might just be because the user doesn't have container PUT
         # permissions, so we'll ignore any error. If there's really a problem,
         # it'll surface on the first object PUT.
+        # Containers created (or found) recently are not created again; see
+        # the container_cache_ttl option.
         policy_header = {}
         _header = split_headers(options["header"])
         if POLICY in _header:
             policy_header[POLICY] = \
                 _header[POLICY]
-        create_containers = [
-            self.thread_manager.container_pool.submit(
-                self._create_container_job, container, headers=policy_header)
-        ]
+        create_containers = []
+        if not self._container_cached(container, policy_header.get(POLICY)):
+            create_containers.append(
+                self.thread_manager.container_pool.submit(
+                    self._create_container_job, container,
+                    headers=policy_header)
+            )
 
         # wait for first container job to complete before possibly attempting
         # segment container job because segment container job may attempt
         # to HEAD the first container
         for r in interruptable_as_completed(create_containers):
             res = r.result()
+            if res['success']:
+                self._cache_container(
+                    container, policy_header.get(POLICY), options)
             yield res
 
         if segment_size:
             seg_container = container + '_segments'
             if options['segment_container']:
                 seg_container = options['segment_container']
-            if seg_container != container:
+            if not policy_header:
+                # We may already know the upload container's policy, in
+                # which case there's no need to HEAD it
+                cached_policy = self._cached_container_policy(container)
+                if cached_policy is not None:
+                    policy_header = {POLICY: cached_policy}
+            if seg_container != container and not self._container_cached(
+                    seg_container, policy_header.get(POLICY)):
                 if not policy_header:
                     # Since no storage policy was specified on the command
                     # line, rather than just letting swift pick the default
@@ -1480,14 +2949,37 @@ class SwiftService(object):
 
                 for r in interruptable_as_completed(create_containers):
                     res = r.result()
+                    if res['success']:
+                        self._cache_container(
+                            seg_container, policy_header.get(POLICY), options)
                     yield res
 
-        # We maintain a results queue here and a separate thread to monitor
-        # the futures because we want to get results back from potential
-        # segment uploads too
+        # We maintain a results queue here and a separate thread to submit
+        # jobs and monitor the futures because we want to get results back
+        # from potential segment uploads too
         rq = Queue()
-        file_jobs = {}
+        cancelled = Event()
+        jobs = self._upload_jobs(container, objects, pseudo_folder, options,
+                                 rq)
+
+        # Start a thread to submit the uploads and watch for their results
+        self._start_job_watcher(jobs, rq, options, cancelled)
+
+        # yield results as they become available, including those from
+        # segment uploads.
+        res = get_from_queue(rq)
+        while res is not None:
+            if isinstance(res, Exception):
+                raise res
+            yield res
+
+            if not res['success'] and options['fail_fast']:
+                cancelled.set()
 
+            res = get_from_queue(rq)
+
+    def _upload_jobs(self, container, objects, pseudo_folder, options, rq):
+        submit = self.thread_manager.object_uu_pool.submit
         upload_objects = self._make_upload_objects(objects, pseudo_folder)
         for upload_object in upload_objects:
             s = upload_object.source
@@ -1501,32 +2993,20 @@ class SwiftService(object):
                 object_options = options
             if hasattr(s, 'read'):
                 # We've got a file like object to upload to o
-                file_future = self.thread_manager.object_uu_pool.submit(
-                    self._upload_object_job, container, s, o, object_options,
-                    results_queue=rq
-                )
                 details['file'] = s
                 details['object'] = o
-                file_jobs[file_future] = details
+                yield partial(
+                    submit, self._upload_object_job, container, s, o,
+                    object_options, results_queue=rq
+                ), details
             elif s is not None:
                 # We've got a path to upload to o
                 details['path'] = s
                 details['object'] = o
-                if isdir(s):
-                    dir_future = self.thread_manager.object_uu_pool.submit(
-                        self._create_dir_marker_job, container, o,
-                        object_options, path=s
-                    )
-                    file_jobs[dir_future] = details
-                else:
+                st = upload_object.stat_result
+                if st is None:
                     try:
-                        stat(s)
-                        file_future = \
-                            self.thread_manager.object_uu_pool.submit(
-                                self._upload_object_job, container, s, o,
-                                object_options, results_queue=rq
-                            )
-                        file_jobs[file_future] = details
+                        st = stat(s)
                     except OSError as err:
                         # Avoid tying up threads with jobs that will fail
                         traceback, err_time = report_traceback()
@@ -1542,63 +3022,47 @@ class SwiftService(object):
                             'path': s
                         }
                         rq.put(res)
+                        continue
+                if S_ISDIR(st.st_mode):
+                    yield partial(
+                        submit, self._create_dir_marker_job, container, o,
+                        object_options, path=s, stat_result=st
+                    ), details
+                else:
+                    yield partial(
+                        submit, self._upload_object_job, container, s, o,
+                        object_options, results_queue=rq, stat_result=st
+                    ), details
             else:
                 # Create an empty object (as a dir marker if is_dir)
                 details['file'] = None
                 details['object'] = o
                 if object_options['dir_marker']:
-                    dir_future = self.thread_manager.object_uu_pool.submit(
-                        self._create_dir_marker_job, container, o,
+                    yield partial(
+                        submit, self._create_dir_marker_job, container, o,
                         object_options
-                    )
-                    file_jobs[dir_future] = details
+                    ), details
                 else:
-                    file_future = self.thread_manager.object_uu_pool.submit(
-                        self._upload_object_job, container, StringIO(),
-                        o, object_options
-                    )
-                    file_jobs[file_future] = details
-
-        # Start a thread to watch for upload results
-        Thread(
-            target=self._watch_futures, args=(file_jobs, rq)
-        ).start()
-
-        # yield results as they become available, including those from
-        # segment uploads.
-        res = get_from_queue(rq)
-        cancelled = False
-        while res is not None:
-            yield res
-
-            if not res['success']:
-                if not cancelled and options['fail_fast']:
-                    cancelled = True
-                    for f in file_jobs:
-                        f.cancel()
-
-            res = get_from_queue(rq)
+                    yield partial(
+                        submit, self._upload_object_job, container,
+                        StringIO(), o, object_options
+                    ), details
 
     @staticmethod
     def _make_upload_objects(objects, pseudo_folder=''):
-        upload_objects = []
-
         for o in objects:
             if isinstance(o, string_types):
-                obj = SwiftUploadObject(o, urljoin(pseudo_folder,
+                yield SwiftUploadObject(o, urljoin(pseudo_folder,
                                                    o.lstrip('/')))
-                upload_objects.append(obj)
             elif isinstance(o, SwiftUploadObject):
                 o.object_name = urljoin(pseudo_folder, o.object_name)
-                upload_objects.append(o)
+                yield o
             else:
                 raise SwiftError(
                     "The upload operation takes only strings or "
                     "SwiftUploadObjects as input",
                     obj=o)
 
-        return upload_objects
-
     @staticmethod
     def _create_container_job(
             conn, container, headers=None, policy_source=None):
@@ -1651,7 +3115,8 @@ class SwiftService(object):
         return res
 
     @staticmethod
-    def _create_dir_marker_job(conn, container, obj, options, path=None):
+    def _create_dir_marker_job(conn, container, obj, options, path=None,
+                               stat_result=None):
         res = {
             'action': 'create_dir_marker',
             'container': container,
@@ -1664,7 +3129,10 @@ class SwiftService(object):
         if obj.startswith('/'):
             obj = obj[1:]
         if path is not None:
-            put_headers = {'x-object-meta-mtime': "%f" % getmtime(path)}
+            if stat_result is None:
+                stat_result = stat(path)
+            put_headers = {
+                'x-object-meta-mtime': "%f" % stat_result.st_mtime}
         else:
             put_headers = {'x-object-meta-mtime': "%f" % round(time())}
         res['headers'] = put_headers
@@ -1735,6 +3203,7 @@ class SwiftService(object):
         }
         fp = None
         try:
+            start_time = time()
             fp = open(path, 'rb', DISK_BUFFER)
             fp.seek(segment_start)
 
@@ -1759,6 +3228,8 @@ class SwiftService(object):
                 'success': True,
                 'response_dict': results_dict,
                 'segment_etag': etag,
+                'start_time': start_time,
+                'finish_time': time(),
                 'attempts': conn.attempts
             })
 
@@ -1785,6 +3256,89 @@ class SwiftService(object):
             if fp is not None:
                 fp.close()
 
+    @staticmethod
+    def _upload_dedup_segment_job(conn, path, container, segment_start,
+                                  segment_size, segment_index, obj_name,
+                                  options, results_queue=None):
+        """
+        Upload a segment named by a hash of its content, unless a segment
+        with that content already exists in the segments container.
+
+        The segment is named ``_dedup/<hash>/<hexdigest>/<size>``, so that
+        identical segments of any object (or of the same object uploaded
+        again after its mtime changed) share a single segment object.
+        """
+        if options['segment_container']:
+            segment_container = options['segment_container']
+        else:
+            segment_container = container + '_segments'
+
+        res = {
+            'action': 'upload_segment',
+            'for_container': container,
+            'for_object': obj_name,
+            'segment_index': segment_index,
+            'segment_size': segment_size,
+            'log_line': '%s segment %s' % (obj_name, segment_index),
+        }
+        try:
+            hash_name = options['segment_dedup']
+            content_hash = new_hash(hash_name)
+            md5_hash = content_hash if hash_name == 'md5' else md5()
+            with open(path, 'rb', DISK_BUFFER) as fp:
+                fp.seek(segment_start)
+                remaining = segment_size
+                while remaining > 0:
+                    chunk = fp.read(min(DISK_BUFFER, remaining))
+                    if not chunk:
+                        break
+                    content_hash.update(chunk)
+                    if md5_hash is not content_hash:
+                        md5_hash.update(chunk)
+                    remaining -= len(chunk)
+            segment_name = '%s%s/%s/%d' % (
+                DEDUP_SEGMENT_PREFIX, hash_name, content_hash.hexdigest(),
+                segment_size)
+            segment_etag = md5_hash.hexdigest()
+            res['segment_location'] = '/%s/%s' % (segment_container,
+                                                  segment_name)
+
+            try:
+                headers = conn.head_object(segment_container, segment_name)
+            except ClientException as err:
+                if err.http_status != 404:
+                    raise
+            else:
+                if (headers.get('etag', '').strip('"') == segment_etag and
+                        int(headers.get('content-length', -1)) ==
+                        segment_size):
+                    res.update({
+                        'success': True,
+                        'deduplicated': True,
+                        'segment_etag': segment_etag,
+                        'attempts': conn.attempts
+                    })
+                    if results_queue is not None:
+                        results_queue.put(res)
+                    return res
+        except Exception as err:
+            traceback, err_time = report_traceback()
+            logger.exception(err)
+            res.update({
+                'success': False,
+                'error': err,
+                'traceback': traceback,
+                'error_timestamp': err_time,
+                'attempts': conn.attempts
+            })
+            if results_queue is not None:
+                results_queue.put(res)
+            return res
+
+        return SwiftService._upload_segment_job(
+            conn, path, container, segment_name, segment_start, segment_size,
+            segment_index, obj_name, options, results_queue=results_queue)
+
     @staticmethod
     def _put_object(conn, container, name, content, headers=None, md5=None):
         """
@@ -1844,7 +3398,7 @@ class SwiftService(object):
     def _upload_stream_segment(conn, container, object_name,
                                segment_container, segment_name,
                                segment_size, segment_index,
-                               headers, fd):
+                               headers, fd, last=False):
         """
         Upload a segment from a stream, buffering it in memory first. The
         resulting object is placed either as a segment in the segment
@@ -1861,6 +3415,8 @@ class SwiftService(object):
         :param segment_index: The segment index.
         :param headers: Headers to attach to the segment/object.
         :param fd: File-like handle for the content. Must implement read().
+        :param last: Whether this segment is known to be the last one, even
+                     if it is a whole segment_size long.
 
         :returns: Dictionary, containing the following keys:
                     - complete -- whether the stream is exhausted
@@ -1892,7 +3448,8 @@ class SwiftService(object):
                     'segment_location': None,
                     'success': True}
 
-        if segment_index == 0 and len(buf) < segment_size:
+        complete = last or len(buf) < segment_size
+        if segment_index == 0 and complete:
             ret = SwiftService._put_object(
                 conn, container, object_name, buf, headers, segment_hash)
             ret['segment_location'] = '/%s/%s' % (container, object_name)
@@ -1904,14 +3461,15 @@ class SwiftService(object):
                 segment_container, segment_name)
 
         ret.update(
-            dict(complete=len(buf) < segment_size,
+            dict(complete=complete,
                  segment_size=len(buf),
                  segment_index=segment_index,
                  segment_etag=segment_hash,
                  for_object=object_name))
         return ret
 
-    def _get_chunk_data(self, conn, container, obj, headers, manifest=None):
+    def _get_chunk_data(self, conn, container, obj, headers, manifest=None,
+                        sub_manifests=None):
         chunks = []
         if 'x-object-manifest' in headers:
             scontainer, sprefix = headers['x-object-manifest'].split('/', 1)
@@ -1928,10 +3486,18 @@ class SwiftService(object):
             for chunk in manifest:
                 if chunk.get('sub_slo'):
                     scont, sobj = chunk['name'].lstrip('/').split('/', 1)
+                    if sub_manifests is not None:
+                        sub_manifests.append(chunk['name'])
                     chunks.extend(self._get_chunk_data(
-                        conn, scont, sobj, {'x-static-large-object': True}))
+                        conn, scont, sobj, {'x-static-large-object': True},
+                        sub_manifests=sub_manifests))
                 else:
                     chunks.append(chunk)
+        elif headers.get(COMPRESSION_META):
+            # Compare with the data as it was before it was compressed
+            chunks.append({'hash': headers.get(UNCOMPRESSED_MD5_META),
+                           'bytes': int(headers.get(UNCOMPRESSED_SIZE_META,
+                                                    0))})
         else:
             chunks.append({'hash': headers.get('etag').strip('"'),
                            'bytes': int(headers.get('content-length'))})
@@ -2001,8 +3567,61 @@ class SwiftService(object):
             response_dict=response)
         return response
 
+    def _upload_nested_slo_manifest(self, conn, segment_results, container,
+                                    obj, headers, seg_container,
+                                    sub_manifest_prefix):
+        """
+        Upload an SLO manifest, first grouping the segments into
+        sub-manifests in the segments container if there are more than the
+        cluster's ``max_manifest_segments``.
+
+        :param segment_results: As for _upload_slo_manifest.
+        :param container: The container to put the manifest into.
+        :param obj: The name of the manifest object to use.
+        :param headers: Optional set of headers to attach to the manifest.
+        :param seg_container: The container to put any sub-manifests into.
+        :param sub_manifest_prefix: The prefix for the names of any
+                                    sub-manifests.
+        :returns: A tuple of the manifest's response dict and the locations
+                  of any sub-manifests.
+        """
+        # Nesting only shrinks the manifest if sub-manifests hold several
+        # segments each
+        max_segments = max(2, self._get_segment_limits()[2] or
+                           DEFAULT_MAX_MANIFEST_SEGMENTS)
+        sub_manifests = []
+        level = 0
+        while len(segment_results) > max_segments:
+            segment_results.sort(key=lambda di: di['segment_index'])
+            nested = []
+            for index, start in enumerate(
+                    range(0, len(segment_results), max_segments)):
+                group = segment_results[start:start + max_segments]
+                if len(group) == 1:
+                    nested.append(dict(group[0], segment_index=index))
+                    continue
+                name = '%s%d/%08d' % (sub_manifest_prefix, level, index)
+                self._upload_slo_manifest(conn, group, seg_container, name,
+                                          {})
+                location = '/%s/%s' % (seg_container, name)
+                sub_manifests.append(location)
+                # A manifest's etag is the md5 of its segments' etags
+                nested.append({
+                    'segment_index': index,
+                    'segment_location': location,
+                    'segment_etag': md5(''.join(
+                        seg['segment_etag'] for seg in group
+                    ).encode('ascii')).hexdigest(),
+                    'segment_size': sum(seg['segment_size'] for seg in group),
+                })
+            segment_results = nested
+            level += 1
+        response = self._upload_slo_manifest(
+            conn, segment_results, container, obj, headers)
+        return response, sub_manifests
+
     def _upload_object_job(self, conn, container, source, obj, options,
-                           results_queue=None):
+                           results_queue=None, stat_result=None):
         if obj.startswith('./') or obj.startswith('.\\'):
             obj = obj[2:]
         if obj.startswith('/'):
@@ -2020,7 +3639,11 @@ class SwiftService(object):
         res['path'] = path
         try:
             if path is not None:
-                put_headers = {'x-object-meta-mtime': "%f" % getmtime(path)}
+                if stat_result is None:
+                    stat_result = stat(path)
+                full_size = stat_result.st_size
+                put_headers = {
+                    'x-object-meta-mtime': "%f" % stat_result.st_mtime}
             else:
                 put_headers = {'x-object-meta-mtime': "%f" % round(time())}
 
@@ -2032,8 +3655,12 @@ class SwiftService(object):
             old_manifest = None
             old_slo_manifest_paths = []
             new_slo_manifest_paths = set()
-            segment_size = int(0 if options['segment_size'] is None
-                               else options['segment_size'])
+            if options['segment_size'] == AUTO_SEGMENT_SIZE:
+                segment_size = self._auto_segment_size(
+                    full_size if path is not None else None, options)
+            else:
+                segment_size = int(0 if options['segment_size'] is None
+                                   else options['segment_size'])
             if (options['changed'] or options['skip_identical']
                     or not options['leave_segments']):
                 try:
@@ -2041,10 +3668,12 @@ class SwiftService(object):
                     is_slo = config_true_value(
                         headers.get('x-static-large-object'))
 
+                    old_sub_manifests = []
                     if options['skip_identical'] or (
                             is_slo and not options['leave_segments']):
                         chunk_data = self._get_chunk_data(
-                            conn, container, obj, headers)
+                            conn, container, obj, headers,
+                            sub_manifests=old_sub_manifests)
 
                     if options['skip_identical'] and self._is_identical(
                             chunk_data, path):
@@ -2054,10 +3683,13 @@ class SwiftService(object):
                         })
                         return res
 
-                    cl = int(headers.get('content-length'))
+                    if headers.get(COMPRESSION_META):
+                        cl = int(headers.get(UNCOMPRESSED_SIZE_META, -1))
+                    else:
+                        cl = int(headers.get('content-length'))
                     mt = headers.get('x-object-meta-mtime')
                     if (path is not None and options['changed']
-                            and cl == getsize(path)
+                            and cl == full_size
                             and mt == put_headers['x-object-meta-mtime']):
                         res.update({
                             'success': True,
@@ -2067,8 +3699,11 @@ class SwiftService(object):
                     if not options['leave_segments']:
                         old_manifest = headers.get('x-object-manifest')
                         if is_slo:
-                            for old_seg in chunk_data:
-                                seg_path = old_seg['name'].lstrip('/')
+                            # Nested manifests are deleted along with the
+                            # segments they refer to
+                            for seg_path in [seg['name'] for seg in
+                                             chunk_data] + old_sub_manifests:
+                                seg_path = seg_path.lstrip('/')
                                 if isinstance(seg_path, text_type):
                                     seg_path = seg_path.encode('utf-8')
                                 old_slo_manifest_paths.append(seg_path)
@@ -2094,54 +3729,123 @@ class SwiftService(object):
             # go over the single object limit, but this gives us a nice way
             # to create objects from memory
             if (path is not None and segment_size
-                    and (getsize(path) > segment_size)):
+                    and (full_size > segment_size)):
                 res['large_object'] = True
                 seg_container = container + '_segments'
                 if options['segment_container']:
                     seg_container = options['segment_container']
-                full_size = getsize(path)
+
+                if options['use_slo'] and options['segment_dedup']:
+                    segment_prefix = None
+                elif options['use_slo']:
+                    segment_prefix = '%s/slo/%s/%s/%s/' % (
+                        obj, put_headers['x-object-meta-mtime'],
+                        full_size, segment_size)
+                else:
+                    segment_prefix = '%s/%s/%s/%s/' % (
+                        obj, put_headers['x-object-meta-mtime'],
+                        full_size, segment_size)
+
+                journal = None
+                resumed = {}
+                if options['resume_dir']:
+                    journal = _SegmentJournal(options['resume_dir'], {
+                        'path': os.path.abspath(path),
+                        'size': full_size,
+                        'mtime': put_headers['x-object-meta-mtime'],
+                        'container': container,
+                        'object': obj,
+                        'segment_container': seg_container,
+                        'segment_size': segment_size,
+                        'use_slo': options['use_slo'],
+                        'segment_dedup': options['segment_dedup'],
+                        'content_chunking': options['content_chunking'],
+                    })
+                    resumed = self._resumable_segments(
+                        conn, seg_container, journal.load(), segment_prefix)
 
                 segment_futures = []
+                segment_results = []
+                segment_starts = {}
                 segment_pool = self.thread_manager.segment_pool
-                segment = 0
-                segment_start = 0
+                chunk_fp = None
+                if options['content_chunking']:
+                    # Segments are uploaded as their boundaries are found
+                    chunk_fp = open(path, 'rb', DISK_BUFFER)
+                    boundaries = self._content_chunker(
+                        segment_size).iter_boundaries(chunk_fp)
+                else:
+                    boundaries = (
+                        (start, min(segment_size, full_size - start))
+                        for start in range(0, full_size, segment_size))
 
-                while segment_start < full_size:
-                    if segment_start + segment_size > full_size:
-                        segment_size = full_size - segment_start
-                    if options['use_slo']:
-                        segment_name = '%s/slo/%s/%s/%s/%08d' % (
-                            obj, put_headers['x-object-meta-mtime'],
-                            full_size, options['segment_size'], segment
-                        )
-                    else:
-                        segment_name = '%s/%s/%s/%s/%08d' % (
-                            obj, put_headers['x-object-meta-mtime'],
-                            full_size, options['segment_size'], segment
+                try:
+                    for segment, (segment_start, seg_size) in \
+                            enumerate(boundaries):
+                        segment_starts[segment] = segment_start
+                        done = resumed.get(segment)
+                        if (done is not None and
+                                done['segment_start'] == segment_start and
+                                done['segment_size'] == seg_size):
+                            # Uploaded before this upload was interrupted
+                            segment_results.append({
+                                'action': 'upload_segment',
+                                'for_container': container,
+                                'for_object': obj,
+                                'segment_index': segment,
+                                'segment_size': seg_size,
+                                'segment_location': done['segment_location'],
+                                'segment_etag': done['segment_etag'],
+                                'success': True,
+                                'resumed': True,
+                            })
+                            continue
+                        if options['use_slo'] and options['segment_dedup']:
+                            seg = segment_pool.submit(
+                                self._upload_dedup_segment_job, path,
+                                container, segment_start, seg_size,
+                                segment, obj, options,
+                                results_queue=results_queue
+                            )
+                            segment_futures.append(seg)
+                            continue
+                        segment_name = '%s%08d' % (segment_prefix, segment)
+                        seg = segment_pool.submit(
+                            self._upload_segment_job, path, container,
+                            segment_name, segment_start, seg_size,
+                            segment, obj, options,
+                            results_queue=results_queue
                         )
-                    seg = segment_pool.submit(
-                        self._upload_segment_job, path, container,
-                        segment_name, segment_start, segment_size, segment,
-                        obj, options, results_queue=results_queue
-                    )
-                    segment_futures.append(seg)
-                    segment += 1
-                    segment_start += segment_size
+                        segment_futures.append(seg)
+                finally:
+                    if chunk_fp is not None:
+                        chunk_fp.close()
 
-                segment_results = []
                 errors = False
                 exceptions = []
-                for f in interruptable_as_completed(segment_futures):
-                    try:
-                        r = f.result()
-                        if not r['success']:
+                try:
+                    for f in interruptable_as_completed(segment_futures):
+                        try:
+                            r = f.result()
+                            if not r['success']:
+                                errors = True
+                                if _is_not_found(r.get('error')):
+                                    self._uncache_container(seg_container)
+                            else:
+                                if 'start_time' in r:
+                                    self._record_segment_throughput(r)
+                                if journal is not None:
+                                    journal.record(
+                                        segment_starts[r['segment_index']], r)
+                            segment_results.append(r)
+                        except Exception as err:
+                            traceback, err_time = report_traceback()
+                            logger.exception(err)
                             errors = True
-                        segment_results.append(r)
-                    except Exception as err:
-                        traceback, err_time = report_traceback()
-                        logger.exception(err)
-                        errors = True
-                        exceptions.append((err, traceback, err_time))
+                            exceptions.append((err, traceback, err_time))
+                finally:
+                    if journal is not None:
+                        journal.close()
                 if errors:
                     err = ClientException(
                         'Aborting manifest creation '
@@ -2156,19 +3860,31 @@ class SwiftService(object):
                     return res
 
                 res['segment_results'] = segment_results
+                if options['use_slo'] and options['segment_dedup']:
+                    res['deduplicated_segments'] = sum(
+                        1 for r in segment_results if r.get('deduplicated'))
+                if journal is not None:
+                    res['resumed_segments'] = sum(
+                        1 for r in segment_results if r.get('resumed'))
 
                 if options['use_slo']:
-                    response = self._upload_slo_manifest(
-                        conn, segment_results, container, obj, put_headers)
+                    if options['segment_dedup']:
+                        put_headers[DEDUP_META] = options['segment_dedup']
+                    response, sub_manifests = self._upload_nested_slo_manifest(
+                        conn, segment_results, container, obj, put_headers,
+                        seg_container, '%s/slo/%s/%s/%s/manifest/' % (
+                            obj, put_headers['x-object-meta-mtime'],
+                            full_size, segment_size))
                     res['manifest_response_dict'] = response
                     new_slo_manifest_paths = {
                         seg['segment_location'] for seg in segment_results}
+                    new_slo_manifest_paths.update(sub_manifests)
                 else:
                     new_object_manifest = '%s/%s/%s/%s/%s/' % (
                         quote(seg_container.encode('utf8')),
                         quote(obj.encode('utf8')),
                         put_headers['x-object-meta-mtime'], full_size,
-                        options['segment_size'])
+                        segment_size)
                     if old_manifest and old_manifest.rstrip('/') == \
                             new_object_manifest.rstrip('/'):
                         old_manifest = None
@@ -2180,9 +3896,16 @@ class SwiftService(object):
                         response_dict=mr
                     )
                     res['manifest_response_dict'] = mr
+                if journal is not None:
+                    # The upload is complete, so there's nothing to resume
+                    journal.remove()
             elif options['use_slo'] and segment_size and not path:
                 segment = 0
                 results = []
+                if options['content_chunking']:
+                    chunks = self._content_chunker(
+                        segment_size).iter_chunks(stream)
+                    next_chunk = next(chunks, b'')
                 while True:
                     segment_name = '%s/slo/%s/%s/%08d' % (
                         obj, put_headers['x-object-meta-mtime'],
@@ -2191,14 +3914,25 @@ class SwiftService(object):
                     seg_container = container + '_segments'
                     if options['segment_container']:
                         seg_container = options['segment_container']
+                    seg_stream, seg_size = stream, segment_size
+                    last = False
+                    if options['content_chunking']:
+                        # Look ahead one chunk, so that the last chunk is
+                        # known to be complete (and a stream of one chunk
+                        # is uploaded as a plain object).
+                        chunk, next_chunk = next_chunk, next(chunks, None)
+                        seg_stream = BytesIO(chunk)
+                        seg_size = len(chunk)
+                        last = next_chunk is None
                     ret = self._upload_stream_segment(
                         conn, container, obj,
                         seg_container,
                         segment_name,
-                        segment_size,
+                        seg_size,
                         segment,
                         put_headers,
-                        stream
+                        seg_stream,
+                        last=last
                     )
                     if not ret['success']:
                         return ret
@@ -2216,11 +3950,15 @@ class SwiftService(object):
                     segment += 1
                 if results[0]['segment_location'] != '/%s/%s' % (
                         container, obj):
-                    response = self._upload_slo_manifest(
-                        conn, results, container, obj, put_headers)
+                    response, sub_manifests = self._upload_nested_slo_manifest(
+                        conn, results, container, obj, put_headers,
+                        seg_container, '%s/slo/%s/%s/manifest/' % (
+                            obj, put_headers['x-object-meta-mtime'],
+                            segment_size))
                     res['manifest_response_dict'] = response
                     new_slo_manifest_paths = {
                         r['segment_location'] for r in results}
+                    new_slo_manifest_paths.update(sub_manifests)
                     res['large_object'] = True
                 else:
                     res['response_dict'] = ret
@@ -2231,8 +3969,30 @@ class SwiftService(object):
                 fp = None
                 try:
                     if path is not None:
-                        content_length = getsize(path)
                         fp = open(path, 'rb', DISK_BUFFER)
+                    if options['compress']:
+                        # The compressed size isn't known until the end, so
+                        # the upload is chunked; the etag is of the
+                        # compressed data, which is what is checked
+                        content_length = None
+                        put_headers[COMPRESSION_META] = options['compress']
+                        if fp is not None:
+                            # Record the uncompressed size and md5, which
+                            # changed and skip_identical compare against
+                            md5sum = md5()
+                            for data in iter(
+                                    lambda: fp.read(DISK_BUFFER), b''):
+                                md5sum.update(data)
+                            fp.seek(0)
+                            put_headers[UNCOMPRESSED_SIZE_META] = \
+                                str(full_size)
+                            put_headers[UNCOMPRESSED_MD5_META] = \
+                                md5sum.hexdigest()
+                        contents = CompressingIterable(
+                            fp or stream, options['compress'],
+                            chunk_size=DISK_BUFFER, md5=options['checksum'])
+                    elif path is not None:
+                        content_length = full_size
                         contents = LengthWrapper(fp,
                                                  content_length,
                                                  md5=options['checksum'])
@@ -2277,6 +4037,11 @@ class SwiftService(object):
                             continue
                         scont, sobj = \
                             seg_to_delete.split(b'/', 1)
+                        if sobj.startswith(
+                                DEDUP_SEGMENT_PREFIX.encode('utf-8')):
+                            # Content addressed segments may be shared with
+                            # other manifests, so are never deleted here
+                            continue
                         delobjs_cont = delobjsmap.get(scont, [])
                         delobjs_cont.append(sobj)
                         delobjsmap[scont] = delobjs_cont
@@ -2317,6 +4082,9 @@ class SwiftService(object):
         except Exception as err:
             traceback, err_time = report_traceback()
             logger.exception(err)
+            if _is_not_found(err):
+                # The container may have been deleted since it was cached
+                self._uncache_container(container)
             res.update({
                 'success': False,
                 'error': err,
@@ -2333,7 +4101,9 @@ class SwiftService(object):
         of objects.
 
         :param container: The container to delete or delete from.
-        :param objects: The list of objects to delete.
+        :param objects: The list, or any other iterable, of objects to
+                        delete. Names are only taken from the iterable as
+                        earlier deletes complete.
         :param options: A dictionary containing options to override the global
                         options specified during the service object creation::
 
@@ -2360,40 +4130,41 @@ class SwiftService(object):
 
         if container is not None:
             if objects is not None:
+                objects = iter(objects)
                 if options['prefix']:
-                    objects = [obj for obj in objects
-                               if obj.startswith(options['prefix'])]
+                    objects = (obj for obj in objects
+                               if obj.startswith(options['prefix']))
                 rq = Queue()
-                obj_dels = {}
-
-                bulk_page_size = self._bulk_delete_page_size(objects)
+                cancelled = Event()
+
+                # Only look at enough of the objects to decide whether to
+                # bulk delete
+                first_objects = list(islice(
+                    objects, 2 * self._options['object_dd_threads'] + 1))
+                bulk_page_size = self._bulk_delete_page_size(first_objects)
+                objects = chain(first_objects, objects)
                 if bulk_page_size > 1:
-                    page_at_a_time = n_at_a_time(objects, bulk_page_size)
-                    for page_slice in page_at_a_time:
-                        for obj_slice in n_groups(
-                                page_slice,
-                                self._options['object_dd_threads']):
-                            self._bulk_delete(container, obj_slice, options,
-                                              obj_dels)
+                    jobs = self._bulk_delete_jobs(container, objects,
+                                                  bulk_page_size, options)
                 else:
-                    self._per_item_delete(container, objects, options,
-                                          obj_dels, rq)
+                    jobs = self._per_item_delete_jobs(container, objects,
+                                                      options, rq)
 
-                # Start a thread to watch for delete results
-                Thread(
-                    target=self._watch_futures, args=(obj_dels, rq)
-                ).start()
+                # Start a thread to submit the deletes and watch for their
+                # results
+                self._start_job_watcher(jobs, rq, options, cancelled)
 
                 # yield results as they become available, raising the first
                 # encountered exception
                 res = get_from_queue(rq)
                 while res is not None:
+                    if isinstance(res, Exception):
+                        raise res
                     yield res
 
                     # Cancel the remaining jobs if necessary
                     if options['fail_fast'] and not res['success']:
-                        for d in obj_dels.keys():
-                            d.cancel()
+                        cancelled.set()
 
                     res = get_from_queue(rq)
             else:
@@ -2458,14 +4229,27 @@ class SwiftService(object):
         else:
             return 1
 
-    def _per_item_delete(self, container, objects, options, rdict, rq):
+    def _per_item_delete_jobs(self, container, objects, options, rq):
+        submit = self.thread_manager.object_dd_pool.submit
         for obj in objects:
-            obj_del = self.thread_manager.object_dd_pool.submit(
-                self._delete_object, container, obj, options,
+            yield partial(
+                submit, self._delete_object, container, obj, options,
                 results_queue=rq
-            )
-            obj_details = {'container': container, 'object': obj}
-            rdict[obj_del] = obj_details
+            ), {'container': container, 'object': obj}
+
+    @staticmethod
+    def _is_dedup_segment(name):
+        parts = name.lstrip('/').split('/', 1)
+        return len(parts) == 2 and parts[1].startswith(DEDUP_SEGMENT_PREFIX)
+
+    def _own_slo_segments(self, conn, container, obj, headers, res):
+        sub_manifests = []
+        chunks = self._get_chunk_data(conn, container, obj, headers,
+                                      sub_manifests=sub_manifests)
+        segments = [chunk['name'] for chunk in chunks
+                    if not self._is_dedup_segment(chunk['name'])]
+        res['dedup_segments_kept'] = len(chunks) - len(segments)
+        return segments + sub_manifests
 
     @staticmethod
     def _delete_segment(conn, container, obj, results_queue=None):
@@ -2507,6 +4291,7 @@ class SwiftService(object):
         try:
             old_manifest = None
             query_string = None
+            slo_segments = None
 
             if not options['leave_segments']:
                 try:
@@ -2515,6 +4300,13 @@ class SwiftService(object):
                     old_manifest = headers.get('x-object-manifest')
                     if config_true_value(headers.get('x-static-large-object')):
                         query_string = 'multipart-manifest=delete'
+                        if headers.get(DEDUP_META):
+                            # Content addressed segments may be shared with
+                            # other manifests, so only delete the manifest
+                            # and the segments that belong to it alone
+                            slo_segments = self._own_slo_segments(
+                                conn, container, obj, headers, res)
+                            query_string = None
                 except ClientException as err:
                     if err.http_status != 404:
                         raise
@@ -2554,6 +4346,26 @@ class SwiftService(object):
 
                 res['dlo_segments_deleted'] = dlo_segments_deleted
 
+            if slo_segments is not None:
+                slo_segments_deleted = True
+                segment_pool = self.thread_manager.segment_pool
+
+                del_segs = []
+                for seg in slo_segments:
+                    s_container, s_obj = seg.lstrip('/').split('/', 1)
+                    del_seg = segment_pool.submit(
+                        self._delete_segment, s_container,
+                        s_obj, results_queue=results_queue
+                    )
+                    del_segs.append(del_seg)
+
+                for del_seg in interruptable_as_completed(del_segs):
+                    del_res = del_seg.result()
+                    if not del_res["success"]:
+                        slo_segments_deleted = False
+
+                res['slo_segments_deleted'] = slo_segments_deleted
+
             res.update({
                 'success': True,
                 'response_dict': results_dict,
@@ -2621,6 +4433,7 @@ class SwiftService(object):
                 self._delete_empty_container, container, options
             )
             con_del_res = get_future_result(con_del)
+            self._uncache_container(container)
 
         except Exception as err:
             traceback, err_time = report_traceback()
@@ -2639,13 +4452,18 @@ class SwiftService(object):
 
     # Bulk methods
     #
-    def _bulk_delete(self, container, objects, options, rdict):
-        if objects:
-            bulk_del = self.thread_manager.object_dd_pool.submit(
-                self._bulkdelete, container, objects, options
-            )
-            bulk_details = {'container': container, 'objects': objects}
-            rdict[bulk_del] = bulk_details
+    def _bulk_delete_jobs(self, container, objects, bulk_page_size,
+                          options):
+        submit = self.thread_manager.object_dd_pool.submit
+        while True:
+            page_slice = list(islice(objects, bulk_page_size))
+            if not page_slice:
+                return
+            for obj_slice in n_groups(page_slice,
+                                      self._options['object_dd_threads']):
+                yield partial(
+                    submit, self._bulkdelete, container, obj_slice, options
+                ), {'container': container, 'objects': obj_slice}
 
     @staticmethod
     def _bulkdelete(conn, container, objects, options):
@@ -2779,11 +4597,15 @@ class SwiftService(object):
             self.thread_manager.container_pool.submit(
                 self._create_container_job, cont, headers=policy_header)
             for cont in containers
+            if not self._container_cached(cont, policy_header.get(POLICY))
         ]
 
         # wait for container creation jobs to complete before any COPY
         for r in interruptable_as_completed(create_containers):
             res = r.result()
+            if res['success']:
+                self._cache_container(
+                    res['container'], policy_header.get(POLICY), options)
             yield res
 
         copy_futures = []
@@ -2818,6 +4640,13 @@ class SwiftService(object):
 
         for r in interruptable_as_completed(copy_futures):
             res = r.result()
+            if _is_not_found(res.get('error')):
+                destination = res['destination']
+                if destination:
+                    self._uncache_container(
+                        next(p for p in destination.split('/') if p))
+                else:
+                    self._uncache_container(res['container'])
             yield res
 
     @staticmethod
@@ -2911,40 +4740,106 @@ class SwiftService(object):
     # Helper methods
     #
     @staticmethod
-    def _watch_futures(futures, result_queue):
-        """
-        Watches a dict of futures and pushes their results onto the given
-        queue. We use this to wait for a set of futures which may create
-        futures of their own to wait for, whilst also allowing us to
-        immediately return the results of those sub-jobs.
+    def _put_job_result(f, details, result_queue):
+        try:
+            r = f.result()
+            if r is not None:
+                result_queue.put(r)
+        except CancelledError:
+            res = details
+            res.update({'success': False, 'status': 'cancelled'})
+            result_queue.put(res)
+        except Exception as err:
+            traceback, err_time = report_traceback()
+            logger.exception(err)
+            res = details
+            res.update({
+                'success': False,
+                'error': err,
+                'traceback': traceback,
+                'error_timestamp': err_time
+            })
+            result_queue.put(res)
 
-        When all futures have completed, None is pushed to the queue
+    @staticmethod
+    def _start_job_watcher(jobs, result_queue, options, cancelled):
+        """
+        Start a thread running _watch_jobs.
 
-        If the future is cancelled, we use the dict to return details about
-        the cancellation.
+        :raises SwiftError: if the max_in_flight option is not positive.
         """
-        futures_only = list(futures.keys())
-        for f in interruptable_as_completed(futures_only):
-            try:
-                r = f.result()
-                if r is not None:
-                    result_queue.put(r)
-            except CancelledError:
-                details = futures[f]
-                res = details
-                res['status'] = 'cancelled'
-                result_queue.put(res)
-            except Exception as err:
-                traceback, err_time = report_traceback()
-                logger.exception(err)
-                details = futures[f]
-                res = details
-                res.update({
-                    'success': False,
-                    'error': err,
-                    'traceback': traceback,
-                    'error_timestamp': err_time
-                })
-                result_queue.put(res)
+        max_in_flight = options['max_in_flight']
+        if max_in_flight < 1:
+            raise SwiftError('max_in_flight should be a positive integer')
+        Thread(
+            target=SwiftService._watch_jobs,
+            args=(jobs, result_queue, max_in_flight, cancelled)
+        ).start()
 
+    @staticmethod
+    def _watch_jobs(jobs, result_queue, max_in_flight, cancelled):
+        """
+        Submits jobs, keeping at most max_in_flight of them unfinished, and
+        pushes their results onto the given queue. More jobs are only taken
+        from the iterable as earlier ones complete, so the jobs may be
+        generated lazily from an arbitrarily long input. Jobs may push extra
+        results for sub-jobs onto the queue themselves.
+
+        When all jobs have completed, None is pushed to the queue. If
+        iterating over the jobs or submitting one raises an exception, no
+        more jobs are submitted, and the exception is pushed to the queue
+        just before the None.
+
+        :param jobs: An iterable of (submit, details) tuples. ``submit()``
+                     submits a job and returns its future, or None if there
+                     is nothing to wait for. If the job fails or is
+                     cancelled, ``details`` is used to report it.
+        :param cancelled: A threading.Event; once it is set, queued jobs are
+                          cancelled and the remaining jobs are reported as
+                          cancelled without being submitted.
+        """
+        jobs = iter(jobs)
+        in_flight = {}
+        exhausted = False
+        error = None
+        while True:
+            while not (exhausted or error) and \
+                    len(in_flight) < max_in_flight:
+                try:
+                    submit, details = next(jobs)
+                except StopIteration:
+                    exhausted = True
+                    break
+                except Exception as err:
+                    error = err
+                    break
+                if cancelled.is_set():
+                    details.update({'success': False, 'status': 'cancelled'})
+                    result_queue.put(details)
+                    continue
+                try:
+                    f = submit()
+                except Exception as err:
+                    # e.g. the pool has been shut down
+                    error = err
+                    break
+                if f is not None:
+                    in_flight[f] = details
+
+            if not in_flight:
+                if exhausted or error:
+                    break
+                continue
+
+            done, _ = wait(in_flight, timeout=86400,
+                           return_when=FIRST_COMPLETED)
+            if cancelled.is_set():
+                for f in in_flight:
+                    f.cancel()
+            for f in done:
+                SwiftService._put_job_result(
+                    f, in_flight.pop(f), result_queue)
+
+        if error is not None:
+            result_queue.put(error)
         result_queue.put(None)
@@ -23,8 +23,8 @@ import logging
 import signal
 import socket
 
-from os import environ, walk, _exit as os_exit
-from os.path import isfile, isdir, join
+from os import environ, stat, walk, _exit as os_exit
+from os.path import expanduser, isfile, isdir, join
 from six import text_type, PY2
 from six.moves.urllib.parse import unquote, urlparse
 from sys import argv as sys_argv, exit, stderr, stdin
@@ -38,7 +38,7 @@ from swiftclient import __version__ as client_version
 from swiftclient.client import logger_settings as client_logger_settings, \
     parse_header_string
 from swiftclient.service import SwiftService, SwiftError, \
-    SwiftUploadObject, get_conn, process_options
+    SwiftUploadObject, get_conn, process_options, AUTO_SEGMENT_SIZE
 from swiftclient.command_helpers import print_account_stats, \
     print_container_stats, print_object_stats
 
@@ -47,6 +47,14 @@ try:
 except ImportError:
     from pipes import quote as sh_quote
 
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
 BASENAME = 'swift'
 commands = ('delete', 'download', 'list', 'post', 'copy', 'stat', 'upload',
             'capabilities', 'info', 'tempurl', 'auth')
@@ -56,6 +64,43 @@ def immediate_exit(signum, frame):
     stderr.write(" Aborted\n")
     os_exit(2)
 
+
+def _json_default(obj):
+    if isinstance(obj, bytes):
+        return obj.decode('utf8', 'replace')
+    return text_type(obj)
+
+
+def _print_json_result(output_manager, result, is_error=None):
+    """
+    Print a result dict yielded by SwiftService as a single line of JSON.
+
+    Any error is flattened to its message, type and HTTP status, and
+    timestamps are reported as elapsed times in the same way as the text
+    output. Unless ``is_error`` says otherwise, unsuccessful results are
+    counted as errors so that the exit status is unchanged.
+    """
+    res = dict((k, v) for k, v in result.items() if k != 'contents')
+    error = res.pop('error', None)
+    if error is not None:
+        res['error'] = text_type(error)
+        res['error_type'] = type(error).__name__
+        if isinstance(error, ClientException):
+            res['http_status'] = error.http_status
+    start_time = res.get('start_time')
+    if start_time is not None:
+        for key, name in (('auth_end_time', 'auth_time'),
+                          ('headers_receipt', 'headers_time'),
+                          ('finish_time', 'total_time')):
+            if res.get(key) is not None:
+                res[name] = res[key] - start_time
+    output_manager.print_msg(
+        json.dumps(res, sort_keys=True, default=_json_default))
+    if is_error is None:
+        is_error = not result.get('success', True)
+    if is_error:
+        output_manager.count_error()
+
 st_delete_options = '''[--all] [--leave-segments]
                     [--object-threads <threads>]
                     [--container-threads <threads>]
@@ -158,6 +203,9 @@ def st_delete(parser, args, output_manager):
                     del_iter = swift.delete(container=container)
 
             for r in del_iter:
+                if options['output_format'] == 'jsonl':
+                    _print_json_result(output_manager, r)
+                    continue
                 c = r.get('container', '')
                 o = r.get('object', '')
                 a = r.get('attempts')
@@ -221,6 +269,7 @@ st_download_options = '''[--all] [--marker <marker>] [--prefix <prefix>]
                       [--container-threads <threads>] [--no-download]
                       [--skip-identical] [--remove-prefix]
                       [--header <header:value>] [--no-shuffle]
+                      [--resume] [--tar <tar_file>] [--no-decompress]
                       [<container> [<object>] [...]]
 '''
 
@@ -276,6 +325,17 @@ Optional arguments:
   --ignore-mtime        Ignore the 'X-Object-Meta-Mtime' header when
                         downloading an object. Instead, create atime and mtime
                         with fresh timestamps.
+  --resume              Download objects to <file>.part, recording progress
+                        in <file>.part.json, and continue an interrupted
+                        download of an unchanged object from where it
+                        stopped rather than starting again.
+  --tar <tar_file>      Stream the objects into a tar archive written to
+                        <tar_file>, in listing order (or the order given),
+                        instead of creating a file for each one. Specifying
+                        "-" as <tar_file> will redirect to stdout.
+  --no-decompress       Leave objects that were compressed on upload (with
+                        --compress) compressed, rather than decompressing
+                        them as they are downloaded.
 '''.strip("\n")
 
 
@@ -342,14 +402,38 @@ def st_download(parser, args, output_manager):
         'to store the access and modified timestamp for the downloaded file. '
         'With this option, the header is ignored and the timestamps are '
         'created freshly.')
+    parser.add_argument(
+        '--resume', action='store_true', dest='resume_download',
+        default=False, help='Download objects to <file>.part and continue '
+        'an interrupted download of an unchanged object from where it '
+        'stopped.')
+    parser.add_argument(
+        '--tar', dest='tar_file', help='Stream the objects into a tar '
+        'archive written to <tar_file>, instead of creating a file for each '
+        'one. Specifying "-" as <tar_file> will redirect to stdout.')
+    parser.add_argument(
+        '--no-decompress', action='store_false', dest='decompress',
+        default=True, help='Leave objects that were compressed on upload '
+        'compressed, rather than decompressing them as they are downloaded.')
     (options, args) = parse_args(parser, args)
     args = args[1:]
-    if options['out_file'] == '-':
+    if options['out_file'] == '-' or options['tar_file'] == '-':
         options['verbose'] = 0
 
+    if options['tar_file'] and (options['out_file'] or
+                                options['out_directory'] or
+                                options['yes_all']):
+        exit('--tar option cannot be used with -o, -D or --all')
+
+    if options['tar_file'] == '-' and options['output_format'] == 'jsonl':
+        exit('--tar - cannot be used with --format jsonl')
+
     if options['out_file'] and len(args) != 2:
         exit('-o option only allowed for single file downloads')
 
+    if options['out_file'] == '-' and options['output_format'] == 'jsonl':
+        exit('-o - cannot be used with --format jsonl')
+
     if not options['prefix']:
         options['remove_prefix'] = False
 
@@ -376,6 +460,7 @@ def st_download(parser, args, output_manager):
         return
 
     options['object_dd_threads'] = options['object_threads']
+    tar_file = None
     with SwiftService(options=options) as swift:
         try:
             if not args:
@@ -390,12 +475,29 @@ def st_download(parser, args, output_manager):
                     )
                     return
                 objects = args[1:]
-                if not objects:
+                if options['tar_file'] == '-':
+                    stream = output_manager.print_stream
+                    tar_file = getattr(stream, 'buffer', stream)
+                elif options['tar_file']:
+                    tar_file = open(options['tar_file'], 'wb')
+                if tar_file is not None:
+                    down_iter = swift.download_archive(
+                        container, tar_file, objects or None)
+                elif not objects:
                     down_iter = swift.download(container)
                 else:
                     down_iter = swift.download(container, objects)
 
             for down in down_iter:
+                if options['output_format'] == 'jsonl':
+                    error = down.get('error')
+                    skipped = (isinstance(error, ClientException) and
+                               error.http_status == 304 and
+                               options['skip_identical'])
+                    _print_json_result(output_manager, down,
+                                       is_error=not (down['success'] or
+                                                     skipped))
+                    continue
                 if options['out_file'] == '-' and 'contents' in down:
                     contents = down['contents']
                     for chunk in contents:
@@ -463,11 +565,17 @@ def st_download(parser, args, output_manager):
             output_manager.error(e.value)
         except Exception as e:
             output_manager.error(e)
+        finally:
+            if tar_file is not None:
+                if options['tar_file'] == '-':
+                    tar_file.flush()
+                else:
+                    tar_file.close()
 
 
 st_list_options = '''[--long] [--lh] [--totals] [--prefix <prefix>]
                   [--delimiter <delimiter>] [--header <header:value>]
-                  [<container>]
+                  [--group-by <group>] [<container>]
 '''
 
 st_list_help = '''
@@ -489,6 +597,10 @@ Optional arguments:
                         this means.
   -H, --header <header:value>
                         Adds a custom request header to use for listing.
+  --group-by <group>    Report totals grouped by "content_type" (for
+                        containers only), or by name "prefix". Use
+                        "prefix:<depth>" to group by more than one level of
+                        the name. Implies --totals.
 '''.strip('\n')
 
 
@@ -538,13 +650,30 @@ def st_list(parser, args, output_manager):
 
         # report totals
         if options['long'] or human:
-            if not container:
-                output_manager.print_msg(
-                    "%5s %s", prt_bytes(total_count, True),
-                    prt_bytes(total_bytes, human))
-            else:
+            _print_totals(container, total_count, total_bytes, human)
+
+    def _print_totals(container, count, num_bytes, human):
+        if not container:
+            output_manager.print_msg(
+                "%5s %s", prt_bytes(count, True), prt_bytes(num_bytes, human))
+        else:
+            output_manager.print_msg(prt_bytes(num_bytes, human))
+
+    def _print_grouped_totals(container, totals, human):
+        # Totals were summed per page by the service; there is no need to
+        # look at (let alone format) each item of the listing here
+        total_count = total_bytes = 0
+        for group in sorted(totals):
+            count = totals[group]['count']
+            num_bytes = totals[group]['bytes']
+            if options['group_by']:
                 output_manager.print_msg(
-                    prt_bytes(total_bytes, human))
+                    ("%5s %s %s" % (prt_bytes(count, True),
+                                    prt_bytes(num_bytes, human),
+                                    group)).rstrip())
+            total_count += count
+            total_bytes += num_bytes
+        _print_totals(container, total_count, total_bytes, human)
 
     parser.add_argument(
         '-l', '--long', dest='long', action='store_true', default=False,
@@ -569,6 +698,11 @@ def st_list(parser, args, output_manager):
         '-H', '--header', action='append', dest='header',
         default=[],
         help='Adds a custom request header to use for listing.')
+    parser.add_argument(
+        '--group-by', dest='group_by',
+        help='Report totals grouped by "content_type" (for containers only), '
+             'or by name "prefix". Use "prefix:<depth>" to group by more '
+             'than one level of the name. Implies --totals.')
     options, args = parse_args(parser, args)
     args = args[1:]
     if options['delimiter'] and not args:
@@ -578,6 +712,9 @@ def st_list(parser, args, output_manager):
     if human:
         options['long'] = True
 
+    if options['group_by']:
+        options['long'] = options['totals'] = True
+
     if options['totals'] and not options['long']:
         output_manager.error(
             "Listing totals only works with -l or --lh.")
@@ -585,6 +722,7 @@ def st_list(parser, args, output_manager):
 
     with SwiftService(options=options) as swift:
         try:
+            stats_container = None
             if not args:
                 stats_parts_gen = swift.list()
             else:
@@ -596,13 +734,27 @@ def st_list(parser, args, output_manager):
                         st_list_options, st_list_help)
                     return
                 else:
+                    stats_container = container
                     stats_parts_gen = swift.list(container=container)
 
+            totals = {}
             for stats in stats_parts_gen:
-                if stats["success"]:
-                    _print_stats(options, stats, human)
-                else:
+                if options['output_format'] == 'jsonl':
+                    _print_json_result(output_manager, stats)
+                    continue
+                if not stats["success"]:
                     raise stats["error"]
+                if not options['totals']:
+                    _print_stats(options, stats, human)
+                    continue
+                for group, part_totals in stats['totals'].items():
+                    group_totals = totals.setdefault(
+                        group, {'count': 0, 'bytes': 0})
+                    group_totals['count'] += part_totals['count']
+                    group_totals['bytes'] += part_totals['bytes']
+
+            if options['totals'] and options['output_format'] != 'jsonl':
+                _print_grouped_totals(stats_container, totals, human)
 
         except SwiftError as e:
             output_manager.error(e.value)
@@ -643,6 +795,9 @@ def st_stat(parser, args, output_manager):
         try:
             if not args:
                 stat_result = swift.stat()
+                if options['output_format'] == 'jsonl':
+                    _print_json_result(output_manager, stat_result)
+                    return
                 if not stat_result['success']:
                     raise stat_result['error']
                 items = stat_result['items']
@@ -659,6 +814,9 @@ def st_stat(parser, args, output_manager):
                 args = args[1:]
                 if not args:
                     stat_result = swift.stat(container=container)
+                    if options['output_format'] == 'jsonl':
+                        _print_json_result(output_manager, stat_result)
+                        return
                     if not stat_result['success']:
                         raise stat_result['error']
                     items = stat_result['items']
@@ -670,7 +828,10 @@ def st_stat(parser, args, output_manager):
                         stat_results = swift.stat(
                             container=container, objects=objects)
                         for stat_result in stat_results:  # only 1 result
-                            if stat_result["success"]:
+                            if options['output_format'] == 'jsonl':
+                                _print_json_result(output_manager,
+                                                   stat_result)
+                            elif stat_result["success"]:
                                 items = stat_result['items']
                                 headers = stat_result['headers']
                                 print_object_stats(
@@ -892,7 +1053,9 @@ st_upload_options = '''[--changed] [--skip-identical] [--segment-size <size>]
                     [--segment-container <container>] [--leave-segments]
                     [--object-threads <thread>] [--segment-threads <threads>]
                     [--meta <name:value>] [--header <header>] [--use-slo]
-                    [--ignore-checksum] [--object-name <object-name>]
+                    [--segment-dedup <hash>] [--content-chunking]
+                    [--resume] [--ignore-checksum] [--compress <codec>]
+                    [--object-name <object-name>]
                     <container> <file_or_directory> [<file_or_directory>] [...]
 '''
 
@@ -914,7 +1077,9 @@ Optional arguments:
                         Upload files in segments no larger than <size> (in
                         Bytes) and then create a "manifest" file that will
                         download all the segments as if it were the original
-                        file.
+                        file. Use "auto" to choose a size for each file from
+                        its size, the cluster's limits, --segment-threads and
+                        the measured upload rate.
   --segment-container <container>
                         Upload the segments into the specified container. If
                         not specified, the segments will be uploaded to a
@@ -938,16 +1103,85 @@ Optional arguments:
   --use-slo             When used in conjunction with --segment-size it will
                         create a Static Large Object instead of the default
                         Dynamic Large Object.
+  --segment-dedup <hash>
+                        Name segments by the <hash> (md5 or sha256) of their
+                        content and skip uploading segments that already
+                        exist in the segment container. Implies --use-slo.
+  --content-chunking    Split files into segments at boundaries chosen by
+                        their content, averaging --segment-size, rather than
+                        at fixed offsets. Edits to a file then only change
+                        the segments around them.
+  --resume              Record the segments of large objects in a journal
+                        under ~/.swiftclient/resume as they are uploaded, and
+                        skip segments already recorded by an interrupted
+                        upload of the same, unchanged file.
   --object-name <object-name>
                         Upload file and name object to <object-name> or upload
                         dir and use <object-name> as object prefix instead of
                         folder name.
   --ignore-checksum     Turn off checksum validation for uploads.
+  --compress <codec>    Compress objects with <codec> (gzip, or zstd if the
+                        zstandard package is installed) as they are uploaded,
+                        recording it in the object's metadata so that
+                        downloads decompress them. Files uploaded in segments
+                        are not compressed, and standard input is only
+                        uploaded in segments if --segment-size is given.
 '''.strip('\n')
 
 
+def _scan_upload_tree(top):
+    """
+    Walk the directory tree below ``top`` for upload, yielding entries as
+    they are found rather than listing the whole tree up front.
+
+    Yields ``(path, stat_result, is_dir_marker)`` for every file, and for
+    every empty directory (with ``is_dir_marker`` set). Where ``scandir`` is
+    available the stat result is taken from the directory entry so the file
+    is not stat'ed again by the upload; otherwise (or if the stat fails) it
+    is None. As with ``os.walk``, symlinks to directories are not followed.
+    """
+    if scandir is None:
+        for (_dir, _ds, _fs) in walk(top):
+            if not (_ds + _fs):
+                yield _dir, None, True
+            for _f in _fs:
+                yield join(_dir, _f), None, False
+        return
+
+    dirs = [top]
+    while dirs:
+        _dir = dirs.pop()
+        subdirs = []
+        empty = True
+        try:
+            entries = scandir(_dir)
+        except OSError:
+            continue
+        for entry in entries:
+            empty = False
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            if is_dir:
+                if not entry.is_symlink():
+                    subdirs.append(entry.path)
+                continue
+            try:
+                st = entry.stat()
+            except OSError:
+                # Let the upload report the error for this path
+                st = None
+            yield entry.path, st, False
+        if empty:
+            yield _dir, None, True
+        # Visit subdirectories in the order they were listed, like os.walk
+        dirs.extend(reversed(subdirs))
+
+
 def st_upload(parser, args, output_manager):
     DEFAULT_STDIN_SEGMENT = 10 * 1024 * 1024
+    DEFAULT_RESUME_DIR = '~/.swiftclient/resume'
 
     parser.add_argument(
         '-c', '--changed', action='store_true', dest='changed',
@@ -963,7 +1197,9 @@ def st_upload(parser, args, output_manager):
         '"manifest" file that will download all the segments as if it were '
         'the original file. Sizes may also be expressed as bytes with the '
         'B suffix, kilobytes with the K suffix, megabytes with the M suffix '
-        'or gigabytes with the G suffix.')
+        'or gigabytes with the G suffix. Use "auto" to choose a size for '
+        'each file from its size, the cluster\'s limits and the measured '
+        'upload rate.')
     parser.add_argument(
         '-C', '--segment-container', dest='segment_container',
         help='Upload the segments into the specified container. '
@@ -997,6 +1233,19 @@ def st_upload(parser, args, output_manager):
         help='When used in conjunction with --segment-size, it will '
         'create a Static Large Object instead of the default '
         'Dynamic Large Object.')
+    parser.add_argument(
+        '--segment-dedup', dest='segment_dedup', choices=('md5', 'sha256'),
+        help='Name segments by the hash of their content and skip uploading '
+        'segments that already exist in the segment container. Implies '
+        '--use-slo.')
+    parser.add_argument(
+        '--content-chunking', action='store_true', default=False,
+        help='Split files into segments at boundaries chosen by their '
+        'content, averaging --segment-size, rather than at fixed offsets.')
+    parser.add_argument(
+        '--resume', action='store_true', default=False,
+        help='Record uploaded segments in a local journal and skip the '
+        'segments already uploaded by an interrupted upload of the same file.')
     parser.add_argument(
         '--object-name', dest='object_name',
         help='Upload file and name object to <object-name> or upload dir and '
@@ -1004,6 +1253,9 @@ def st_upload(parser, args, output_manager):
     parser.add_argument(
         '--ignore-checksum', dest='checksum', default=True,
         action='store_false', help='Turn off checksum validation for uploads.')
+    parser.add_argument(
+        '--compress', dest='compress', choices=('gzip', 'zstd'),
+        help='Compress objects with the given codec as they are uploaded.')
     options, args = parse_args(parser, args)
     args = args[1:]
     if len(args) < 2:
@@ -1031,7 +1283,8 @@ def st_upload(parser, args, output_manager):
             'object-name must be specified with uploads from stdin')
         return
 
-    if options['segment_size']:
+    if (options['segment_size'] and
+            options['segment_size'] != AUTO_SEGMENT_SIZE):
         try:
             # If segment size only has digits assume it is bytes
             int(options['segment_size'])
@@ -1062,7 +1315,14 @@ def st_upload(parser, args, output_manager):
             st_upload_help)
         return
 
-    if from_stdin:
+    if options['segment_dedup']:
+        options['use_slo'] = True
+
+    if options['resume']:
+        options['resume_dir'] = expanduser(DEFAULT_RESUME_DIR)
+
+    if from_stdin and (options['segment_size'] or not options['compress']):
+        # A compressed stream is one object unless a segment size is given
         if not options['use_slo']:
             options['use_slo'] = True
         if not options['segment_size']:
@@ -1070,48 +1330,52 @@ def st_upload(parser, args, output_manager):
 
     options['object_uu_threads'] = options['object_threads']
     with SwiftService(options=options) as swift:
-        try:
-            objs = []
-            dir_markers = []
+        def _upload_objects():
+            # Objects are generated as the tree is scanned, so uploads can
+            # start before the scan is complete
             for f in files:
                 if f == '-':
                     fd = io.open(stdin.fileno(), mode='rb')
-                    objs.append(SwiftUploadObject(
-                        fd, object_name=options['object_name']))
+                    yield SwiftUploadObject(
+                        fd, object_name=options['object_name'])
                     # We ensure that there is exactly one "file" to upload in
                     # this case -- stdin
-                    break
+                    return
 
                 if isfile(f):
-                    objs.append(f)
+                    try:
+                        entries = [(f, stat(f), False)]
+                    except OSError:
+                        entries = [(f, None, False)]
                 elif isdir(f):
-                    for (_dir, _ds, _fs) in walk(f):
-                        if not (_ds + _fs):
-                            dir_markers.append(_dir)
-                        else:
-                            objs.extend([join(_dir, _f) for _f in _fs])
+                    entries = _scan_upload_tree(f)
                 else:
                     output_manager.error("Local file '%s' not found" % f)
+                    continue
 
-            # Now that we've collected all the required files and dir markers
-            # build the tuples for the call to upload
-            if options['object_name'] is not None and not from_stdin:
-                objs = [
-                    SwiftUploadObject(
-                        o, object_name=o.replace(
-                            orig_path, options['object_name'], 1
-                        )
-                    ) for o in objs
-                ]
-                dir_markers = [
-                    SwiftUploadObject(
-                        None, object_name=d.replace(
-                            orig_path, options['object_name'], 1
-                        ), options={'dir_marker': True}
-                    ) for d in dir_markers
-                ]
-
-            for r in swift.upload(container, objs + dir_markers):
+                for path, st, is_dir_marker in entries:
+                    if options['object_name'] is not None:
+                        obj_name = path.replace(
+                            orig_path, options['object_name'], 1)
+                    else:
+                        obj_name = None
+                    if is_dir_marker and obj_name is not None:
+                        yield SwiftUploadObject(
+                            None, object_name=obj_name,
+                            options={'dir_marker': True})
+                    else:
+                        yield SwiftUploadObject(
+                            path, object_name=obj_name, stat_result=st)
+
+        try:
+            for r in swift.upload(container, _upload_objects()):
+                if options['output_format'] == 'jsonl':
+                    # Failing to create the container is only a warning
+                    _print_json_result(
+                        output_manager, r,
+                        is_error=not (r['success'] or
+                                      r.get('action') == 'create_container'))
+                    continue
                 if r['success']:
                     if options['verbose']:
                         if 'attempts' in r and r['attempts'] > 1:
@@ -1410,6 +1674,15 @@ class HelpFormatter(argparse.HelpFormatter):
         return action.dest
 
 
+def _endpoint(value):
+    parsed = urlparse(value)
+    if parsed.scheme not in ('http', 'https') or not parsed.netloc:
+        raise argparse.ArgumentTypeError(
+            'invalid endpoint: %r (expected a URL such as '
+            'https://proxy1:8080)' % value)
+    return value
+
+
 def parse_args(parser, args, enforce_requires=True):
     options, args = parser.parse_known_args(args or ['-h'])
     options = vars(options)
@@ -1478,11 +1751,17 @@ def main(arguments=None):
     parser = argparse.ArgumentParser(
         add_help=False, formatter_class=HelpFormatter, usage='''
 %(prog)s [--version] [--help] [--os-help] [--snet] [--verbose]
-             [--debug] [--info] [--quiet] [--auth <auth_url>]
+             [--debug] [--info] [--quiet] [--format <format>]
+             [--auth <auth_url>]
              [--auth-version <auth_version> |
                  --os-identity-api-version <auth_version> ]
              [--user <username>]
              [--key <api_key>] [--retries <num_retries>]
+             [--circuit-breaker <failures>]
+             [--cache-dir <directory>] [--cache-size <megabytes>]
+             [--expect-continue <seconds>]
+             [--endpoint <url>] [--endpoint-strategy <strategy>]
+             [--resolve-endpoints]
              [--os-username <auth-user-name>] [--os-password <auth-password>]
              [--os-user-id <auth-user-id>]
              [--os-user-domain-id <auth-user-domain-id>]
@@ -1576,6 +1855,12 @@ Examples:
                         'results of all http queries which return an error.')
     parser.add_argument('-q', '--quiet', action='store_const', dest='verbose',
                         const=0, default=1, help='Suppress status output.')
+    parser.add_argument('--format', dest='output_format',
+                        choices=('text', 'jsonl'), default='text',
+                        help='Print the results of delete, download, list, '
+                             'stat and upload as human readable "text" '
+                             '(the default), or as "jsonl", one JSON object '
+                             'per line.')
     parser.add_argument('-A', '--auth', dest='auth',
                         default=environ.get('ST_AUTH'),
                         help='URL for obtaining an auth token.')
@@ -1596,6 +1881,48 @@ Examples:
     parser.add_argument('-R', '--retries', type=int, default=5, dest='retries',
                         help='The number of times to retry a failed '
                              'connection.')
+    parser.add_argument('--circuit-breaker', type=int,
+                        dest='circuit_breaker_threshold', default=None,
+                        metavar='<failures>',
+                        help='Stop sending requests to a proxy for a while '
+                             'after this many consecutive connection errors '
+                             'or server errors from it.')
+    parser.add_argument('--cache-dir', dest='object_cache_dir',
+                        default=environ.get('SWIFTCLIENT_CACHE_DIR'),
+                        metavar='<directory>',
+                        help='Cache downloaded objects in this directory, '
+                             'and download them again only if they have '
+                             'changed. Defaults to '
+                             'env[SWIFTCLIENT_CACHE_DIR].')
+    parser.add_argument('--cache-size', type=int, dest='object_cache_size',
+                        default=1024, metavar='<megabytes>',
+                        help='The size of the --cache-dir cache, beyond '
+                             'which the least recently used objects are '
+                             'removed. Default is 1024.')
+    parser.add_argument('--expect-continue', type=float,
+                        dest='expect_continue', default=None,
+                        metavar='<seconds>',
+                        help='Send object uploads with "Expect: '
+                             '100-continue", and wait up to this many '
+                             'seconds for the server to accept each one '
+                             'before sending its data.')
+    parser.add_argument('--endpoint', action='append', dest='endpoints',
+                        type=_endpoint, default=None, metavar='<url>',
+                        help='Spread requests over this proxy endpoint, '
+                             'such as https://proxy1:8080, which is used in '
+                             'place of the scheme, host and port of the '
+                             'storage URL. Can be given more than once.')
+    parser.add_argument('--endpoint-strategy', dest='endpoint_strategy',
+                        default='least-outstanding',
+                        choices=('least-outstanding', 'round-robin'),
+                        metavar='<strategy>',
+                        help='How to choose the endpoint of each request: '
+                             'least-outstanding (the default) or '
+                             'round-robin.')
+    parser.add_argument('--resolve-endpoints', action='store_true',
+                        dest='resolve_endpoints', default=False,
+                        help='Spread requests over every address that the '
+                             'host of an http storage URL resolves to.')
     default_val = config_true_value(environ.get('SWIFTCLIENT_INSECURE'))
     parser.add_argument('--insecure',
                         action="store_true", dest="insecure",
@@ -1768,7 +2095,7 @@ Examples:
 
     signal.signal(signal.SIGINT, immediate_exit)
 
-    with OutputManager() as output:
+    with OutputManager(buffered=True) as output:
         parser.usage = globals()['st_%s_help' % args[0]]
         if options['insecure']:
             import requests
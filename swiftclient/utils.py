@@ -23,6 +23,17 @@ import logging
 import six
 import time
 import traceback
+import zlib
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
 TRUE_VALUES = set(('true', '1', 'yes', 'on', 't', 'y'))
 EMPTY_ETAG = 'd41d8cd98f00b204e9800998ecf8427e'
@@ -30,6 +41,14 @@ EXPIRES_ISO8601_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
 SHORT_EXPIRES_ISO8601_FORMAT = '%Y-%m-%d'
 TIME_ERRMSG = ('time must either be a whole number or in specific '
                'ISO 8601 format.')
+# The metadata recording how an object was compressed by the client
+COMPRESSION_META = 'x-object-meta-compression'
+# ...and the size and md5 of the data before it was compressed
+UNCOMPRESSED_SIZE_META = 'x-object-meta-uncompressed-size'
+UNCOMPRESSED_MD5_META = 'x-object-meta-uncompressed-md5'
+COMPRESSION_CODECS = ('gzip', 'zstd')
+_DECOMPRESS_ERRORS = (zlib.error,) if zstandard is None else (
+    zlib.error, zstandard.ZstdError)
 
 
 def config_true_value(value):
@@ -359,6 +378,303 @@ class LengthWrapper(object):
         self._remaining = self._length
 
 
+class ContentDefinedChunker(object):
+    """
+    Find content-defined chunk boundaries in a stream of bytes.
+
+    This is a FastCDC style chunker: a Gear rolling hash over a 32 byte
+    window is computed for each position, and a chunk ends where the hash
+    matches a mask. A stricter mask is used before the average chunk size
+    and a looser one after it, which keeps chunk sizes close to the average.
+    Because boundaries depend only on nearby content, inserting or removing
+    bytes in one part of a file only changes the chunks around the edit.
+
+    The hash is vectorized with numpy when it is available; otherwise a
+    (much slower) pure Python loop gives the same boundaries.
+    """
+    WINDOW = 32
+    _GEAR = tuple(int(hashlib.md5(six.int2byte(i)).hexdigest()[:8], 16)
+                  for i in range(256))
+    _MASK32 = 0xffffffff
+    _SCAN_BLOCK = 2 ** 16
+
+    def __init__(self, avg_size, min_size=None, max_size=None):
+        """
+        :param avg_size: The target average chunk size in bytes.
+        :param min_size: The smallest chunk to create (except for the last
+                         one). Defaults to a quarter of ``avg_size``, and is
+                         never less than twice the hash window.
+        :param max_size: The largest chunk to create. Defaults to twice
+                         ``avg_size``.
+        """
+        avg_size = int(avg_size)
+        if min_size is None:
+            min_size = avg_size // 4
+        if max_size is None:
+            max_size = avg_size * 2
+        self.min_size = max(int(min_size), 2 * self.WINDOW)
+        self.max_size = max(int(max_size), self.min_size)
+        self.avg_size = min(max(avg_size, self.min_size), self.max_size)
+        bits = self.avg_size.bit_length() - 1
+        self.mask_s = self._mask(min(bits + 2, 32))
+        self.mask_l = self._mask(max(bits - 2, 1))
+        if numpy is not None:
+            self._np_gear = numpy.array(self._GEAR, dtype=numpy.uint32)
+
+    @staticmethod
+    def _mask(bits):
+        # Use the high bits, which depend on the whole window
+        return ((1 << bits) - 1) << (32 - bits)
+
+    def cut_point(self, data):
+        """
+        Find the length of the first chunk of ``data``.
+
+        :param data: Bytes starting at the beginning of a chunk. Unless the
+                     end of the stream has been reached, this should hold at
+                     least ``max_size`` bytes.
+        :returns: The length of the chunk.
+        """
+        n = len(data)
+        if n <= self.min_size:
+            return n
+        end = min(n, self.max_size)
+        # A chunk of length i + 1 ends where the hash at position i matches
+        for lo, hi, mask in (
+                (self.min_size - 1, min(self.avg_size, end) - 1, self.mask_s),
+                (self.avg_size - 1, end - 1, self.mask_l)):
+            if lo >= hi:
+                continue
+            i = self._scan(data, lo, hi, mask)
+            if i is not None:
+                return i + 1
+        return end
+
+    def _scan(self, data, lo, hi, mask):
+        if numpy is None:
+            return self._scan_python(data, lo, hi, mask)
+        while lo < hi:
+            block_hi = min(hi, lo + self._SCAN_BLOCK)
+            i = self._scan_numpy(data, lo, block_hi, mask)
+            if i is not None:
+                return i
+            lo = block_hi
+        return None
+
+    def _scan_python(self, data, lo, hi, mask):
+        if not isinstance(data, bytearray):
+            data = bytearray(data)
+        gear = self._GEAR
+        m32 = self._MASK32
+        h = 0
+        for j in range(lo - self.WINDOW + 1, lo):
+            h = ((h << 1) + gear[data[j]]) & m32
+        for i in range(lo, hi):
+            h = ((h << 1) + gear[data[i]]) & m32
+            if not h & mask:
+                return i
+        return None
+
+    def _scan_numpy(self, data, lo, hi, mask):
+        start = lo - self.WINDOW + 1
+        window = numpy.frombuffer(bytes(data[start:hi]), dtype=numpy.uint8)
+        h = self._np_gear[window]
+        # Sum the shifted gear values over the window by doubling: after the
+        # step for m, h[i] covers the m * 2 bytes ending at i.
+        m = 1
+        while m < self.WINDOW:
+            h[m:] += h[:-m] << numpy.uint32(m)
+            m *= 2
+        hits = numpy.flatnonzero(
+            (h[self.WINDOW - 1:] & numpy.uint32(mask)) == 0)
+        if len(hits):
+            return lo + int(hits[0])
+        return None
+
+    def _iter_boundaries(self, read):
+        # Only the block being scanned and the WINDOW - 1 bytes of hash
+        # context before it are kept; everything else is tracked by offset.
+        context = self.WINDOW - 1
+        buf = bytearray()
+        buf_start = 0  # offset of buf[0] in the stream
+        start = 0  # offset of the current chunk
+        pos = self.min_size - 1  # next position to hash
+        eof = False
+        while True:
+            if not eof:
+                block = read(self._SCAN_BLOCK)
+                if block:
+                    buf += block
+                else:
+                    eof = True
+            avail = buf_start + len(buf)
+            while True:
+                end = start + self.max_size
+                if eof:
+                    end = min(end, avail)
+                    if end <= start:
+                        return
+                # A chunk ending at i + 1 is found by the hash at position
+                # i; the last position before ``end`` needn't be checked.
+                stop = min(end - 1, avail)
+                cut = None
+                avg = start + self.avg_size - 1
+                for lo, hi, mask in ((pos, min(stop, avg), self.mask_s),
+                                     (max(pos, avg), stop, self.mask_l)):
+                    if lo < hi:
+                        i = self._scan(
+                            buf, lo - buf_start, hi - buf_start, mask)
+                        if i is not None:
+                            cut = buf_start + i + 1
+                            break
+                if cut is None:
+                    pos = max(pos, stop)
+                    if pos < end - 1:
+                        # Need more data
+                        break
+                    cut = end
+                yield start, cut - start
+                start = cut
+                pos = start + self.min_size - 1
+            keep = max(buf_start, min(pos - context, avail))
+            del buf[:keep - buf_start]
+            buf_start = keep
+
+    def iter_boundaries(self, readable):
+        """
+        Read ``readable`` to the end, yielding ``(offset, length)`` for each
+        chunk as it is found.
+
+        Memory use is bounded by the scan block size rather than the chunk
+        size, as chunk data is not kept.
+        """
+        return self._iter_boundaries(readable.read)
+
+    def iter_chunks(self, readable):
+        """
+        Read ``readable`` to the end, yielding the bytes of each chunk.
+        """
+        pending = bytearray()
+
+        def read(size):
+            block = readable.read(size)
+            pending.extend(block)
+            return block
+
+        for _offset, length in self._iter_boundaries(read):
+            yield bytes(pending[:length])
+            del pending[:length]
+
+
+def compression_available(codec):
+    """
+    Return True if objects can be compressed and decompressed with
+    ``codec``; zstd needs the ``zstandard`` package.
+    """
+    if codec == 'gzip':
+        return True
+    return codec == 'zstd' and zstandard is not None
+
+
+def _check_codec(codec):
+    if codec not in COMPRESSION_CODECS:
+        raise ValueError('Unknown compression codec: %r' % (codec,))
+    if not compression_available(codec):
+        raise ValueError('The zstandard package is needed for zstd '
+                         'compression')
+
+
+class CompressingIterable(object):
+    """
+    Wrap a filelike object and act as an iterator over its contents,
+    compressed with ``codec`` as they are read.
+    """
+
+    def __init__(self, content, codec, chunk_size=65536, md5=False):
+        """
+        :param content: The filelike object to compress.
+        :param codec: ``'gzip'`` or ``'zstd'``.
+        :param chunk_size: The size of each read from the filelike object.
+        :param md5: Flag to enable calculating the MD5 of the compressed
+                    content as it is yielded.
+        """
+        _check_codec(codec)
+        if codec == 'gzip':
+            self._compressor = zlib.compressobj(
+                zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED,
+                16 + zlib.MAX_WBITS)
+        else:
+            self._compressor = zstandard.ZstdCompressor().compressobj()
+        self.md5sum = hashlib.md5() if md5 else NoopMD5()
+        self.content = content
+        self.chunk_size = chunk_size
+        self._flushed = False
+
+    def get_md5sum(self):
+        return self.md5sum.hexdigest()
+
+    def __next__(self):
+        chunk = b''
+        while not chunk:
+            if self._flushed:
+                raise StopIteration
+            data = self.content.read(self.chunk_size)
+            if isinstance(data, six.text_type):
+                data = data.encode()
+            if data:
+                chunk = self._compressor.compress(data)
+            else:
+                chunk = self._compressor.flush()
+                self._flushed = True
+        self.md5sum.update(chunk)
+        return chunk
+
+    def next(self):
+        return self.__next__()
+
+    def __iter__(self):
+        return self
+
+
+class Decompressor(object):
+    """
+    Incrementally decompress an object compressed with ``codec``. Several
+    compressed streams one after another (e.g. the segments of a large
+    object) are decompressed in turn.
+    """
+
+    def __init__(self, codec):
+        _check_codec(codec)
+        self.codec = codec
+        self._decompressor = self._new()
+
+    def _new(self):
+        if self.codec == 'gzip':
+            return zlib.decompressobj(16 + zlib.MAX_WBITS)
+        return zstandard.ZstdDecompressor().decompressobj()
+
+    def decompress(self, data):
+        """
+        :returns: The decompressed bytes available so far.
+        :raises ValueError: if the data is not valid for the codec.
+        """
+        out = []
+        while data:
+            try:
+                out.append(self._decompressor.decompress(data))
+            except _DECOMPRESS_ERRORS as err:
+                raise ValueError('Invalid %s data: %s' % (self.codec, err))
+            data = getattr(self._decompressor, 'unused_data', b'')
+            if data or getattr(self._decompressor, 'eof', False):
+                # Any more data is the start of another stream
+                self._decompressor = self._new()
+        return b''.join(out)
+
+    def flush(self):
+        flush = getattr(self._decompressor, 'flush', None)
+        return flush() if flush is not None else b''
+
+
 def iter_wrapper(iterable):
     for chunk in iterable:
         if len(chunk) == 0:
@@ -238,3 +238,129 @@ class TestOutputManager(unittest.TestCase):
         ]), err_stream.getvalue().decode('utf8'))
 
         self.assertEqual(3, thread_manager.error_count)
+
+    def test_buffered_printers(self):
+        out_stream = CaptureStream(sys.stdout)
+        err_stream = CaptureStream(sys.stderr)
+        starting_thread_count = threading.active_count()
+
+        with mt.OutputManager(
+                print_stream=out_stream, error_stream=err_stream,
+                buffered=True) as thread_manager:
+
+            # No printing has happened yet, so no new threads
+            self.assertEqual(starting_thread_count,
+                             threading.active_count())
+
+            thread_manager.print_msg('one-argument')
+            thread_manager.print_msg('one %s, %d fish', 'fish', 88)
+            thread_manager.error('I have %d problems, but a %s is not one',
+                                 99, u'تت')
+            thread_manager.print_raw(
+                u'some raw bytes: تت'.encode('utf-8'))
+            thread_manager.warning('a warning')
+            thread_manager.print_items([
+                ('key', 'value'),
+                ('object', u'Öbject'),
+            ])
+            thread_manager.print_raw(b'\xffugly\xffraw')
+
+            # A single writer thread handles both streams
+            self.assertEqual(starting_thread_count + 1,
+                             threading.active_count())
+
+        # The writer thread should have been cleaned up
+        self.assertEqual(starting_thread_count, threading.active_count())
+
+        self.assertEqual(''.join([
+            'one-argument\n',
+            'one fish, 88 fish\n',
+            u'some raw bytes: تت',
+            '           key: value\n',
+            u'        object: Öbject\n'
+        ]).encode('utf8') + b'\xffugly\xffraw', out_stream.getvalue())
+
+        self.assertEqual(''.join([
+            u'I have 99 problems, but a تت is not one\n',
+            'a warning\n',
+        ]), err_stream.getvalue().decode('utf8'))
+
+        self.assertEqual(1, thread_manager.error_count)
+
+    def test_count_error(self):
+        for buffered in (False, True):
+            out_stream = CaptureStream(sys.stdout)
+            err_stream = CaptureStream(sys.stderr)
+            with mt.OutputManager(
+                    print_stream=out_stream, error_stream=err_stream,
+                    buffered=buffered) as thread_manager:
+                thread_manager.print_msg('{"success": false}')
+                thread_manager.count_error()
+                thread_manager.error('oops')
+
+            self.assertEqual(b'{"success": false}\n', out_stream.getvalue())
+            self.assertEqual(b'oops\n', err_stream.getvalue())
+            self.assertEqual(2, thread_manager.get_error_count())
+
+    def test_buffered_flush_before_error(self):
+        written = []
+
+        class RecordingStream(CaptureStream):
+            def __init__(self, name, stream):
+                super(RecordingStream, self).__init__(stream)
+                self.name = name
+
+            def write(self, data, *args, **kwargs):
+                written.append((self.name, data))
+                super(RecordingStream, self).write(data, *args, **kwargs)
+
+        out_stream = RecordingStream('out', sys.stdout)
+        err_stream = RecordingStream('err', sys.stderr)
+        with mt.OutputManager(
+                print_stream=out_stream, error_stream=err_stream,
+                buffered=True, flush_interval=60) as thread_manager:
+            thread_manager.print_msg('first')
+            thread_manager.print_msg('second')
+            thread_manager.error('oops')
+            thread_manager.print_msg('third')
+
+        # Pending output is written in one batch, ahead of the error
+        self.assertEqual(('out', 'first\nsecond\n'), written[0])
+        self.assertEqual('err', written[1][0])
+        self.assertEqual(('out', 'third\n'), written[-1])
+
+    def test_buffered_write_failure(self):
+        class BrokenPipe(CaptureStream):
+            def write(self, data, *args, **kwargs):
+                raise IOError(32, 'Broken pipe')
+
+            def flush(self):
+                raise IOError(32, 'Broken pipe')
+
+        out_stream = BrokenPipe(sys.stdout)
+        err_stream = CaptureStream(sys.stderr)
+        with mt.OutputManager(
+                print_stream=out_stream, error_stream=err_stream,
+                buffered=True, flush_size=1) as thread_manager:
+            thread_manager.print_msg('lost')
+            thread_manager.error('real failure')
+            thread_manager.count_error()
+
+        # The writer survives the failed write, so errors are still
+        # reported and counted
+        self.assertEqual(2, thread_manager.get_error_count())
+        self.assertEqual(b'real failure\n', err_stream.getvalue())
+        self.assertEqual(32, thread_manager.write_error.errno)
+
+    def test_buffered_flush_size(self):
+        out_stream = CaptureStream(sys.stdout)
+        with mt.OutputManager(
+                print_stream=out_stream, buffered=True, flush_interval=60,
+                flush_size=4) as thread_manager:
+            thread_manager.print_msg('abcd')
+            # flush_size was reached, so output appears before exit
+            for _ in range(100):
+                if out_stream.getvalue():
+                    break
+                sleep(0.01)
+            self.assertEqual(b'abcd\n', out_stream.getvalue())
@@ -15,15 +15,22 @@
 # limitations under the License.
 from __future__ import unicode_literals
 import contextlib
+import json
 import mock
 import os
+import shutil
 import six
+import stat
+import tarfile
 import tempfile
+import threading
 import unittest
 import time
 
-from concurrent.futures import Future
-from hashlib import md5
+from concurrent.futures import Future, ThreadPoolExecutor
+from copy import deepcopy
+from functools import partial
+from hashlib import md5, sha256
 from mock import Mock, PropertyMock
 from six.moves.queue import Queue, Empty as QueueEmptyError
 from six import BytesIO
@@ -217,6 +224,154 @@ class TestSwiftReader(unittest.TestCase):
         self.assertEqual(sr._actual_md5.hexdigest(),
                          md5('abc'.encode() * 3).hexdigest())
 
+    def test_iter_into(self):
+        data = b'0123456789' * 10
+        buffers = [bytearray(16), bytearray(16)]
+        sr = self.sr('path', BytesIO(data),
+                     {'content-length': len(data),
+                      'etag': md5(data).hexdigest()})
+        read = []
+        for i, view in enumerate(sr.iter_into(buffers)):
+            # The buffers are used in turn
+            self.assertIs(buffers[i % 2], view.obj)
+            read.append(view.tobytes())
+        self.assertEqual(data, b''.join(read))
+        self.assertEqual(len(data), sr.bytes_read())
+
+        sr = self.sr('path', BytesIO(data),
+                     {'etag': md5(b'doesntmatch').hexdigest()})
+        self.assertRaises(SwiftError, list, sr.iter_into(buffers))
+
+        # Bodies that can't read into a buffer are iterated over
+        sr = self.sr('path', [b'abc'] * 3, {'content-length': 9})
+        self.assertEqual([b'abc'] * 3, list(sr.iter_into(buffers)))
+        self.assertEqual(9, sr.bytes_read())
+
+    def test_decompress(self):
+        data = b'0123456789' * 100
+        compressed = b''.join(utils.CompressingIterable(
+            BytesIO(data), 'gzip', chunk_size=100))
+        chunks = [compressed[i:i + 10] for i in range(0, len(compressed), 10)]
+        headers = {'content-length': len(compressed),
+                   'etag': md5(compressed).hexdigest(),
+                   'x-object-meta-compression': 'gzip'}
+
+        sr = self.sr('path', chunks, headers, True, True)
+        self.assertEqual(data, b''.join(sr))
+        # The stored, compressed object is what's checked
+        self.assertEqual(len(compressed), sr.bytes_read())
+
+        # Decompressed bodies aren't read into buffers
+        sr = self.sr('path', BytesIO(compressed), headers, True, True)
+        self.assertEqual(data, b''.join(
+            bytes(chunk) for chunk in sr.iter_into([bytearray(16)])))
+
+        sr = self.sr('path', chunks, dict(
+            headers, etag=md5(b'doesntmatch').hexdigest()), True, True)
+        self.assertRaises(SwiftError, b''.join, sr)
+
+        # Without decompress, the object is left as it is stored
+        sr = self.sr('path', chunks, headers, True, False)
+        self.assertEqual(compressed, b''.join(sr))
+
+        sr = self.sr('path', [b'not compressed'], dict(
+            headers, etag='', **{'content-length': 14}), True, True)
+        self.assertRaises(SwiftError, b''.join, sr)
+
+        with mock.patch.object(utils, 'zstandard', None):
+            self.assertRaises(SwiftError, self.sr, 'path', chunks, dict(
+                headers, **{'x-object-meta-compression': 'zstd'}),
+                True, True)
+
+    def test_download_buffers(self):
+        buffers = swiftclient.service._download_buffers()
+        self.assertEqual(swiftclient.service.DOWNLOAD_BUFFERS, len(buffers))
+        self.assertEqual(
+            [swiftclient.service.DISK_BUFFER] * len(buffers),
+            [len(buf) for buf in buffers])
+        # Each thread reuses its own ring
+        self.assertIs(buffers, swiftclient.service._download_buffers())
+        other = []
+        thread = threading.Thread(target=lambda: other.append(
+            swiftclient.service._download_buffers()))
+        thread.start()
+        thread.join()
+        self.assertIsNot(buffers, other[0])
+
+
+class TestDiskWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = ThreadPoolExecutor(max_workers=2)
+        self.addCleanup(self.pool.shutdown)
+
+    def test_runs_in_order(self):
+        done = []
+        writer = swiftclient.service._DiskWriter(self.pool, 2)
+        for i in range(100):
+            writer.submit(done.append, i)
+        writer.join()
+        self.assertEqual(list(range(100)), done)
+        self.assertIsNone(writer.error)
+
+    def test_bounded(self):
+        release = threading.Event()
+        writer = swiftclient.service._DiskWriter(self.pool, 2)
+        writer.submit(release.wait)
+        submitted = []
+
+        def submit_more():
+            for i in range(3):
+                writer.submit(submitted.append, i)
+                submitted.append('queued %d' % i)
+        thread = threading.Thread(target=submit_more)
+        thread.start()
+        thread.join(0.2)
+        # Two calls are waiting behind the blocked one, and the third waits
+        # for room
+        self.assertTrue(thread.is_alive())
+        self.assertEqual(['queued 0', 'queued 1'], submitted)
+        release.set()
+        thread.join()
+        writer.join()
+        self.assertEqual([0, 1, 2],
+                         [x for x in submitted if isinstance(x, int)])
+        self.assertIn('queued 2', submitted)
+
+    def test_error(self):
+        done = []
+        writer = swiftclient.service._DiskWriter(self.pool, 10)
+        err = IOError('disk full')
+        release = threading.Event()
+        writer.submit(release.wait)
+        writer.submit(Mock(side_effect=err))
+        writer.submit(done.append, 1)
+        release.set()
+        writer.join()
+        self.assertIs(err, writer.error)
+        self.assertEqual([], done)
+        self.assertRaises(IOError, writer.submit, done.append, 2)
+
+
+class TestDirectoryCache(unittest.TestCase):
+
+    def test_makedirs(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        path = os.path.join(tmpdir, 'a', 'b')
+        cache = swiftclient.service._DirectoryCache()
+        with mock.patch('swiftclient.service.mkdirs',
+                        side_effect=swiftclient.service.mkdirs) as mkdirs:
+            cache.makedirs(path)
+            cache.makedirs(path)
+            self.assertTrue(os.path.isdir(path))
+            mkdirs.assert_called_once_with(path)
+            os.rmdir(path)
+            cache.forget(path)
+            cache.makedirs(path)
+            self.assertTrue(os.path.isdir(path))
+            self.assertEqual(2, mkdirs.call_count)
+
 
 class _TestServiceBase(unittest.TestCase):
     def _get_mock_connection(self, attempts=2):
@@ -399,6 +554,54 @@ class TestServiceDelete(_TestServiceBase):
         )
         self.assertEqual(expected_r, r)
 
+    def test_delete_object_slo_dedup_segments(self):
+        # Content addressed segments may be shared with other manifests, so
+        # only the manifest and its own segments should be deleted
+        mock_q = Queue()
+        mock_conn = self._get_mock_connection()
+        mock_conn.head_object = Mock(
+            return_value={'x-static-large-object': True,
+                          'x-object-meta-segment-dedup': 'md5'}
+        )
+        manifest = [
+            {'name': '/test_c_segments/_dedup/md5/abc/10', 'bytes': 10},
+            {'name': '/test_c_segments/test_o/sub', 'bytes': 20,
+             'sub_slo': True},
+        ]
+        sub_manifest = [
+            {'name': '/test_c_segments/test_o/2', 'bytes': 10},
+            {'name': '/test_c_segments/_dedup/md5/def/10', 'bytes': 10},
+        ]
+        json_headers = {'content-type': 'application/json; charset=utf-8'}
+        mock_conn.get_object = Mock(side_effect=[
+            (json_headers, json.dumps(manifest).encode('utf-8')),
+            (json_headers, json.dumps(sub_manifest).encode('utf-8')),
+        ])
+        expected_r = self._get_expected({
+            'action': 'delete_object',
+            'success': True,
+            'dedup_segments_kept': 2,
+            'slo_segments_deleted': True
+        })
+
+        s = SwiftService()
+        with mock.patch('swiftclient.service.get_conn',
+                        return_value=mock_conn):
+            r = s._delete_object(
+                mock_conn, 'test_c', 'test_o', self.opts, mock_q
+            )
+
+        self.assertEqual(expected_r, r)
+        self.assertEqual([
+            mock.call('test_c', 'test_o', query_string=None,
+                      response_dict={}, headers={}),
+            mock.call('test_c_segments', 'test_o/2', response_dict={}),
+            mock.call('test_c_segments', 'test_o/sub', response_dict={}),
+        ], sorted(mock_conn.delete_object.mock_calls, key=str))
+        deleted = sorted(self._get_queue(mock_q)['object']
+                         for _ in range(2))
+        self.assertEqual(['test_o/2', 'test_o/sub'], deleted)
+
     def test_delete_object_dlo_support(self):
         mock_q = Queue()
         s = SwiftService()
@@ -666,6 +869,33 @@ class TestServiceUtils(unittest.TestCase):
         self.assertRaises(SwiftError, swiftclient.service.split_headers,
                           [('also', 'not', 'valid')])
 
+    def test_interruptable_as_completed(self):
+        fs = [Future() for _ in range(5)]
+        for i, f in enumerate(fs):
+            f.set_result(i)
+        orig = list(fs)
+
+        results = [f.result() for f in
+                   swiftclient.service.interruptable_as_completed(fs)]
+        self.assertEqual(sorted(results), list(range(5)))
+        # the caller's list is not consumed
+        self.assertEqual(orig, fs)
+
+    def test_interruptable_as_completed_timeout(self):
+        done = Future()
+        done.set_result('done')
+        later = Future()
+        timer = threading.Timer(0.05, later.set_result, ('later',))
+        timer.start()
+        try:
+            results = [f.result() for f in
+                       swiftclient.service.interruptable_as_completed(
+                           [done, later], timeout=0.01)]
+        finally:
+            timer.join()
+        # each future is yielded exactly once, even across timeouts
+        self.assertEqual(['done', 'later'], results)
+
 
 class TestSwiftUploadObject(unittest.TestCase):
 
@@ -965,6 +1195,68 @@ class TestServiceList(_TestServiceBase):
         self.assertEqual(expected_r, self._get_queue(mock_q))
         self.assertIsNone(self._get_queue(mock_q))
 
+    def test_list_account_totals(self):
+        mock_q = Queue()
+        mock_conn = self._get_mock_connection()
+        mock_conn.get_account = Mock(side_effect=[
+            (None, [{'name': 'test_c1', 'count': 2, 'bytes': 3},
+                    {'name': 'test_c2', 'count': 4, 'bytes': 5}]),
+            (None, [])
+        ])
+        mock_conn.head_container = Mock()
+
+        opts = dict(self.opts, long=True, totals=True)
+        SwiftService._list_account_job(mock_conn, opts, mock_q)
+        res = self._get_queue(mock_q)
+        self.assertEqual({'': {'count': 6, 'bytes': 8}}, res['totals'])
+        self.assertIsNone(self._get_queue(mock_q))
+        # Container metadata isn't needed when only reporting totals
+        self.assertFalse(mock_conn.head_container.called)
+
+    def test_list_container_totals_group_by(self):
+        listing = [
+            {'name': 'a/b/c', 'bytes': 1, 'content_type': 'text/plain'},
+            {'name': 'a/d', 'bytes': 2,
+             'content_type': 'text/plain; charset=utf-8'},
+            {'name': 'e', 'bytes': 4, 'content_type': 'image/png'},
+            {'subdir': 'f/'},
+        ]
+
+        def _run_job(group_by):
+            mock_q = Queue()
+            mock_conn = self._get_mock_connection()
+            mock_conn.get_container = Mock(
+                side_effect=[(None, listing), (None, [])])
+            opts = dict(self.opts, group_by=group_by)
+            SwiftService._list_container_job(
+                mock_conn, 'test_c', opts, mock_q)
+            res = self._get_queue(mock_q)
+            self.assertIsNone(self._get_queue(mock_q))
+            self.assertEqual(listing, res['listing'])
+            return res['totals']
+
+        self.assertEqual({
+            'text/plain': {'count': 2, 'bytes': 3},
+            'image/png': {'count': 1, 'bytes': 4},
+        }, _run_job('content_type'))
+        self.assertEqual({
+            'a/': {'count': 2, 'bytes': 3},
+            '': {'count': 1, 'bytes': 4},
+        }, _run_job('prefix'))
+        self.assertEqual({
+            'a/b/': {'count': 1, 'bytes': 1},
+            'a/': {'count': 1, 'bytes': 2},
+            '': {'count': 1, 'bytes': 4},
+        }, _run_job('prefix:2'))
+
+    def test_list_bad_group_by(self):
+        s = SwiftService()
+        for bad in ('name', 'prefix:0', 'prefix:x', 'content_type:1'):
+            with self.assertRaises(SwiftError):
+                next(s.list(container='test_c', options={'group_by': bad}))
+        with self.assertRaises(SwiftError):
+            next(s.list(options={'group_by': 'content_type'}))
+
     @mock.patch('swiftclient.service.get_conn')
     def test_list_queue_size(self, mock_get_conn):
         mock_conn = self._get_mock_connection()
@@ -1043,6 +1335,170 @@ class TestServiceList(_TestServiceBase):
 
 class TestService(unittest.TestCase):
 
+    def _watch_jobs(self, jobs, max_in_flight, cancelled=None):
+        rq = Queue()
+        SwiftService._watch_jobs(jobs, rq, max_in_flight,
+                                 cancelled or threading.Event())
+        results = []
+        while True:
+            res = rq.get_nowait()
+            if res is None:
+                return results
+            results.append(res)
+
+    def test_watch_jobs_window(self):
+        lock = threading.Lock()
+        in_flight = [0]
+        max_seen = [0]
+
+        def job(i):
+            sleep(0.001)
+            with lock:
+                in_flight[0] -= 1
+            return {'success': True, 'i': i}
+
+        def jobs(pool):
+            for i in range(20):
+                with lock:
+                    in_flight[0] += 1
+                    max_seen[0] = max(max_seen[0], in_flight[0])
+                yield partial(pool.submit, job, i), {'i': i}
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            results = self._watch_jobs(jobs(pool), 3)
+
+        self.assertEqual(list(range(20)), sorted(r['i'] for r in results))
+        self.assertLessEqual(max_seen[0], 3)
+
+    def test_watch_jobs_cancelled(self):
+        submit = Mock()
+        cancelled = threading.Event()
+        cancelled.set()
+        results = self._watch_jobs(
+            ((submit, {'object': o}) for o in ('a', 'b')), 10, cancelled)
+        self.assertFalse(submit.called)
+        self.assertEqual([
+            {'object': 'a', 'success': False, 'status': 'cancelled'},
+            {'object': 'b', 'success': False, 'status': 'cancelled'},
+        ], results)
+
+    def test_watch_jobs_error(self):
+        err = SwiftError('bad input')
+
+        def jobs():
+            f = Future()
+            f.set_result({'success': True})
+            yield (lambda: f), {}
+            # Jobs that submit nothing have no result to wait for
+            yield (lambda: None), {}
+            raise err
+
+        results = self._watch_jobs(jobs(), 10)
+        self.assertEqual([{'success': True}, err], results)
+
+    def test_watch_jobs_submit_error(self):
+        err = RuntimeError('cannot schedule new futures after shutdown')
+        submit = Mock(side_effect=err)
+        f = Future()
+        f.set_result({'success': True})
+
+        results = self._watch_jobs(
+            [((lambda: f), {}), (submit, {}), (submit, {})], 10)
+        # The watcher stops submitting, but still finishes
+        self.assertEqual([{'success': True}, err], results)
+        self.assertEqual(1, submit.call_count)
+
+    def test_max_in_flight_must_be_positive(self):
+        service = SwiftService({'max_in_flight': 0})
+        with self.assertRaises(SwiftError) as cm:
+            list(service.delete('c', ['a']))
+        self.assertIn('max_in_flight', cm.exception.value)
+
+    @mock.patch.object(SwiftService, '_bulk_delete_page_size',
+                       return_value=1)
+    def test_delete_objects_from_generator(self, _page_size):
+        conn = Mock(spec=Connection)
+        conn.attempts = 1
+        conn.head_object.return_value = {}
+        objects = ('o%d' % i for i in range(50))
+        with mock.patch('swiftclient.service.get_conn', return_value=conn):
+            with SwiftService({'max_in_flight': 4}) as swift:
+                results = list(swift.delete('c', objects))
+        self.assertEqual(50, len(results))
+        self.assertTrue(all(r['success'] for r in results))
+        self.assertEqual(
+            sorted('o%d' % i for i in range(50)),
+            sorted(r['object'] for r in results))
+
+    def test_shared_retry_policy(self):
+        policy = SwiftService()._options['retry_policy']
+        # The retry budget is opt-in
+        self.assertIsNone(policy.budget)
+
+        service = SwiftService({'retry_jitter': 'full',
+                                'retry_budget': True})
+        policy = service._options['retry_policy']
+        self.assertIsInstance(policy, swiftclient.RetryPolicy)
+        self.assertEqual('full', policy.jitter)
+        self.assertIsInstance(policy.budget, swiftclient.RetryBudget)
+        # Every connection, and every copy of the options, use the same
+        # policy and so the same retry budget
+        conns = [service.thread_manager.segment_pool._create_connection()
+                 for _ in range(2)]
+        self.assertIs(policy, conns[0].retry_policy)
+        self.assertIs(policy, conns[1].retry_policy)
+        self.assertIs(policy, deepcopy(service._options)['retry_policy'])
+
+        policy = swiftclient.RetryPolicy()
+        service = SwiftService({'retry_policy': policy})
+        self.assertIs(policy, service._options['retry_policy'])
+
+    def test_shared_circuit_breaker(self):
+        service = SwiftService()
+        self.assertIsNone(service._options['circuit_breaker'])
+        service = SwiftService({'circuit_breaker_threshold': 3})
+        breaker = service._options['circuit_breaker']
+        self.assertIsInstance(breaker, swiftclient.CircuitBreaker)
+        self.assertEqual(3, breaker.failure_threshold)
+        conn = service.thread_manager.object_dd_pool._create_connection()
+        self.assertIs(breaker, conn.circuit_breaker)
+
+    def test_shared_object_cache(self):
+        service = SwiftService()
+        self.assertIsNone(service._options['object_cache'])
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        service = SwiftService({'object_cache_dir': cache_dir,
+                                'object_cache_size': 10})
+        cache = service._options['object_cache']
+        self.assertIsInstance(cache, swiftclient.ObjectCache)
+        self.assertEqual(cache_dir, cache.path)
+        self.assertEqual(10 * 2 ** 20, cache.max_size)
+        conn = service.thread_manager.object_dd_pool._create_connection()
+        self.assertIs(cache, conn.object_cache)
+        self.assertIs(cache, deepcopy(service._options)['object_cache'])
+
+    def test_shared_endpoint_pool(self):
+        service = SwiftService()
+        self.assertIsNone(service._options['endpoint_pool'])
+        service = SwiftService({'endpoints': ['http://proxy1',
+                                              'http://proxy2'],
+                                'endpoint_strategy': 'round-robin'})
+        pool = service._options['endpoint_pool']
+        self.assertIsInstance(pool, swiftclient.EndpointPool)
+        self.assertEqual(['http://proxy1', 'http://proxy2'], pool.endpoints)
+        self.assertEqual('round-robin', pool.strategy)
+        self.assertFalse(pool.resolve)
+        conn = service.thread_manager.object_dd_pool._create_connection()
+        self.assertIs(pool, conn.endpoint_pool)
+        self.assertIs(pool, deepcopy(service._options)['endpoint_pool'])
+        service = SwiftService({'resolve_endpoints': True})
+        self.assertTrue(service._options['endpoint_pool'].resolve)
+        for bad in ({'endpoints': ['proxy1:8080']},
+                    {'endpoints': ['http://proxy1'],
+                     'endpoint_strategy': 'random'}):
+            self.assertRaises(SwiftError, SwiftService, bad)
+
     def test_upload_with_bad_segment_size(self):
         for bad in ('ten', '1234X', '100.3'):
             options = {'segment_size': bad}
@@ -1054,9 +1510,8 @@ class TestService(unittest.TestCase):
                 self.assertEqual('Segment size should be an integer value',
                                  exc.value)
 
-    @mock.patch('swiftclient.service.stat')
-    @mock.patch('swiftclient.service.getmtime', return_value=1.0)
-    @mock.patch('swiftclient.service.getsize', return_value=4)
+    @mock.patch('swiftclient.service.stat', return_value=Mock(
+        st_mode=stat.S_IFREG, st_size=4, st_mtime=1.0))
     def test_upload_with_relative_path(self, *args, **kwargs):
         service = SwiftService({})
         objects = [{'path': "./test",
@@ -1090,6 +1545,30 @@ class TestService(unittest.TestCase):
                 self.assertEqual(upload_obj_resp['path'], obj['path'])
                 self.assertTrue(mock_open.return_value.closed)
 
+    def test_upload_with_stat_result(self):
+        # A stat result given with the upload object is used instead of
+        # stat'ing the file again
+        st = Mock(st_mode=stat.S_IFREG, st_size=4, st_mtime=1.5)
+        service = SwiftService({})
+        with mock.patch('swiftclient.service.Connection') as mock_conn, \
+                mock.patch('swiftclient.service.stat') as mock_stat, \
+                mock.patch.object(builtins, 'open') as mock_open:
+            mock_open.return_value = six.StringIO('asdf')
+            mock_conn.return_value.head_object.side_effect = \
+                ClientException('Not Found', http_status=404)
+            mock_conn.return_value.put_object.return_value = \
+                md5().hexdigest()
+            responses = list(service.upload(
+                'c', [SwiftUploadObject('test', stat_result=st)]))
+        self.assertEqual([True, True], [r['success'] for r in responses])
+        self.assertEqual([], mock_stat.mock_calls)
+        upload_res = responses[1]
+        self.assertEqual('1.500000',
+                         upload_res['headers']['x-object-meta-mtime'])
+        self.assertEqual(
+            4, mock_conn.return_value.put_object.call_args[1][
+                'content_length'])
+
     @mock.patch('swiftclient.service.Connection')
     def test_upload_stream(self, mock_conn):
         service = SwiftService({})
@@ -1188,6 +1667,77 @@ class TestServiceUpload(_TestServiceBase):
             self.assertTrue(fp.closed,
                             'Failed to close open(%s)' % formatted_args)
 
+    @mock.patch('swiftclient.service.Connection')
+    def test_upload_container_cache(self, mock_conn):
+        conn = mock_conn.return_value
+        conn.head_object.side_effect = ClientException(
+            'Not Found', http_status=404)
+        conn.put_object.return_value = md5().hexdigest()
+
+        def do_upload(service, policy='gold'):
+            return [r['action'] for r in service.upload(
+                'c', [SwiftUploadObject(six.StringIO(''), 'o')],
+                {'header': ['X-Storage-Policy:%s' % policy]})]
+
+        with SwiftService({'container_cache_ttl': 60}) as service:
+            self.assertEqual(['create_container', 'upload_object'],
+                             do_upload(service))
+            self.assertEqual(1, conn.put_container.call_count)
+
+            # The container is known to exist, so isn't created again
+            self.assertEqual(['upload_object'], do_upload(service))
+            self.assertEqual(1, conn.put_container.call_count)
+
+            # A 404 on the object PUT forgets the container
+            conn.put_object.side_effect = ClientException(
+                'Not Found', http_status=404)
+            self.assertEqual(['upload_object'], do_upload(service))
+            conn.put_object.side_effect = None
+            self.assertEqual(['create_container', 'upload_object'],
+                             do_upload(service))
+            self.assertEqual(2, conn.put_container.call_count)
+
+            # A different policy needs the container to be created
+            do_upload(service, 'silver')
+            self.assertEqual(3, conn.put_container.call_count)
+            do_upload(service, 'silver')
+            self.assertEqual(3, conn.put_container.call_count)
+
+            # Entries expire after the TTL
+            with mock.patch('swiftclient.service.time',
+                            return_value=time.time() + 61):
+                do_upload(service, 'silver')
+            self.assertEqual(4, conn.put_container.call_count)
+
+    @mock.patch('swiftclient.service.Connection')
+    def test_upload_container_cache_disabled(self, mock_conn):
+        conn = mock_conn.return_value
+        conn.head_object.side_effect = ClientException(
+            'Not Found', http_status=404)
+        conn.put_object.return_value = md5().hexdigest()
+        with SwiftService() as service:
+            for _ in range(2):
+                list(service.upload(
+                    'c', [SwiftUploadObject(six.StringIO(''), 'o')]))
+        self.assertEqual(2, conn.put_container.call_count)
+
+    @mock.patch('swiftclient.service.Connection')
+    def test_upload_container_cache_segment_policy(self, mock_conn):
+        # A cached policy for the upload container is used for the segments
+        # container instead of a HEAD
+        conn = mock_conn.return_value
+        with SwiftService({'container_cache_ttl': 60}) as service:
+            service._cache_container('c', 'gold')
+            with mock.patch.object(service, '_upload_jobs',
+                                   return_value=iter([])):
+                results = list(service.upload(
+                    'c', [], {'segment_size': 10}))
+        self.assertEqual(['create_container'],
+                         [r['action'] for r in results])
+        self.assertEqual([], conn.head_container.mock_calls)
+        conn.put_container.assert_called_once_with(
+            'c_segments', {'X-Storage-Policy': 'gold'}, response_dict={})
+
     def test_upload_object_job_file_with_unicode_path(self):
         # Uploading a file results in the file object being wrapped in a
         # LengthWrapper. This test sets the options in such a way that much
@@ -1276,6 +1826,8 @@ class TestServiceUpload(_TestServiceBase):
                 'success': True,
                 'response_dict': {},
                 'segment_etag': md5(b'b' * 10).hexdigest(),
+                'start_time': mock.ANY,
+                'finish_time': mock.ANY,
                 'attempts': 2,
             }
 
@@ -1305,6 +1857,447 @@ class TestServiceUpload(_TestServiceBase):
             self.assertIsInstance(contents, utils.LengthWrapper)
             self.assertEqual(len(contents), 10)
 
+    def test_upload_dedup_segment_job(self):
+        with tempfile.NamedTemporaryFile() as f:
+            f.write(b'a' * 10)
+            f.write(b'b' * 10)
+            f.flush()
+
+            def _consuming_conn(*a, **kw):
+                contents = a[2]
+                contents.read()
+                return contents.get_md5sum()
+
+            seg_md5 = md5(b'b' * 10).hexdigest()
+            seg_sha = sha256(b'b' * 10).hexdigest()
+            seg_name = '_dedup/sha256/%s/10' % seg_sha
+            mock_conn = mock.Mock()
+            mock_conn.put_object.side_effect = _consuming_conn
+            type(mock_conn).attempts = mock.PropertyMock(return_value=1)
+            options = {'segment_container': None, 'checksum': True,
+                       'segment_dedup': 'sha256'}
+
+            # The segment doesn't exist yet, so it is uploaded
+            mock_conn.head_object.side_effect = ClientException(
+                'Not Found', http_status=404)
+            s = SwiftService()
+            with self.assert_open_results_are_closed():
+                r = s._upload_dedup_segment_job(
+                    mock_conn, f.name, 'test_c', 10, 10, 1, 'test_o',
+                    options)
+            self.assertTrue(r['success'])
+            self.assertNotIn('deduplicated', r)
+            self.assertEqual('/test_c_segments/' + seg_name,
+                             r['segment_location'])
+            self.assertEqual(seg_md5, r['segment_etag'])
+            mock_conn.head_object.assert_called_once_with(
+                'test_c_segments', seg_name)
+            self.assertEqual(
+                ('test_c_segments', seg_name),
+                mock_conn.put_object.call_args[0][:2])
+
+            # Once it exists, it isn't uploaded again
+            mock_conn.reset_mock()
+            mock_conn.head_object.side_effect = None
+            mock_conn.head_object.return_value = {
+                'etag': seg_md5, 'content-length': '10'}
+            with self.assert_open_results_are_closed():
+                r = s._upload_dedup_segment_job(
+                    mock_conn, f.name, 'test_c', 10, 10, 1, 'test_o',
+                    options)
+            self.assertEqual({
+                'action': 'upload_segment',
+                'for_container': 'test_c',
+                'for_object': 'test_o',
+                'segment_index': 1,
+                'segment_size': 10,
+                'segment_location': '/test_c_segments/' + seg_name,
+                'log_line': 'test_o segment 1',
+                'success': True,
+                'deduplicated': True,
+                'segment_etag': seg_md5,
+                'attempts': 1,
+            }, r)
+            self.assertEqual([], mock_conn.put_object.mock_calls)
+
+    def test_upload_object_job_dedup(self):
+        with tempfile.NamedTemporaryFile() as f:
+            f.write(b'a' * 10)
+            f.write(b'b' * 10)
+            f.flush()
+            etag_a = md5(b'a' * 10).hexdigest()
+            etag_b = md5(b'b' * 10).hexdigest()
+            dedup_a = '_dedup/md5/%s/10' % etag_a
+            dedup_b = '_dedup/md5/%s/10' % etag_b
+            old_seg = 'test_o/slo/1.000000/20/10/00000001'
+            manifest = json.dumps([
+                {'name': '/test_c_segments/' + dedup_a, 'bytes': 10,
+                 'hash': etag_a},
+                {'name': '/test_c_segments/' + old_seg, 'bytes': 10,
+                 'hash': 'x'}])
+
+            def _head(container, obj, *a, **kw):
+                if obj == 'test_o':
+                    return {'x-static-large-object': 'true',
+                            'content-length': '20'}
+                if obj == dedup_a:
+                    return {'etag': etag_a, 'content-length': '10'}
+                raise ClientException('Not Found', http_status=404)
+
+            def _put(container, obj, contents, **kw):
+                if hasattr(contents, 'read'):
+                    contents.read()
+                    return contents.get_md5sum()
+                return md5().hexdigest()
+
+            mock_conn = mock.Mock()
+            mock_conn.head_object.side_effect = _head
+            mock_conn.get_object.return_value = ({}, manifest.encode('ascii'))
+            mock_conn.put_object.side_effect = _put
+            type(mock_conn).attempts = mock.PropertyMock(return_value=1)
+
+            s = SwiftService()
+            with mock.patch('swiftclient.service.get_conn',
+                            return_value=mock_conn):
+                r = s._upload_object_job(
+                    conn=mock_conn, container='test_c', source=f.name,
+                    obj='test_o',
+                    options={'changed': False, 'skip_identical': False,
+                             'leave_segments': False, 'header': '',
+                             'meta': [], 'segment_size': 10,
+                             'segment_container': None, 'use_slo': True,
+                             'segment_dedup': 'md5', 'checksum': True,
+                             'content_chunking': False, 'resume_dir': None})
+
+            self.assertIsNone(r.get('error'))
+            self.assertIs(True, r['success'])
+            self.assertEqual(1, r['deduplicated_segments'])
+            # Only the new segment and the manifest are uploaded
+            put_names = [c[0][1] for c in mock_conn.put_object.call_args_list]
+            self.assertEqual([dedup_b, 'test_o'], put_names)
+            manifest = json.loads(mock_conn.put_object.call_args[0][2])
+            self.assertEqual(
+                ['/test_c_segments/' + dedup_a,
+                 '/test_c_segments/' + dedup_b],
+                [seg['path'] for seg in manifest])
+            # The manifest is marked, so that deleting it keeps the shared
+            # segments
+            self.assertEqual(
+                'md5', mock_conn.put_object.call_args[1]['headers'][
+                    'x-object-meta-segment-dedup'])
+            # The old segment is deleted, but shared segments never are
+            mock_conn.delete_object.assert_called_once_with(
+                b'test_c_segments', old_seg.encode('ascii'),
+                response_dict={})
+
+    def test_upload_object_job_content_chunking(self):
+        data = b''.join(md5(str(i).encode('ascii')).digest()
+                        for i in range(4096))
+        with tempfile.NamedTemporaryFile() as f:
+            f.write(data)
+            f.flush()
+
+            def _put(container, obj, contents, **kw):
+                if hasattr(contents, 'read'):
+                    contents.read()
+                    return contents.get_md5sum()
+                return md5().hexdigest()
+
+            mock_conn = mock.Mock()
+            mock_conn.head_object.side_effect = ClientException(
+                'Not Found', http_status=404)
+            mock_conn.put_object.side_effect = _put
+            mock_conn.get_capabilities.return_value = {
+                'slo': {'min_segment_size': 2048}}
+            type(mock_conn).attempts = mock.PropertyMock(return_value=1)
+
+            s = SwiftService()
+            with mock.patch('swiftclient.service.get_conn',
+                            return_value=mock_conn):
+                r = s._upload_object_job(
+                    conn=mock_conn, container='test_c', source=f.name,
+                    obj='test_o',
+                    options={'changed': False, 'skip_identical': False,
+                             'leave_segments': True, 'header': '',
+                             'meta': [], 'segment_size': 4096,
+                             'segment_container': None, 'use_slo': True,
+                             'segment_dedup': None, 'checksum': True,
+                             'content_chunking': True, 'resume_dir': None})
+
+        self.assertIsNone(r.get('error'))
+        self.assertIs(True, r['success'])
+        chunker = utils.ContentDefinedChunker(4096, 2048, 8192)
+        expected = [length for _start, length in
+                    chunker.iter_boundaries(six.BytesIO(data))]
+        manifest = json.loads(mock_conn.put_object.call_args[0][2])
+        self.assertEqual(expected,
+                         [seg['size_bytes'] for seg in manifest])
+        self.assertGreater(len(set(expected)), 1)
+        self.assertEqual(
+            [md5(data[start:start + length]).hexdigest()
+             for start, length in chunker.iter_boundaries(
+                 six.BytesIO(data))],
+            [seg['etag'] for seg in manifest])
+
+    def test_upload_stream_content_chunking(self):
+        data = b''.join(md5(str(i).encode('ascii')).digest()
+                        for i in range(4096))
+        mock_conn = mock.Mock()
+        mock_conn.head_object.side_effect = ClientException(
+            'Not Found', http_status=404)
+
+        def _put(container, obj, contents, **kw):
+            if isinstance(contents, bytes):
+                return md5(contents).hexdigest()
+
+        mock_conn.put_object.side_effect = _put
+        mock_conn.get_capabilities.return_value = {}
+        type(mock_conn).attempts = mock.PropertyMock(return_value=1)
+
+        s = SwiftService()
+        with mock.patch('swiftclient.service.get_conn',
+                        return_value=mock_conn):
+            r = s._upload_object_job(
+                conn=mock_conn, container='test_c',
+                source=six.BytesIO(data), obj='test_o',
+                options={'changed': False, 'skip_identical': False,
+                         'leave_segments': True, 'header': '',
+                         'meta': [], 'segment_size': 4096,
+                         'segment_container': None, 'use_slo': True,
+                         'segment_dedup': None, 'checksum': True,
+                         'content_chunking': True})
+
+        self.assertIsNone(r.get('error'))
+        self.assertIs(True, r['success'])
+        expected = list(utils.ContentDefinedChunker(4096).iter_chunks(
+            six.BytesIO(data)))
+        segment_puts = mock_conn.put_object.call_args_list[:-1]
+        self.assertEqual(expected, [c[0][2] for c in segment_puts])
+        manifest = json.loads(mock_conn.put_object.call_args[0][2])
+        self.assertEqual([len(c) for c in expected],
+                         [seg['size_bytes'] for seg in manifest])
+
+    def test_upload_dedup_requires_slo(self):
+        s = SwiftService()
+        with self.assertRaises(SwiftError) as cm:
+            list(s.upload('c', ['f'], {'segment_dedup': 'md5',
+                                       'segment_size': 10}))
+        self.assertIn('use_slo', cm.exception.value)
+        with self.assertRaises(SwiftError):
+            list(s.upload('c', ['f'], {'segment_dedup': 'crc32',
+                                       'use_slo': True}))
+
+    def test_auto_segment_size(self):
+        s = SwiftService()
+        mib = 2 ** 20
+        s._segment_limits = (0, 0, 0)
+        opts = {'segment_threads': 10, 'use_slo': True}
+        # Small objects aren't segmented
+        self.assertEqual(16 * mib, s._auto_segment_size(mib, opts))
+        # Larger ones are split between the segment threads
+        self.assertEqual(100 * mib, s._auto_segment_size(1000 * mib, opts))
+        self.assertEqual(
+            100 * mib, s._auto_segment_size(1000 * mib - 9, opts))
+        # ...in as few rounds as max_file_size allows
+        s._segment_limits = (0, 200 * mib, 0)
+        self.assertEqual(
+            150 * mib, s._auto_segment_size(3000 * mib, opts))
+        # Fewer, larger segments are used rather than too many for an SLO
+        s._segment_limits = (0, 10000 * mib, 4)
+        self.assertEqual(
+            500 * mib, s._auto_segment_size(2000 * mib, opts))
+        self.assertEqual(
+            200 * mib, s._auto_segment_size(
+                2000 * mib, dict(opts, use_slo=False)))
+        # The cluster's min_segment_size is respected
+        s._segment_limits = (32 * mib, 0, 0)
+        self.assertEqual(32 * mib, s._auto_segment_size(100 * mib, opts))
+        # Streams have no size to go on
+        self.assertEqual(32 * mib, s._auto_segment_size(None, opts))
+        # Segments take long enough to upload at the measured rate
+        s._segment_limits = (0, 0, 0)
+        s._record_segment_throughput({
+            'segment_size': 10 * mib, 'start_time': 0, 'finish_time': 1})
+        self.assertEqual(
+            50 * mib, s._auto_segment_size(100 * mib, opts))
+
+    def test_upload_object_job_auto_segment_size(self):
+        with tempfile.NamedTemporaryFile() as f:
+            f.write(b'a' * 30)
+            f.flush()
+
+            def _put(container, obj, contents, **kw):
+                if hasattr(contents, 'read'):
+                    contents.read()
+                    return contents.get_md5sum()
+                return md5().hexdigest()
+
+            mock_conn = mock.Mock()
+            mock_conn.head_object.side_effect = ClientException(
+                'Not Found', http_status=404)
+            mock_conn.put_object.side_effect = _put
+            type(mock_conn).attempts = mock.PropertyMock(return_value=1)
+
+            s = SwiftService()
+            options = {'changed': False, 'skip_identical': False,
+                       'leave_segments': True, 'header': '', 'meta': [],
+                       'segment_size': 'auto', 'segment_container': None,
+                       'use_slo': False, 'segment_dedup': None,
+                       'checksum': True, 'content_chunking': False,
+                       'resume_dir': None, 'segment_threads': 3}
+            with mock.patch.object(s, '_get_segment_limits',
+                                   return_value=(0, 0, 0)), \
+                    mock.patch('swiftclient.service.AUTO_SEGMENT_MIN_SIZE',
+                               1), \
+                    mock.patch('swiftclient.service.get_conn',
+                               return_value=mock_conn):
+                r = s._upload_object_job(
+                    conn=mock_conn, container='test_c', source=f.name,
+                    obj='test_o', options=options)
+
+        self.assertIsNone(r.get('error'))
+        self.assertIs(True, r['success'])
+        self.assertEqual(
+            [10, 10, 10],
+            [seg['segment_size'] for seg in r['segment_results']])
+        self.assertTrue(r['headers']['x-object-manifest'].endswith(
+            '/30/10/'))
+        self.assertIsNotNone(s._segment_throughput)
+
+    def test_upload_nested_slo_manifest(self):
+        mock_conn = mock.Mock()
+        s = SwiftService()
+        s._segment_limits = (0, 0, 2)
+        segments = [{'segment_index': i, 'segment_size': 10,
+                     'segment_etag': md5(str(i).encode('ascii')).hexdigest(),
+                     'segment_location': '/test_c_segments/seg/%d' % i}
+                    for i in range(5)]
+        _response, sub_manifests = s._upload_nested_slo_manifest(
+            mock_conn, list(segments), 'test_c', 'test_o', {},
+            'test_c_segments', 'test_o/slo/manifest/')
+
+        self.assertEqual([
+            '/test_c_segments/test_o/slo/manifest/0/00000000',
+            '/test_c_segments/test_o/slo/manifest/0/00000001',
+            '/test_c_segments/test_o/slo/manifest/1/00000000',
+        ], sub_manifests)
+        manifests = dict(
+            (c[0][1], json.loads(c[0][2]))
+            for c in mock_conn.put_object.call_args_list)
+        self.assertEqual(
+            [seg['segment_location'] for seg in segments[2:4]],
+            [seg['path'] for seg in
+             manifests['test_o/slo/manifest/0/00000001']])
+        self.assertEqual([{
+            'path': '/test_c_segments/test_o/slo/manifest/1/00000000',
+            # A manifest's etag is the md5 of its segments' etags
+            'etag': md5(''.join(
+                md5(''.join(seg['segment_etag'] for seg in pair).encode(
+                    'ascii')).hexdigest()
+                for pair in (segments[0:2], segments[2:4])
+            ).encode('ascii')).hexdigest(),
+            'size_bytes': 40,
+        }, {
+            # A group of one segment isn't put in a sub-manifest
+            'path': segments[4]['segment_location'],
+            'etag': segments[4]['segment_etag'],
+            'size_bytes': 10,
+        }], manifests['test_o'])
+
+    def test_segment_journal(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        upload = {'path': '/tmp/f', 'size': 20, 'mtime': '1.000000'}
+        journal = swiftclient.service._SegmentJournal(tmpdir, upload)
+        self.assertEqual({}, journal.load())
+        journal.record(10, {'segment_index': 1, 'segment_size': 10,
+                            'segment_location': '/c_segments/o/1',
+                            'segment_etag': 'abc'})
+        journal.close()
+
+        journal = swiftclient.service._SegmentJournal(tmpdir, upload)
+        self.assertEqual({1: {'segment_index': 1, 'segment_start': 10,
+                              'segment_size': 10,
+                              'segment_location': '/c_segments/o/1',
+                              'segment_etag': 'abc'}}, journal.load())
+        # A partly written last line is ignored
+        with open(journal.path, 'a') as fp:
+            fp.write('{"segment_index": 0, "segm')
+        self.assertEqual([1], list(journal.load()))
+
+        # A journal for a changed file isn't used, and is replaced
+        changed = swiftclient.service._SegmentJournal(
+            tmpdir, dict(upload, mtime='2.000000'))
+        self.assertEqual({}, changed.load())
+        journal.remove()
+        self.assertEqual([], os.listdir(tmpdir))
+
+    def test_upload_object_job_resume(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        with tempfile.NamedTemporaryFile() as f:
+            f.write(b'a' * 10 + b'b' * 10 + b'c' * 10)
+            f.flush()
+            options = {'changed': False, 'skip_identical': False,
+                       'leave_segments': False, 'header': '',
+                       'meta': [], 'segment_size': 10,
+                       'segment_container': None, 'use_slo': False,
+                       'segment_dedup': None, 'checksum': True,
+                       'content_chunking': False, 'resume_dir': tmpdir}
+            stored = {}
+
+            def _put(container, obj, contents, **kw):
+                if hasattr(contents, 'read'):
+                    data = contents.read()
+                    if data == b'c' * 10 and not stored.get('fail_done'):
+                        # Interrupt the first upload at the last segment
+                        stored['fail_done'] = True
+                        raise ClientException('Server Error',
+                                              http_status=500)
+                    stored[obj] = contents.get_md5sum()
+                    return stored[obj]
+                return md5().hexdigest()
+
+            def _listing(container, prefix=None, **kw):
+                return {}, [{'name': name, 'hash': etag, 'bytes': 10}
+                            for name, etag in sorted(stored.items())
+                            if name.startswith(prefix)]
+
+            mock_conn = mock.Mock()
+            mock_conn.head_object.side_effect = ClientException(
+                'Not Found', http_status=404)
+            mock_conn.put_object.side_effect = _put
+            mock_conn.get_container.side_effect = _listing
+            type(mock_conn).attempts = mock.PropertyMock(return_value=1)
+
+            s = SwiftService()
+            with mock.patch('swiftclient.service.get_conn',
+                            return_value=mock_conn):
+                r = s._upload_object_job(
+                    conn=mock_conn, container='test_c', source=f.name,
+                    obj='test_o', options=options)
+                self.assertIs(False, r['success'])
+                self.assertEqual(1, len(os.listdir(tmpdir)))
+
+                mock_conn.put_object.reset_mock()
+                r = s._upload_object_job(
+                    conn=mock_conn, container='test_c', source=f.name,
+                    obj='test_o', options=options)
+
+        self.assertIsNone(r.get('error'))
+        self.assertIs(True, r['success'])
+        self.assertEqual(2, r['resumed_segments'])
+        self.assertEqual(
+            [0, 1, 2], sorted(seg['segment_index']
+                              for seg in r['segment_results']))
+        # Only the last segment and the manifest are uploaded again
+        put_names = [c[0][1] for c in mock_conn.put_object.call_args_list]
+        self.assertEqual(2, len(put_names))
+        self.assertTrue(put_names[0].endswith('/30/10/00000002'))
+        self.assertEqual('test_o', put_names[1])
+        # The journal is removed once the upload is complete
+        self.assertEqual([], os.listdir(tmpdir))
+
     def test_upload_stream_segment(self):
         common_params = {
             'segment_container': 'segments',
@@ -1383,6 +2376,29 @@ class TestServiceUpload(_TestServiceBase):
              'expected': {
                 'complete': False,
                 'segment_etag': md5(b'A' * 1024).hexdigest()}},
+            # A whole segment that is known to be the last one
+            {'test_params': {
+                'segment_size': 1024,
+                'segment_index': 2,
+                'content_size': 1024,
+                'last': True},
+             'put_object_args': {
+                'container': 'segments',
+                'object': 'test_stream_2'},
+             'expected': {
+                'complete': True,
+                'segment_etag': md5(b'A' * 1024).hexdigest()}},
+            {'test_params': {
+                'segment_size': 1024,
+                'segment_index': 0,
+                'content_size': 1024,
+                'last': True},
+             'put_object_args': {
+                'container': 'test_stream',
+                'object': 'stream_object'},
+             'expected': {
+                'complete': True,
+                'segment_etag': md5(b'A' * 1024).hexdigest()}},
         ]
 
         for test_args in tests:
@@ -1409,7 +2425,8 @@ class TestServiceUpload(_TestServiceBase):
                 segment_size=segment_size,
                 segment_index=segment_index,
                 headers={},
-                fd=stream)
+                fd=stream,
+                last=params.get('last', False))
             expected_args = test_args['expected']
             put_args = test_args['put_object_args']
             expected_response = {
@@ -1580,6 +2597,126 @@ class TestServiceUpload(_TestServiceBase):
             self.assertIsInstance(contents, utils.LengthWrapper)
             self.assertEqual(len(contents), 30)
 
+    def test_upload_object_job_compress(self):
+        data = b'compressible ' * 1000
+        uploaded = []
+
+        def _consuming_conn(*a, **kw):
+            compressed = b''.join(a[2])
+            uploaded.append(compressed)
+            return md5(compressed).hexdigest()
+
+        mock_conn = mock.Mock()
+        mock_conn.put_object.side_effect = _consuming_conn
+        type(mock_conn).attempts = mock.PropertyMock(return_value=2)
+        s = SwiftService()
+        opts = dict(s._options, compress='gzip', leave_segments=True)
+        with tempfile.NamedTemporaryFile() as f:
+            f.write(data)
+            f.flush()
+            with self.assert_open_results_are_closed():
+                r = s._upload_object_job(
+                    conn=mock_conn, container='test_c', source=f.name,
+                    obj='test_o', options=opts)
+        self.assertIsNone(r.get('error'))
+        self.assertIs(True, r['success'])
+        mock_conn.put_object.assert_called_once_with(
+            'test_c', 'test_o', mock.ANY, content_length=None,
+            headers={'x-object-meta-compression': 'gzip',
+                     'x-object-meta-uncompressed-size': str(len(data)),
+                     'x-object-meta-uncompressed-md5': md5(data).hexdigest(),
+                     'x-object-meta-mtime': mock.ANY},
+            response_dict={})
+        self.assertIsInstance(mock_conn.put_object.call_args[0][2],
+                              utils.CompressingIterable)
+        decompressor = utils.Decompressor('gzip')
+        self.assertEqual(data, decompressor.decompress(uploaded[0]))
+
+        # The etag returned is checked against the compressed data
+        mock_conn.put_object.side_effect = None
+        mock_conn.put_object.return_value = md5(data).hexdigest()
+        r = s._upload_object_job(
+            conn=mock_conn, container='test_c', source=BytesIO(data),
+            obj='test_o', options=opts)
+        self.assertIs(False, r['success'])
+        self.assertIn('md5 mismatch', str(r['error']))
+
+    def test_upload_object_job_compress_skip_identical(self):
+        data = b'compressible ' * 1000
+        compressed = b''.join(
+            utils.CompressingIterable(BytesIO(data), 'gzip'))
+        mock_conn = mock.Mock()
+        mock_conn.head_object.return_value = {
+            'content-length': str(len(compressed)),
+            'etag': md5(compressed).hexdigest(),
+            'x-object-meta-compression': 'gzip',
+            'x-object-meta-uncompressed-size': str(len(data)),
+            'x-object-meta-uncompressed-md5': md5(data).hexdigest()}
+        s = SwiftService()
+        opts = dict(s._options, compress='gzip', skip_identical=True)
+        with tempfile.NamedTemporaryFile() as f:
+            f.write(data)
+            f.flush()
+            r = s._upload_object_job(
+                conn=mock_conn, container='test_c', source=f.name,
+                obj='test_o', options=opts)
+            self.assertEqual('skipped-identical', r.get('status'))
+            self.assertEqual([], mock_conn.put_object.mock_calls)
+
+            # An object compressed without recording its md5 is uploaded
+            # again
+            del mock_conn.head_object.return_value[
+                'x-object-meta-uncompressed-md5']
+            mock_conn.put_object.return_value = None
+            r = s._upload_object_job(
+                conn=mock_conn, container='test_c', source=f.name,
+                obj='test_o', options=opts)
+            self.assertIs(True, r['success'])
+            self.assertEqual('uploaded', r['status'])
+            self.assertEqual(1, mock_conn.put_object.call_count)
+
+    def test_upload_object_job_compress_changed(self):
+        data = b'compressible ' * 1000
+        compressed = b''.join(
+            utils.CompressingIterable(BytesIO(data), 'gzip'))
+        mock_conn = mock.Mock()
+        mock_conn.put_object.return_value = None
+        s = SwiftService()
+        opts = dict(s._options, compress='gzip', changed=True)
+        with tempfile.NamedTemporaryFile() as f:
+            f.write(data)
+            f.flush()
+            mock_conn.head_object.return_value = {
+                'content-length': str(len(compressed)),
+                'x-object-meta-mtime': '%f' % os.stat(f.name).st_mtime,
+                'x-object-meta-compression': 'gzip',
+                'x-object-meta-uncompressed-size': str(len(data))}
+            r = s._upload_object_job(
+                conn=mock_conn, container='test_c', source=f.name,
+                obj='test_o', options=opts)
+            self.assertEqual('skipped-changed', r.get('status'))
+            self.assertEqual([], mock_conn.put_object.mock_calls)
+
+            # The compressed size is never compared with the file's
+            del mock_conn.head_object.return_value[
+                'x-object-meta-uncompressed-size']
+            r = s._upload_object_job(
+                conn=mock_conn, container='test_c', source=f.name,
+                obj='test_o', options=opts)
+            self.assertIs(True, r['success'])
+            self.assertEqual('uploaded', r['status'])
+            self.assertEqual(1, mock_conn.put_object.call_count)
+
+    def test_upload_with_bad_compress(self):
+        for bad, msg in (('lz4', 'compress should be one of: gzip, zstd'),
+                         ('zstd', 'The zstandard package is needed for '
+                                  'zstd compression')):
+            with mock.patch.object(utils, 'zstandard', None):
+                service = SwiftService({'compress': bad})
+                with self.assertRaises(SwiftError) as cm:
+                    next(service.upload('c', 'o'))
+            self.assertEqual(msg, cm.exception.value)
+
     @mock.patch('swiftclient.service.time', return_value=1400000000)
     def test_upload_object_job_stream(self, time_mock):
         # Streams are wrapped as ReadableToIterable
@@ -1837,8 +2974,8 @@ class TestServiceUpload(_TestServiceBase):
         s = SwiftService()
         with mock.patch('swiftclient.service.get_conn',
                         return_value=mock_conn):
-            with mock.patch('swiftclient.service.getmtime',
-                            return_value=1.234):
+            with mock.patch('swiftclient.service.stat',
+                            return_value=Mock(st_mtime=1.234)):
                 r = s._create_dir_marker_job(conn=mock_conn,
                                              container='test_c',
                                              obj='test_o',
@@ -1989,6 +3126,81 @@ class TestServiceDownload(_TestServiceBase):
     def _readbody(self):
         yield self.obj_content
 
+    def test_download_account_lists_containers_concurrently(self):
+        listings = {
+            'c1': {'': ['o1', 'o2'], 'o2': []},
+            'c2': {'': ['o3'], 'o3': []},
+        }
+        c2_listed = threading.Event()
+
+        def download_job(conn, container, obj, options):
+            if container == 'c1':
+                # Downloads from c1 are only able to finish once c2's
+                # listing has started
+                self.assertTrue(c2_listed.wait(5))
+            return {'container': container, 'object': obj, 'success': True}
+
+        def fake_get_container(container, marker='', **kwargs):
+            if container == 'c2':
+                c2_listed.set()
+            return None, [{'name': name} for name in
+                          listings[container].get(marker, [])]
+
+        conn = self._get_mock_connection()
+        conn.get_container.side_effect = fake_get_container
+        account_page = {
+            'success': True,
+            'listing': [{'name': 'c1'}, {'name': 'c2'}],
+        }
+        opts = dict(self.opts, yes_all=True, shuffle=False,
+                    container_threads=2, object_dd_threads=2)
+        with mock.patch('swiftclient.service.get_conn', return_value=conn), \
+                mock.patch.object(SwiftService, 'list',
+                                  return_value=iter([account_page])), \
+                mock.patch.object(SwiftService, '_download_object_job',
+                                  side_effect=download_job):
+            with SwiftService() as swift:
+                results = list(swift.download(options=opts))
+
+        self.assertEqual(
+            [('c1', 'o1'), ('c1', 'o2'), ('c2', 'o3')],
+            sorted((r['container'], r['object']) for r in results))
+        self.assertTrue(all(r['success'] for r in results))
+        self.assertEqual(4, conn.get_container.call_count)
+        conn.get_container.assert_any_call(
+            'c1', marker='o2', prefix=None, delimiter=None, headers={})
+
+    def test_download_account_missing_container(self):
+        def fake_get_container(container, marker='', **kwargs):
+            if container == 'c1':
+                raise ClientException('Not Found', http_status=404)
+            return None, [{'name': 'o1'}] if not marker else []
+
+        def download_job(conn, container, obj, options):
+            return {'container': container, 'object': obj, 'success': True}
+
+        conn = self._get_mock_connection()
+        conn.get_container.side_effect = fake_get_container
+        account_page = {
+            'success': True,
+            'listing': [{'name': 'c1'}, {'name': 'c2'}],
+        }
+        opts = dict(self.opts, yes_all=True, shuffle=False)
+        results = []
+        with mock.patch('swiftclient.service.get_conn', return_value=conn), \
+                mock.patch.object(SwiftService, 'list',
+                                  return_value=iter([account_page])), \
+                mock.patch.object(SwiftService, '_download_object_job',
+                                  side_effect=download_job):
+            with SwiftService() as swift:
+                with self.assertRaises(SwiftError) as exc_context:
+                    for r in swift.download(options=opts):
+                        results.append(r)
+        self.assertEqual("Container 'c1' not found",
+                         exc_context.exception.value)
+        # Downloads that were already under way were allowed to finish
+        self.assertTrue(all(r['container'] == 'c2' for r in results))
+
     @mock.patch('swiftclient.service.SwiftService.list')
     @mock.patch('swiftclient.service.SwiftService._submit_page_downloads')
     @mock.patch('swiftclient.service.interruptable_as_completed')
@@ -2314,6 +3526,223 @@ class TestServiceDownload(_TestServiceBase):
         )
         self.assertEqual(expected_r, actual_r)
 
+    def test_download_object_job_resume(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        content = b'0123456789'
+        etag = md5(content).hexdigest()
+        path = os.path.join(tmpdir, 'test_o')
+
+        def _interrupted_body():
+            yield content[:4]
+            raise Exception('Connection dropped')
+
+        mock_conn = self._get_mock_connection()
+        mock_conn.get_object.side_effect = [
+            ({'content-length': '10', 'etag': etag}, _interrupted_body()),
+            ({'content-length': '6', 'etag': etag,
+              'content-range': 'bytes 4-9/10'}, iter([content[4:]])),
+        ]
+        opts = dict(self.opts, no_download=False, out_directory=tmpdir,
+                    resume_download=True)
+        s = SwiftService()
+        r = s._download_object_job(mock_conn, 'test_c', 'test_o', opts)
+        self.assertIs(False, r['success'])
+        self.assertFalse(os.path.exists(path))
+        with open(path + '.part', 'rb') as fp:
+            self.assertEqual(content[:4], fp.read())
+        with open(path + '.part.json') as fp:
+            self.assertEqual(
+                {'etag': etag, 'content_length': 10, 'offset': 4},
+                json.load(fp))
+
+        r = s._download_object_job(mock_conn, 'test_c', 'test_o', opts)
+        self.assertIsNone(r.get('error'))
+        self.assertIs(True, r['success'])
+        self.assertEqual(4, r['resumed_from'])
+        self.assertEqual(10, r['read_length'])
+        self.assertEqual(
+            {'Range': 'bytes=4-', 'If-Match': etag},
+            mock_conn.get_object.call_args[1]['headers'])
+        with open(path, 'rb') as fp:
+            self.assertEqual(content, fp.read())
+        self.assertEqual(['test_o'], os.listdir(tmpdir))
+
+    def test_download_object_job_disk_writer(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        content = b'0123456789' * 1000
+        mock_conn = self._get_mock_connection()
+        mock_conn.get_object.side_effect = lambda *a, **kw: (
+            {'content-length': str(len(content)),
+             'etag': md5(content).hexdigest(),
+             'x-object-meta-mtime': '1500000000'},
+            BytesIO(content))
+        opts = dict(self.opts, no_download=False, out_directory=tmpdir,
+                    fadvise=True)
+        s = SwiftService()
+
+        with mock.patch('swiftclient.service.PREALLOCATE_MIN_SIZE', 100), \
+                mock.patch('swiftclient.service.DISK_BUFFER', 1000), \
+                mock.patch('swiftclient.service.mkdirs',
+                           side_effect=swiftclient.service.mkdirs) as mkdirs, \
+                mock.patch('os.posix_fallocate', create=True) as fallocate, \
+                mock.patch('os.posix_fadvise', create=True) as fadvise:
+            for obj in ('d/o1', 'd/o2'):
+                r = s._download_object_job(mock_conn, 'test_c', obj, opts)
+                self.assertIsNone(r.get('error'))
+                self.assertIs(True, r['success'])
+
+        # The directory was only created once
+        mkdirs.assert_called_once_with(os.path.join(tmpdir, 'd'))
+        for obj in ('o1', 'o2'):
+            path = os.path.join(tmpdir, 'd', obj)
+            with open(path, 'rb') as fp:
+                self.assertEqual(content, fp.read())
+            self.assertEqual(1500000000, os.stat(path).st_mtime)
+        self.assertEqual([mock.call(mock.ANY, 0, len(content))] * 2,
+                         fallocate.mock_calls)
+        self.assertEqual(4, len(fadvise.mock_calls))
+
+        # Without preallocate, nothing is reserved
+        with mock.patch('swiftclient.service.PREALLOCATE_MIN_SIZE', 100), \
+                mock.patch('os.posix_fallocate', create=True) as fallocate:
+            opts['preallocate'] = False
+            r = s._download_object_job(mock_conn, 'test_c', 'd/o3', opts)
+            self.assertIs(True, r['success'])
+        self.assertFalse(fallocate.called)
+
+    @unittest.skipUnless(hasattr(os, 'posix_fallocate'),
+                         'posix_fallocate is not available')
+    def test_download_object_job_preallocated_failure(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        content = b'0123456789' * 100
+
+        def _body():
+            yield content[:600]
+            raise ClientException('Connection reset by peer')
+
+        mock_conn = self._get_mock_connection()
+        mock_conn.get_object.side_effect = lambda *a, **kw: (
+            {'content-length': str(len(content)),
+             'etag': md5(content).hexdigest()},
+            _body())
+        s = SwiftService()
+        with mock.patch('swiftclient.service.PREALLOCATE_MIN_SIZE', 100):
+            for resume in (False, True):
+                opts = dict(self.opts, no_download=False,
+                            out_directory=tmpdir, resume_download=resume)
+                r = s._download_object_job(mock_conn, 'test_c', 'test_o',
+                                           opts)
+                self.assertIs(False, r['success'])
+                self.assertEqual('Connection reset by peer', str(r['error']))
+                # Only the bytes that were downloaded are left on disk
+                name = 'test_o.part' if resume else 'test_o'
+                with open(os.path.join(tmpdir, name), 'rb') as fp:
+                    self.assertEqual(content[:600], fp.read())
+
+    def test_download_object_job_write_error(self):
+        mock_conn = self._get_mock_connection()
+        mock_conn.get_object.return_value = (
+            {'content-length': '10'}, BytesIO(b'0123456789'))
+        opts = dict(self.opts, no_download=False)
+        written_content = Mock()
+        written_content.write.side_effect = IOError('No space left')
+        with mock.patch.object(builtins, 'open',
+                               return_value=written_content):
+            s = SwiftService()
+            r = s._download_object_job(mock_conn, 'test_c', 'test_o', opts)
+        self.assertIs(False, r['success'])
+        self.assertEqual('No space left', str(r['error']))
+        written_content.close.assert_called_once_with()
+
+    def test_download_object_job_resume_changed(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        content = b'0123456789'
+        etag = md5(content).hexdigest()
+        path = os.path.join(tmpdir, 'test_o')
+        with open(path + '.part', 'wb') as fp:
+            fp.write(b'abcd')
+        with open(path + '.part.json', 'w') as fp:
+            json.dump({'etag': 'old', 'content_length': 10, 'offset': 4}, fp)
+
+        get_headers = []
+
+        def _get_object(container, obj, headers=None, **kwargs):
+            get_headers.append(dict(headers))
+            if 'If-Match' in headers:
+                raise ClientException('Precondition Failed', http_status=412)
+            return {'content-length': '10', 'etag': etag}, iter([content])
+
+        mock_conn = self._get_mock_connection()
+        mock_conn.get_object.side_effect = _get_object
+        opts = dict(self.opts, no_download=False, out_directory=tmpdir,
+                    resume_download=True)
+        r = SwiftService()._download_object_job(
+            mock_conn, 'test_c', 'test_o', opts)
+        self.assertIsNone(r.get('error'))
+        self.assertIs(True, r['success'])
+        self.assertNotIn('resumed_from', r)
+        self.assertEqual([{'Range': 'bytes=4-', 'If-Match': 'old'}, {}],
+                         get_headers)
+        with open(path, 'rb') as fp:
+            self.assertEqual(content, fp.read())
+        self.assertEqual(['test_o'], os.listdir(tmpdir))
+
+    def test_download_object_job_decompress(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        content = b'0123456789' * 100
+        compressed = b''.join(utils.CompressingIterable(
+            BytesIO(content), 'gzip'))
+        etag = md5(compressed).hexdigest()
+        path = os.path.join(tmpdir, 'test_o')
+        # A partial download can't be resumed from, as it was decompressed
+        with open(path + '.part', 'wb') as fp:
+            fp.write(content[:4])
+        with open(path + '.part.json', 'w') as fp:
+            json.dump({'etag': etag, 'content_length': len(compressed),
+                       'offset': 4}, fp)
+
+        get_headers = []
+
+        def _get_object(container, obj, headers=None, **kwargs):
+            get_headers.append(dict(headers))
+            obj_headers = {'content-length': str(len(compressed)),
+                           'etag': etag, 'x-object-meta-compression': 'gzip'}
+            if 'Range' in headers:
+                obj_headers.update({
+                    'content-length': str(len(compressed) - 4),
+                    'content-range': 'bytes 4-%d/%d' % (
+                        len(compressed) - 1, len(compressed))})
+                return obj_headers, iter([compressed[4:]])
+            return obj_headers, iter([compressed])
+
+        mock_conn = self._get_mock_connection()
+        mock_conn.get_object.side_effect = _get_object
+        opts = dict(self.opts, no_download=False, out_directory=tmpdir,
+                    resume_download=True)
+        s = SwiftService()
+        r = s._download_object_job(mock_conn, 'test_c', 'test_o', opts)
+        self.assertIsNone(r.get('error'))
+        self.assertIs(True, r['success'])
+        self.assertNotIn('resumed_from', r)
+        self.assertEqual(len(compressed), r['read_length'])
+        self.assertEqual([{'Range': 'bytes=4-', 'If-Match': etag}, {}],
+                         get_headers)
+        with open(path, 'rb') as fp:
+            self.assertEqual(content, fp.read())
+        self.assertEqual(['test_o'], os.listdir(tmpdir))
+
+        # It can be left compressed
+        opts['decompress'] = False
+        r = s._download_object_job(mock_conn, 'test_c', 'test_o', opts)
+        self.assertIs(True, r['success'])
+        with open(path, 'rb') as fp:
+            self.assertEqual(compressed, fp.read())
+
     def test_download(self):
         with mock.patch('swiftclient.service.Connection') as mock_conn:
             header = {'content-length': self.obj_len,
@@ -2793,6 +4222,312 @@ class TestServiceDownload(_TestServiceBase):
                           response_dict={})])
 
 
+class TestServiceDownloadArchive(_TestServiceBase):
+
+    def setUp(self):
+        super(TestServiceDownloadArchive, self).setUp()
+        self.opts = dict(swiftclient.service._default_local_options,
+                         object_dd_threads=2)
+        self.objects = {
+            'a': ({'x-object-meta-mtime': '1400000000.5'}, [b'aaa', b'aa']),
+            'b': ({'last-modified': 'Tue, 13 May 2014 16:53:20 GMT'},
+                  [b'bbbb']),
+            'dir': ({'content-type': 'application/directory'}, []),
+            'pre/c': ({}, [b'c' * 3]),
+        }
+
+    def _get_object(self, container, obj, **kwargs):
+        if obj not in self.objects:
+            raise ClientException('Not Found', http_status=404)
+        obj_headers, chunks = self.objects[obj]
+        body = b''.join(chunks)
+        headers = {'etag': md5(body).hexdigest(),
+                   'content-length': str(len(body))}
+        headers.update(obj_headers)
+        return dict((k, v) for k, v in headers.items() if v is not None), \
+            iter(chunks)
+
+    def _download_archive(self, objects, **opts):
+        conn = self._get_mock_connection()
+        conn.get_object.side_effect = self._get_object
+        out = BytesIO()
+        with mock.patch('swiftclient.service.get_conn', return_value=conn):
+            with SwiftService() as swift:
+                results = list(swift.download_archive(
+                    'test_c', out, objects, dict(self.opts, **opts)))
+        return results, out.getvalue()
+
+    def _members(self, archive):
+        with tarfile.open(fileobj=BytesIO(archive), mode='r|') as tar:
+            return [(info, tar.extractfile(info).read()
+                     if info.isreg() else None)
+                    for info in tar]
+
+    def test_download_archive(self):
+        results, archive = self._download_archive(['a', 'b', 'dir', 'pre/c'])
+
+        self.assertEqual(['a', 'b', 'dir', 'pre/c'],
+                         [r['object'] for r in results])
+        self.assertTrue(all(r['success'] for r in results))
+        self.assertEqual([False, False, True, False],
+                         [r['pseudodir'] for r in results])
+        self.assertEqual([5, 4, 0, 3], [r['read_length'] for r in results])
+
+        members = self._members(archive)
+        self.assertEqual(['a', 'b', 'dir', 'pre/c'],
+                         [info.name for info, _ in members])
+        self.assertEqual([b'aaaaa', b'bbbb', None, b'ccc'],
+                         [data for _, data in members])
+        self.assertEqual(1400000000.5, members[0][0].mtime)
+        self.assertEqual(1400000000, members[1][0].mtime)
+        self.assertTrue(members[2][0].isdir())
+
+    def test_download_archive_decompress(self):
+        compressed = b''.join(utils.CompressingIterable(
+            BytesIO(b'zzz' * 100), 'gzip'))
+        self.objects['z'] = ({'x-object-meta-compression': 'gzip'},
+                             [compressed])
+        results, archive = self._download_archive(['a', 'z'])
+        self.assertTrue(all(r['success'] for r in results))
+        self.assertEqual([(b'a', b'aaaaa'), (b'z', b'zzz' * 100)], [
+            (info.name.encode(), data) for info, data in
+            self._members(archive)])
+
+        results, archive = self._download_archive(['z'], decompress=False)
+        self.assertEqual([compressed], [
+            data for _, data in self._members(archive)])
+
+    def test_download_archive_ignore_mtime(self):
+        with mock.patch('swiftclient.service.time', return_value=1234):
+            _, archive = self._download_archive(['a'], ignore_mtime=True)
+        self.assertEqual(1234, self._members(archive)[0][0].mtime)
+
+    def test_download_iter_object_names(self):
+        pages = [{'success': True,
+                  'listing': [{'name': 'pre/c'}, {'subdir': 'pre/d/'}]}]
+        with mock.patch.object(SwiftService, 'list',
+                               return_value=iter(pages)) as mock_list:
+            results, archive = self._download_archive(
+                None, prefix='pre/', remove_prefix=True)
+        self.assertEqual('test_c', mock_list.call_args[1]['container'])
+        self.assertEqual(['c'], [r['path'] for r in results])
+        self.assertEqual([('c', b'ccc')],
+                         [(i.name, d) for i, d in self._members(archive)])
+
+    def test_download_archive_missing_container(self):
+        pages = [{'success': False,
+                  'error': ClientException('Not Found', http_status=404)}]
+        with mock.patch.object(SwiftService, 'list',
+                               return_value=iter(pages)):
+            with self.assertRaises(SwiftError) as cm:
+                self._download_archive(None)
+        self.assertEqual("Container 'test_c' not found", cm.exception.value)
+
+    def test_download_archive_missing_object(self):
+        results, archive = self._download_archive(['a', 'missing', 'b'])
+        self.assertEqual([True, False, True],
+                         [r['success'] for r in results])
+        self.assertEqual(404, results[1]['error'].http_status)
+        self.assertEqual(['a', 'b'],
+                         [i.name for i, _ in self._members(archive)])
+
+    def test_download_archive_bad_checksum(self):
+        self.objects['a'] = ({'etag': 'bad'}, [b'aaa'])
+        results, archive = self._download_archive(['a', 'b'])
+        self.assertEqual([False, True], [r['success'] for r in results])
+        self.assertIn('md5sum != etag', str(results[0]['error']))
+        # The whole object was written before its checksum was checked
+        self.assertEqual([('a', b'aaa'), ('b', b'bbbb')],
+                         [(i.name, d) for i, d in self._members(archive)])
+
+    def test_download_archive_short_body(self):
+        self.objects['a'] = ({'content-length': '10'}, [b'aaa'])
+        results, archive = self._download_archive(['a', 'b'])
+        # The archive can't be continued after a partial member
+        self.assertEqual(['a'], [r['object'] for r in results])
+        self.assertFalse(results[0]['success'])
+        self.assertIn('read_length != content_length',
+                      str(results[0]['error']))
+
+    def test_download_archive_no_content_length(self):
+        self.objects['a'] = ({'content-length': None}, [b'aaa', b'aa'])
+        results, archive = self._download_archive(['a'])
+        self.assertTrue(results[0]['success'])
+        self.assertEqual([('a', b'aaaaa')],
+                         [(i.name, d) for i, d in self._members(archive)])
+
+    def test_download_archive_bounded_read_ahead(self):
+        yielded = []
+        b_blocked = threading.Event()
+
+        def b_body():
+            for i in range(10):
+                yielded.append(i)
+                if i == 1:
+                    b_blocked.set()
+                yield b'b'
+
+        get_object = self._get_object
+
+        def slow_get_object(container, obj, **kwargs):
+            if obj == 'a':
+                self.assertTrue(b_blocked.wait(5))
+                # Give b the chance to read further ahead, if it could;
+                # its headers and first chunk fill the queue
+                sleep(0.2)
+                self.assertEqual([0, 1], yielded)
+            if obj == 'b':
+                headers, _ = get_object(container, obj, **kwargs)
+                headers.update({'etag': md5(b'b' * 10).hexdigest(),
+                                'content-length': '10'})
+                return headers, b_body()
+            return get_object(container, obj, **kwargs)
+
+        self._get_object = slow_get_object
+        with mock.patch('swiftclient.service.QUEUED_CHUNKS', 2):
+            results, archive = self._download_archive(['a', 'b'])
+        self.assertEqual([True, True], [r['success'] for r in results])
+        self.assertEqual([('a', b'aaaaa'), ('b', b'b' * 10)],
+                         [(i.name, d) for i, d in self._members(archive)])
+
+    def test_download_archive_write_error(self):
+        # Big enough for the archive to be written before it is closed
+        self.objects['a'] = ({}, [b'a' * 2 ** 16])
+        conn = self._get_mock_connection()
+        conn.get_object.side_effect = self._get_object
+        out = mock.Mock()
+        out.write.side_effect = IOError('Broken pipe')
+        with mock.patch('swiftclient.service.get_conn', return_value=conn):
+            with SwiftService() as swift:
+                results = list(swift.download_archive(
+                    'test_c', out, ['a', 'b', 'pre/c'], self.opts))
+        self.assertEqual(['a'], [r['object'] for r in results])
+        self.assertFalse(results[0]['success'])
+        self.assertEqual('Broken pipe', str(results[0]['error']))
+
+
+class TestServiceIterObjects(_TestServiceBase):
+
+    def setUp(self):
+        super(TestServiceIterObjects, self).setUp()
+        self.objects = dict((name, name.encode('ascii') * 3)
+                            for name in ('p/a', 'p/b', 'p/c', 'p/d'))
+        self.requested = []
+        self.conn = self._get_mock_connection()
+        self.conn.get_object.side_effect = self._get_object
+        self.pages = [{'success': True, 'listing': [
+            {'name': name} for name in sorted(self.objects)]}]
+
+    def _get_object(self, container, obj, resp_chunk_size=None,
+                    headers=None):
+        self.requested.append(obj)
+        if obj not in self.objects:
+            raise ClientException('Not Found', http_status=404)
+        body = self.objects[obj]
+        return {'etag': md5(body).hexdigest(),
+                'content-length': str(len(body))}, iter([body[:2], body[2:]])
+
+    @contextlib.contextmanager
+    def _service(self):
+        with mock.patch('swiftclient.service.get_conn',
+                        return_value=self.conn), \
+                mock.patch.object(SwiftService, 'list',
+                                  return_value=iter(self.pages)) as mock_list:
+            with SwiftService({'object_dd_threads': 4}) as swift:
+                yield swift
+        self.list_options = mock_list.call_args[1]['options']
+
+    def test_iter_objects(self):
+        with self._service() as swift:
+            results = list(swift.iter_objects('test_c', prefix='p/'))
+        self.assertEqual('p/', self.list_options['prefix'])
+        self.assertEqual([(name, self.objects[name]) for name in
+                          sorted(self.objects)],
+                         [(name, data) for name, _, data in results])
+        self.assertEqual(md5(b'p/ap/ap/a').hexdigest(),
+                         results[0][1]['etag'])
+        self.conn.get_object.assert_any_call(
+            'test_c', 'p/a', resp_chunk_size=65536, headers={})
+
+    def test_iter_objects_prefetch(self):
+        c_requested = threading.Event()
+
+        def get_object(container, obj, **kwargs):
+            if obj == 'p/c':
+                c_requested.set()
+            if obj == 'p/a':
+                # Objects further ahead are requested while a is fetched
+                self.assertTrue(c_requested.wait(5))
+            return self._get_object(container, obj, **kwargs)
+
+        self.conn.get_object.side_effect = get_object
+        with self._service() as swift:
+            objects = swift.iter_objects('test_c', prefetch=2)
+            self.assertEqual('p/a', next(objects)[0])
+            # No more than two objects were fetched ahead of a
+            self.assertEqual(['p/a', 'p/b', 'p/c'], sorted(self.requested))
+            self.assertEqual(['p/b', 'p/c', 'p/d'],
+                             [name for name, _, _ in objects])
+
+    def test_iter_objects_shuffled(self):
+        with mock.patch('swiftclient.service.randrange', return_value=0), \
+                mock.patch('swiftclient.service.shuffle',
+                           side_effect=lambda items: items.reverse()):
+            with self._service() as swift:
+                names = [name for name, _, _ in swift.iter_objects(
+                    'test_c', shuffle_buffer=2)]
+        self.assertEqual(['p/a', 'p/c', 'p/b', 'p/d'], names)
+
+    def test_window_shuffle(self):
+        items = list(range(100))
+        shuffled = list(swiftclient.service._window_shuffle(items, 10))
+        self.assertEqual(items, sorted(shuffled))
+        # Nothing can be moved earlier than the window allows
+        self.assertTrue(all(shuffled.index(i) >= i - 10 for i in items))
+
+    def test_iter_objects_skips_missing(self):
+        del self.objects['p/b']
+        with self._service() as swift:
+            names = [name for name, _, _ in swift.iter_objects('test_c')]
+        self.assertEqual(['p/a', 'p/c', 'p/d'], names)
+        for stream in (False, True):
+            self.conn.get_object.side_effect = ClientException(
+                'Server Error', http_status=500)
+            with self._service() as swift:
+                with self.assertRaises(ClientException):
+                    next(swift.iter_objects('test_c', stream=stream))
+
+    def test_iter_objects_stream(self):
+        with mock.patch('swiftclient.service.QUEUED_CHUNKS', 1):
+            with self._service() as swift:
+                results = []
+                for name, headers, body in swift.iter_objects(
+                        'test_c', stream=True):
+                    if name == 'p/b':
+                        # The rest of an unread body is skipped
+                        results.append(body.read(1))
+                    else:
+                        results.append(body.read(2) + body.read())
+        self.assertEqual([b'p/ap/ap/a', b'p', b'p/cp/cp/c', b'p/dp/dp/d'],
+                         results)
+
+    def test_iter_objects_stream_bad_checksum(self):
+        get_object = self.conn.get_object.side_effect
+
+        def bad_etag(container, obj, **kwargs):
+            headers, body = get_object(container, obj, **kwargs)
+            headers['etag'] = 'bad'
+            return headers, body
+
+        self.conn.get_object.side_effect = bad_etag
+        with self._service() as swift:
+            name, headers, body = next(swift.iter_objects(
+                'test_c', stream=True))
+            with self.assertRaises(SwiftError) as cm:
+                body.read()
+        self.assertIn('md5sum != etag', cm.exception.value)
+
+
 class TestServicePost(_TestServiceBase):
 
     def setUp(self):
@@ -2895,6 +4630,25 @@ class TestServiceCopy(_TestServiceBase):
         inter_compl.assert_called_with(
             [tm_instance.object_uu_pool.submit()] * len(calls))
 
+    @mock.patch('swiftclient.service.Connection')
+    def test_object_copy_container_cache(self, mock_conn):
+        conn = mock_conn.return_value
+        with SwiftService({'container_cache_ttl': 60}) as service:
+            for _ in range(2):
+                list(service.copy('test_c', ['test_o'],
+                                  {'destination': '/cont_new'}))
+            self.assertEqual(1, conn.put_container.call_count)
+
+            # A 404 from the COPY forgets the destination container
+            conn.copy_object.side_effect = ClientException(
+                'Not Found', http_status=404)
+            list(service.copy('test_c', ['test_o'],
+                              {'destination': '/cont_new'}))
+            conn.copy_object.side_effect = None
+            list(service.copy('test_c', ['test_o'],
+                              {'destination': '/cont_new'}))
+            self.assertEqual(2, conn.put_container.call_count)
+
     def test_object_copy_fail_dest(self):
         """
         Destination in incorrect format and destination with object
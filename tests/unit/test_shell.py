@@ -20,6 +20,8 @@ import json
 import logging
 import mock
 import os
+import shutil
+import tarfile
 import tempfile
 import unittest
 import textwrap
@@ -34,7 +36,6 @@ from swiftclient.service import SwiftError
 import swiftclient.shell
 import swiftclient.utils
 
-from os.path import basename, dirname
 from .utils import (
     CaptureOutput, fake_get_auth_keystone, _make_fake_import_keystone_client,
     FakeKeystone, StubResponse, MockHttpTest)
@@ -421,6 +422,73 @@ class TestShell(unittest.TestCase):
                              '             type/content object_a\n'
                              '           0\n')
 
+    @mock.patch('swiftclient.service.Connection')
+    def test_list_container_group_by(self, connection):
+        connection.return_value.get_container.side_effect = [
+            [None, [{'name': 'a/object_a', 'bytes': 2048,
+                     'content_type': 'text/plain',
+                     'last_modified': '123T456'},
+                    {'name': 'b/object_b', 'bytes': 1,
+                     'content_type': 'image/png',
+                     'last_modified': '123T456'}]],
+            [None, [{'name': 'b/object_c', 'bytes': 3,
+                     'content_type': 'text/plain',
+                     'last_modified': '123T456'}]],
+            [None, []],
+        ]
+        argv = ["", "list", "container", "--lh", "--group-by", "prefix"]
+        with CaptureOutput() as output:
+            swiftclient.shell.main(argv)
+            self.assertEqual(output.out,
+                             '    1 2.0K a/\n'
+                             '    2    4 b/\n'
+                             '2.0K\n')
+
+    def test_list_account_group_by_content_type(self):
+        argv = ["", "list", "--group-by", "content_type"]
+        with CaptureOutput() as output:
+            self.assertRaises(SystemExit, swiftclient.shell.main, argv)
+            self.assertEqual(output.err,
+                             'Grouping by content_type is only allowed for '
+                             'container listings\n')
+
+    @mock.patch('swiftclient.service.Connection')
+    def test_list_container_jsonl(self, connection):
+        connection.return_value.get_container.side_effect = [
+            [None, [{'name': 'object_a', 'bytes': 0,
+                     'content_type': 'type/content',
+                     'last_modified': '123T456'}]],
+            [None, []],
+        ]
+        argv = ["", "--format", "jsonl", "list", "container"]
+        with CaptureOutput() as output:
+            swiftclient.shell.main(argv)
+            lines = output.out.splitlines()
+        self.assertEqual(1, len(lines))
+        result = json.loads(lines[0])
+        self.assertEqual('list_container_part', result['action'])
+        self.assertTrue(result['success'])
+        self.assertEqual('container', result['container'])
+        self.assertEqual(['object_a'],
+                         [item['name'] for item in result['listing']])
+
+    @mock.patch('swiftclient.service.Connection')
+    def test_stat_object_jsonl_error(self, connection):
+        connection.return_value.head_object.side_effect = \
+            swiftclient.ClientException('test', http_status=404)
+        argv = ["", "--format", "jsonl", "stat", "container", "object"]
+        with CaptureOutput() as output:
+            with self.assertRaises(SystemExit):
+                swiftclient.shell.main(argv)
+            self.assertEqual('', output.err)
+            result = json.loads(output.out)
+        self.assertEqual('stat_object', result['action'])
+        self.assertFalse(result['success'])
+        self.assertEqual('object', result['object'])
+        self.assertEqual('ClientException', result['error_type'])
+        self.assertEqual(404, result['http_status'])
+        self.assertIn('test', result['error'])
+
     @mock.patch('swiftclient.service.Connection')
     def test_list_container_with_headers(self, connection):
         connection.return_value.get_container.side_effect = [
@@ -509,7 +577,8 @@ class TestShell(unittest.TestCase):
             'container', 'object', headers={}, resp_chunk_size=65536,
             response_dict={})
         mock_open.assert_called_with('object', 'wb', 65536)
-        sr.assert_called_once_with('object', mock.ANY, mock.ANY, False)
+        sr.assert_called_once_with('object', mock.ANY, mock.ANY, False,
+                                   False)
         self.assertEqual([], makedirs.mock_calls)
 
         # Test downloading single object to stdout
@@ -524,6 +593,114 @@ class TestShell(unittest.TestCase):
             swiftclient.shell.main(argv)
             self.assertEqual('objcontent', output.out)
 
+    @mock.patch('swiftclient.service.Connection')
+    def test_download_tar(self, connection):
+        def get_object(container, obj, **kwargs):
+            body = obj.encode('ascii') * 2
+            return ({'content-length': str(len(body)),
+                     'etag': hashlib.md5(body).hexdigest()}, [body])
+
+        connection.return_value.get_object.side_effect = get_object
+        connection.return_value.get_container.side_effect = [
+            [None, [{'name': 'object1'}, {'name': 'object2'}]],
+            [None, []],
+        ]
+        connection.return_value.auth_end_time = 0
+        connection.return_value.attempts = 0
+
+        with CaptureOutput() as output:
+            argv = ["", "download", "--tar", "-", "container"]
+            swiftclient.shell.main(argv)
+            archive = output._out.getvalue()
+            self.assertEqual('', output.err)
+
+        with tarfile.open(fileobj=six.BytesIO(archive), mode='r|') as tar:
+            self.assertEqual(
+                [('object1', b'object1object1'),
+                 ('object2', b'object2object2')],
+                [(info.name, tar.extractfile(info).read())
+                 for info in tar])
+
+    @mock.patch('swiftclient.service.Connection')
+    def test_download_object_cache(self, connection):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        connection.return_value.get_object.return_value = (
+            {'etag': EMPTY_ETAG, 'content-length': '0'}, [])
+        connection.return_value.auth_end_time = 0
+        connection.return_value.attempts = 0
+        with mock.patch(BUILTIN_OPEN):
+            argv = ["", "--cache-dir", cache_dir, "--cache-size", "5",
+                    "download", "container", "object"]
+            swiftclient.shell.main(argv)
+        cache = connection.call_args[1]['object_cache']
+        self.assertIsInstance(cache, swiftclient.ObjectCache)
+        self.assertEqual(cache_dir, cache.path)
+        self.assertEqual(5 * 2 ** 20, cache.max_size)
+
+    @mock.patch('swiftclient.service.Connection')
+    def test_download_no_decompress(self, connection):
+        connection.return_value.get_object.return_value = (
+            {'etag': EMPTY_ETAG, 'content-length': '0',
+             'x-object-meta-compression': 'gzip'}, [])
+        connection.return_value.auth_end_time = 0
+        connection.return_value.attempts = 0
+        for argv, decompress in (([], True), (["--no-decompress"], False)):
+            with mock.patch(BUILTIN_OPEN), mock.patch(
+                    'swiftclient.service._SwiftReader') as sr:
+                swiftclient.shell.main(
+                    ["", "download", "container", "object"] + argv)
+            sr.assert_called_once_with('object', mock.ANY, mock.ANY, True,
+                                       decompress)
+
+    @mock.patch('swiftclient.service.Connection')
+    def test_upload_expect_continue(self, connection):
+        connection.return_value.head_object.return_value = {
+            'content-length': '0'}
+        connection.return_value.put_object.return_value = EMPTY_ETAG
+        connection.return_value.attempts = 0
+        argv = ["", "--expect-continue", "0.5", "upload", "container",
+                self.tmpfile]
+        swiftclient.shell.main(argv)
+        self.assertEqual(0.5, connection.call_args[1]['expect_continue'])
+
+    @mock.patch('swiftclient.service.Connection')
+    def test_endpoint_options(self, connection):
+        connection.return_value.head_object.return_value = {
+            'content-length': '0'}
+        connection.return_value.put_object.return_value = EMPTY_ETAG
+        connection.return_value.attempts = 0
+        argv = ["", "--endpoint", "http://proxy1:8080", "--endpoint",
+                "http://proxy2:8080", "--endpoint-strategy", "round-robin",
+                "upload", "container", self.tmpfile]
+        swiftclient.shell.main(argv)
+        pool = connection.call_args[1]['endpoint_pool']
+        self.assertEqual(['http://proxy1:8080', 'http://proxy2:8080'],
+                         pool.endpoints)
+        self.assertEqual('round-robin', pool.strategy)
+        self.assertFalse(pool.resolve)
+
+        connection.reset_mock()
+        swiftclient.shell.main(["", "upload", "container", self.tmpfile])
+        self.assertIsNone(connection.call_args[1]['endpoint_pool'])
+
+        with CaptureOutput() as output:
+            with self.assertRaises(SystemExit):
+                swiftclient.shell.main(["", "--endpoint", "proxy1:8080",
+                                        "upload", "container",
+                                        self.tmpfile])
+            self.assertIn("invalid endpoint: 'proxy1:8080'", output.err)
+
+    def test_download_tar_conflicts(self):
+        for opts in (["-o", "out"], ["-D", "dir"], ["--all"]):
+            with CaptureOutput() as output:
+                argv = ["", "download", "--tar", "-"] + opts + ["container"]
+                with self.assertRaises(SystemExit) as cm:
+                    swiftclient.shell.main(argv)
+            self.assertEqual('--tar option cannot be used with -o, -D or '
+                             '--all', str(cm.exception))
+            self.assertEqual('', output.out)
+
     @mock.patch('swiftclient.service.shuffle')
     @mock.patch('swiftclient.service.Connection')
     def test_download_shuffle(self, connection, mock_shuffle):
@@ -616,9 +793,9 @@ class TestShell(unittest.TestCase):
             mock.call('pseudo'),
         ], mock_mkdir.mock_calls)
 
-    @mock.patch('swiftclient.shell.walk')
+    @mock.patch('swiftclient.shell._scan_upload_tree')
     @mock.patch('swiftclient.service.Connection')
-    def test_upload(self, connection, walk):
+    def test_upload(self, connection, scan):
         connection.return_value.head_object.return_value = {
             'content-length': '0'}
         connection.return_value.put_object.return_value = EMPTY_ETAG
@@ -662,11 +839,10 @@ class TestShell(unittest.TestCase):
 
         # Upload whole directory
         argv = ["", "upload", "container", "/tmp"]
-        _tmpfile = self.tmpfile
-        _tmpfile_dir = dirname(_tmpfile)
-        _tmpfile_base = basename(_tmpfile)
-        walk.return_value = [(_tmpfile_dir, [], [_tmpfile_base])]
+        scan.return_value = [
+            (self.tmpfile, os.stat(self.tmpfile), False)]
         swiftclient.shell.main(argv)
+        scan.assert_called_once_with('/tmp')
         connection.return_value.put_object.assert_called_with(
             'container',
             self.tmpfile.lstrip('/'),
@@ -724,6 +900,73 @@ class TestShell(unittest.TestCase):
             query_string='multipart-manifest=put',
             response_dict=mock.ANY)
 
+    def test_scan_upload_tree(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        os.makedirs(os.path.join(tmpdir, 'a', 'b'))
+        os.makedirs(os.path.join(tmpdir, 'empty'))
+        for name in ('top', os.path.join('a', 'mid'),
+                     os.path.join('a', 'b', 'leaf')):
+            with open(os.path.join(tmpdir, name), 'w') as fh:
+                fh.write(name)
+
+        found = dict(
+            (os.path.relpath(path, tmpdir), (st, is_dir_marker))
+            for path, st, is_dir_marker in
+            swiftclient.shell._scan_upload_tree(tmpdir))
+        self.assertEqual(
+            sorted(['top', 'a/mid', 'a/b/leaf', 'empty']), sorted(found))
+        self.assertEqual((None, True), found['empty'])
+        for name in ('top', 'a/mid', 'a/b/leaf'):
+            st, is_dir_marker = found[name]
+            self.assertFalse(is_dir_marker)
+            if swiftclient.shell.scandir is not None:
+                self.assertEqual(len(name), st.st_size)
+
+    @mock.patch('swiftclient.service.Connection')
+    def test_upload_compress(self, connection):
+        def put_object(container, obj, contents, **kwargs):
+            return hashlib.md5(b''.join(contents)).hexdigest()
+
+        connection.return_value.head_object.return_value = {
+            'content-length': '0'}
+        connection.return_value.put_object.side_effect = put_object
+        connection.return_value.attempts = 0
+        argv = ["", "upload", "container", self.tmpfile,
+                "--compress", "gzip"]
+        with CaptureOutput() as output:
+            swiftclient.shell.main(argv)
+            self.assertEqual('', output.err)
+        connection.return_value.put_object.assert_called_with(
+            'container',
+            self.tmpfile.lstrip('/'),
+            mock.ANY,
+            content_length=None,
+            headers={'x-object-meta-mtime': mock.ANY,
+                     'x-object-meta-compression': 'gzip',
+                     'x-object-meta-uncompressed-size': mock.ANY,
+                     'x-object-meta-uncompressed-md5': mock.ANY},
+            response_dict={})
+
+        with CaptureOutput() as output:
+            with self.assertRaises(SystemExit):
+                swiftclient.shell.main(argv[:-1] + ["lz4"])
+            self.assertIn("invalid choice: 'lz4'", output.err)
+
+    @mock.patch('swiftclient.service.SwiftService.upload')
+    def test_upload_streams_objects(self, upload):
+        # Objects are handed to upload() as a generator, not a list
+        upload.return_value = []
+        argv = ["", "upload", "container", self.tmpfile]
+        swiftclient.shell.main(argv)
+        upload.assert_called_once_with('container', mock.ANY)
+        objs = upload.call_args[0][1]
+        self.assertNotIsInstance(objs, list)
+        objs = list(objs)
+        self.assertEqual(1, len(objs))
+        self.assertEqual(self.tmpfile, objs[0].source)
+        self.assertEqual(os.stat(self.tmpfile), objs[0].stat_result)
+
     @mock.patch('swiftclient.service.SwiftService.upload')
     def test_upload_object_with_account_readonly(self, upload):
         argv = ["", "upload", "container", self.tmpfile]
@@ -923,9 +1166,9 @@ class TestShell(unittest.TestCase):
         upload_mock.assert_called_once_with("container", mock.ANY)
         # This is a little convoluted: we want to examine the first call ([0]),
         # the argv list([1]), the second parameter ([1]), and the first
-        # element.  This is because the upload method takes a container and a
-        # list of SwiftUploadObjects.
-        swift_upload_obj = upload_mock.mock_calls[0][1][1][0]
+        # element.  This is because the upload method takes a container and an
+        # iterable of SwiftUploadObjects.
+        swift_upload_obj = list(upload_mock.mock_calls[0][1][1])[0]
         self.assertEqual(sys.stdin.fileno(), swift_upload_obj.source.fileno())
         io_open_mock.assert_called_once_with(sys.stdin.fileno(), mode='rb')
 
@@ -1870,6 +2113,16 @@ class TestShell(unittest.TestCase):
                     swiftclient.shell.main(argv)
                 self.assertEqual(output.err, "Invalid segment size\n")
 
+    def test_auto_upload_segment_size(self):
+        mock_swift = mock.MagicMock(spec=swiftclient.shell.SwiftService)
+        with mock.patch("swiftclient.shell.SwiftService", mock_swift):
+            with CaptureOutput(suppress_systemexit=True) as output:
+                argv = ["", "upload", "-S", "auto", "container", "object"]
+                swiftclient.shell.main(argv)
+                self.assertEqual('', output.err)
+        options = mock_swift.call_args_list[-1][1]["options"]
+        self.assertEqual('auto', options["segment_size"])
+
     def test_negative_upload_segment_size(self):
         with CaptureOutput() as output:
             with self.assertRaises(SystemExit):
@@ -14,15 +14,19 @@
 # limitations under the License.
 
 import gzip
+import io
 import json
 import logging
 import mock
+import os
+import shutil
 import six
 import socket
 import string
 import unittest
 import warnings
 import tempfile
+import threading
 from hashlib import md5
 from six import binary_type
 from six.moves.urllib.parse import urlparse
@@ -245,6 +249,20 @@ class TestHttpHelpers(MockHttpTest):
         ua = req_headers.get('user-agent', 'XXX-MISSING-XXX')
         self.assertEqual(ua, 'a-new-default')
 
+    def test_host_header(self):
+        _junk, conn = c.http_connection('http://192.0.2.1:8080',
+                                        host_header='swift.example.com:8080')
+        req_headers = {}
+
+        def my_request_handler(*a, **kw):
+            req_headers.update(kw.get('headers', {}))
+        conn._request = my_request_handler
+
+        conn.request('GET', '/')
+        self.assertEqual('swift.example.com:8080', req_headers['host'])
+        conn.request('GET', '/', headers={'Host': 'other'})
+        self.assertEqual(b'other', req_headers['host'])
+
 
 class TestGetAuth(MockHttpTest):
 
@@ -1137,6 +1155,58 @@ class TestGetObject(MockHttpTest):
             }),
         ])
 
+    def test_chunk_size_readinto(self):
+        conn = c.Connection('http://auth.url/', 'some_user', 'some_key')
+        with mock.patch('swiftclient.client.get_auth_1_0') as mock_get_auth:
+            mock_get_auth.return_value = ('http://auth.url/', 'tToken')
+            c.http_connection = self.fake_http_connection(200, body=b'abcde')
+            __, resp = conn.get_object('asdf', 'asdf', resp_chunk_size=3)
+            buf = bytearray(3)
+            self.assertEqual(3, resp.readinto(buf))
+            self.assertEqual(b'abc', buf)
+            self.assertEqual(2, resp.readinto(memoryview(buf)[1:]))
+            self.assertEqual(b'ade', buf)
+            self.assertEqual(0, resp.readinto(buf))
+
+        # Responses that can read into a buffer do so directly
+        mock_resp = mock.Mock()
+        mock_resp.readinto.return_value = 3
+        body = c._ObjectBody(mock_resp, 3)
+        self.assertEqual(3, body.readinto(buf))
+        mock_resp.readinto.assert_called_once_with(buf)
+        self.assertFalse(mock_resp.read.called)
+
+    def test_chunk_size_readinto_retry(self):
+        conn = c.Connection('http://auth.url/', 'some_user', 'some_key')
+        with mock.patch('swiftclient.client.get_auth_1_0') as mock_get_auth:
+            mock_get_auth.return_value = ('http://auth.url', 'tToken')
+            c.http_connection = self.fake_http_connection(
+                StubResponse(200, b'abcdef', {'etag': 'some etag',
+                                              'content-length': '6'}),
+                StubResponse(206, b'cdef', {'etag': 'some etag',
+                                            'content-length': '4',
+                                            'content-range': 'bytes 2-5/6'}),
+            )
+            __, resp = conn.get_object('asdf', 'asdf', resp_chunk_size=2)
+            buf = bytearray(4)
+            self.assertEqual(2, resp.readinto(memoryview(buf)[:2]))
+            # simulate a dropped connection
+            resp.resp.read()
+            self.assertEqual(4, resp.readinto(buf))
+            self.assertEqual(b'cdef', buf)
+            self.assertEqual(2, conn.attempts)
+            self.assertEqual(0, resp.readinto(buf))
+        self.assertRequests([
+            ('GET', '/asdf/asdf', '', {
+                'x-auth-token': 'tToken',
+            }),
+            ('GET', '/asdf/asdf', '', {
+                'range': 'bytes=2-',
+                'if-match': 'some etag',
+                'x-auth-token': 'tToken',
+            }),
+        ])
+
     def test_get_object_with_resp_chunk_size_zero(self):
         def get_connection(self):
             def get_auth():
@@ -1155,6 +1225,112 @@ class TestGetObject(MockHttpTest):
             self.assertEqual(conn.attempts, 1)
 
 
+class TestGetObjectRanges(MockHttpTest):
+
+    data = b''.join(six.int2byte(i % 251) for i in range(1000))
+
+    def _multipart(self, ranges, boundary='abc'):
+        body = b''
+        for start, end in ranges:
+            body += (b'--%s\r\nContent-Type: text/plain\r\n'
+                     b'Content-Range: bytes %d-%d/1000\r\n\r\n' % (
+                         boundary.encode('ascii'), start, end))
+            body += self.data[start:end + 1] + b'\r\n'
+        body += b'--%s--' % boundary.encode('ascii')
+        return StubResponse(206, body, {
+            'content-type': 'multipart/byteranges;boundary=%s' % boundary})
+
+    def test_multipart(self):
+        c.http_connection = self.fake_http_connection(
+            self._multipart([(0, 9), (100, 199), (990, 999)]))
+        headers, parts = c.get_object_ranges(
+            'http://www.test.com', 'TOKEN', 'c', 'o',
+            [(990, None), (0, 9), (100, 199)], resp_chunk_size=7)
+        self.assertEqual([(0, 9, self.data[:10]),
+                          (100, 199, self.data[100:200]),
+                          (990, 999, self.data[990:])], list(parts))
+        self.assertRequests([
+            ('GET', '/c/o', '', {'range': 'bytes=0-9,100-199,990-',
+                                 'x-auth-token': 'TOKEN'}),
+        ])
+
+    def test_split_requests(self):
+        c.http_connection = self.fake_http_connection(
+            self._multipart([(0, 9), (20, 29)]),
+            self._multipart([(40, 49)], boundary='def'))
+        conn = c.http_connection('http://www.test.com')
+        headers, parts = c.get_object_ranges(
+            'http://www.test.com', 'TOKEN', 'c', 'o',
+            [(40, 49), (20, 29), (0, 9)], http_conn=conn, max_ranges=2)
+        # The later request is only made as the parts are read
+        self.assertEqual(1, len(self.request_log))
+        self.assertEqual([(0, 9), (20, 29), (40, 49)],
+                         [(start, end) for start, end, _data in parts])
+        self.assertRequests([
+            ('GET', '/c/o', '', {'range': 'bytes=0-9,20-29',
+                                 'x-auth-token': 'TOKEN'}),
+            ('GET', '/c/o', '', {'range': 'bytes=40-49',
+                                 'x-auth-token': 'TOKEN'}),
+        ])
+
+    def test_single_range(self):
+        c.http_connection = self.fake_http_connection(StubResponse(
+            206, self.data[5:30], {'content-range': 'bytes 5-29/1000'}))
+        headers, parts = c.get_object_ranges(
+            'http://www.test.com', 'TOKEN', 'c', 'o', [(5, 9), (20, 29)])
+        # The server coalesced both ranges into one
+        self.assertEqual([(5, 9, self.data[5:10]),
+                          (20, 29, self.data[20:30])], list(parts))
+
+    def test_range_ignored(self):
+        c.http_connection = self.fake_http_connection(
+            StubResponse(200, self.data, {'content-length': '1000'}))
+        headers, parts = c.get_object_ranges(
+            'http://www.test.com', 'TOKEN', 'c', 'o',
+            [(5, 9), (7, 12), (500, 2000)], resp_chunk_size=64)
+        self.assertEqual([(5, 9, self.data[5:10]),
+                          (7, 12, self.data[7:13]),
+                          (500, 999, self.data[500:])], list(parts))
+
+    def test_bad_ranges(self):
+        for ranges in ([], [(5, 4)], [(-1, 4)]):
+            self.assertRaises(ValueError, c.get_object_ranges,
+                              'http://www.test.com', 'TOKEN', 'c', 'o',
+                              ranges)
+        self.assertRaises(ValueError, c.get_object_ranges,
+                          'http://www.test.com', 'TOKEN', 'c', 'o',
+                          [(0, 1)], max_ranges=0)
+
+    def test_not_satisfiable(self):
+        c.http_connection = self.fake_http_connection(416)
+        with self.assertRaises(c.ClientException) as exc_context:
+            c.get_object_ranges('http://www.test.com', 'TOKEN', 'c', 'o',
+                                [(2000, 2999)])
+        self.assertEqual(416, exc_context.exception.http_status)
+
+    def test_truncated_part(self):
+        resp = self._multipart([(0, 9)])
+        resp.body = resp.body[:60]
+        c.http_connection = self.fake_http_connection(resp)
+        headers, parts = c.get_object_ranges(
+            'http://www.test.com', 'TOKEN', 'c', 'o', [(0, 9)])
+        self.assertRaises(c.ClientException, list, parts)
+
+    def test_connection_retries_each_request(self):
+        c.http_connection = self.fake_http_connection(
+            503, self._multipart([(0, 9)]), 503,
+            self._multipart([(20, 29)]))
+        conn = c.Connection('http://www.test.com/auth/v1.0', 'asdf', 'asdf',
+                            preauthurl='http://www.test.com',
+                            preauthtoken='TOKEN')
+        with mock.patch('swiftclient.client.sleep'):
+            headers, parts = conn.get_object_ranges(
+                'c', 'o', [(20, 29), (0, 9)], max_ranges=1)
+            self.assertEqual([(0, 9, self.data[:10]),
+                              (20, 29, self.data[20:30])], list(parts))
+        self.assertEqual(4, len(self.request_log))
+
+
 class TestHeadObject(MockHttpTest):
 
     def test_server_error(self):
@@ -1830,6 +2006,210 @@ class TestHTTPConnection(MockHttpTest):
         self.assertTrue(resp.closed)
 
 
+class _ExpectContinueServer(object):
+    """
+    Serves object PUTs on a local socket, answering ``Expect:
+    100-continue`` with ``response``, or with nothing if it's None.
+    Connections are kept open between requests unless ``keep_alive`` is
+    False.
+    """
+    def __init__(self, test, response=b'HTTP/1.1 100 Continue\r\n\r\n',
+                 requests=1, keep_alive=True):
+        self.response = response
+        self.requests = requests
+        self.keep_alive = keep_alive
+        self.accepted = 0
+        self.closed = threading.Event()
+        self.headers = None
+        self.body = None
+        self.sock = socket.socket()
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.listen(1)
+        self.url = 'http://127.0.0.1:%d/v1/AUTH_test' % (
+            self.sock.getsockname()[1])
+        self.thread = threading.Thread(target=self._serve)
+        self.thread.daemon = True
+        self.thread.start()
+        test.addCleanup(self.sock.close)
+
+    def _serve(self):
+        conn = None
+        for _ in range(self.requests):
+            if conn is None:
+                conn, _addr = self.sock.accept()
+                conn.settimeout(5)
+                fp = conn.makefile('rb')
+                self.accepted += 1
+            if not self._serve_request(conn, fp) or not self.keep_alive:
+                fp.close()
+                conn.close()
+                conn = None
+                self.closed.set()
+        if conn is not None:
+            fp.close()
+            conn.close()
+
+    def _serve_request(self, conn, fp):
+        lines = iter(fp.readline, b'\r\n')
+        self.request_line = next(lines)
+        self.headers = dict(
+            (k.strip().lower(), v.strip()) for k, v in (
+                line.decode('ascii').split(':', 1) for line in lines))
+        refused = self.response is not None and \
+            not self.response.startswith(b'HTTP/1.1 100 ')
+        if self.response:
+            conn.sendall(self.response)
+        if refused:
+            # The client should close the connection without sending the body
+            self.body = fp.read()
+            return False
+        self.body = self._read_body(fp)
+        conn.sendall(b'HTTP/1.1 201 Created\r\nEtag: %s\r\n'
+                     b'Content-Length: 0\r\n\r\n' %
+                     md5(self.body).hexdigest().encode('ascii'))
+        return True
+
+    def _read_body(self, fp):
+        if 'content-length' in self.headers:
+            return fp.read(int(self.headers['content-length']))
+        chunks = []
+        while True:
+            size = int(fp.readline(), 16)
+            chunks.append(fp.read(size))
+            fp.readline()
+            if not size:
+                return b''.join(chunks)
+
+
+class TestExpectContinue(unittest.TestCase):
+
+    def _put(self, server, contents, **kwargs):
+        http_conn = c.http_connection(server.url, expect_continue=2)
+        try:
+            return c.put_object(server.url, 'token', 'c', 'o', contents,
+                                http_conn=http_conn, **kwargs)
+        finally:
+            http_conn[1].close_expect_continue()
+            server.thread.join(5)
+
+    def test_connection_reused(self):
+        server = _ExpectContinueServer(self, requests=3)
+        http_conn = c.http_connection(server.url, expect_continue=2)
+        try:
+            for body in (b'abc', b'defg', b'hi'):
+                etag = c.put_object(server.url, 'token', 'c', 'o',
+                                    six.BytesIO(body),
+                                    content_length=len(body),
+                                    http_conn=http_conn)
+                self.assertEqual(md5(body).hexdigest(), etag)
+        finally:
+            http_conn[1].close_expect_continue()
+            server.thread.join(5)
+        self.assertEqual(b'hi', server.body)
+        self.assertEqual(1, server.accepted)
+
+    def test_closed_connection_replaced(self):
+        server = _ExpectContinueServer(self, requests=2, keep_alive=False)
+        http_conn = c.http_connection(server.url, expect_continue=2)
+        try:
+            for body in (b'abc', b'defg'):
+                etag = c.put_object(server.url, 'token', 'c', 'o',
+                                    six.BytesIO(body),
+                                    content_length=len(body),
+                                    http_conn=http_conn)
+                self.assertEqual(md5(body).hexdigest(), etag)
+                self.assertTrue(server.closed.wait(5))
+        finally:
+            http_conn[1].close_expect_continue()
+            server.thread.join(5)
+        self.assertEqual(b'defg', server.body)
+        self.assertEqual(2, server.accepted)
+
+    def test_put_content_length(self):
+        server = _ExpectContinueServer(self)
+        resp = {}
+        etag = self._put(server, six.BytesIO(b'x' * 100000),
+                         content_length=100000, response_dict=resp)
+        self.assertEqual(md5(b'x' * 100000).hexdigest(), etag)
+        self.assertEqual(b'x' * 100000, server.body)
+        self.assertEqual(b'PUT /v1/AUTH_test/c/o HTTP/1.1\r\n',
+                         server.request_line)
+        self.assertEqual('100-continue', server.headers['expect'])
+        self.assertEqual('100000', server.headers['content-length'])
+        self.assertEqual('token', server.headers['x-auth-token'])
+        self.assertNotIn('transfer-encoding', server.headers)
+        self.assertEqual(201, resp['status'])
+
+    def test_put_chunked(self):
+        server = _ExpectContinueServer(self)
+        etag = self._put(server, six.BytesIO(b'abc' * 30000),
+                         chunk_size=1000)
+        self.assertEqual(md5(b'abc' * 30000).hexdigest(), etag)
+        self.assertEqual(b'abc' * 30000, server.body)
+        self.assertEqual('chunked', server.headers['transfer-encoding'])
+        self.assertNotIn('content-length', server.headers)
+
+    def test_put_host_header(self):
+        server = _ExpectContinueServer(self)
+        http_conn = c.http_connection(server.url, expect_continue=2,
+                                      host_header='swift.example.com')
+        try:
+            c.put_object(server.url, 'token', 'c', 'o', six.BytesIO(b'abc'),
+                         content_length=3, http_conn=http_conn)
+        finally:
+            http_conn[1].close_expect_continue()
+            server.thread.join(5)
+        self.assertEqual('swift.example.com', server.headers['host'])
+
+    def test_put_refused(self):
+        server = _ExpectContinueServer(
+            self, b'HTTP/1.1 413 Request Entity Too Large\r\n'
+                  b'Content-Length: 9\r\n\r\nToo large')
+        with self.assertRaises(c.ClientException) as cm:
+            self._put(server, six.BytesIO(b'x' * 100000),
+                      content_length=100000)
+        self.assertEqual(413, cm.exception.http_status)
+        self.assertEqual(b'Too large', cm.exception.http_response_content)
+        # None of the body was sent
+        self.assertEqual(b'', server.body)
+
+    def test_put_without_continue(self):
+        # Servers that don't send 100 Continue still get the body
+        server = _ExpectContinueServer(self, None)
+        http_conn = c.http_connection(server.url, expect_continue=0.01)
+        etag = c.put_object(server.url, 'token', 'c', 'o',
+                            six.BytesIO(b'abc'), content_length=3,
+                            http_conn=http_conn)
+        server.thread.join(5)
+        self.assertEqual(md5(b'abc').hexdigest(), etag)
+        self.assertEqual(b'abc', server.body)
+
+    def test_not_used(self):
+        _parsed, conn = c.http_connection('http://127.0.0.1:8080/',
+                                          expect_continue=1)
+        with mock.patch.object(conn, '_request') as request, \
+                mock.patch.object(conn, '_put_expecting_continue') as put:
+            request.return_value.status_code = 201
+            # Bodies given as strings aren't sent with putrequest
+            c.put_object('http://127.0.0.1:8080/v1/a', 'token', 'c', 'o',
+                         b'abc', http_conn=(_parsed, conn))
+            self.assertEqual(1, request.call_count)
+            self.assertFalse(put.called)
+            # Nor is a proxy used
+            conn.requests_args['proxies'] = {'http': 'http://proxy:3128'}
+            conn.putrequest('/v1/a/c/o', six.BytesIO(b'abc'))
+            self.assertEqual(2, request.call_count)
+            self.assertFalse(put.called)
+
+    def test_connection_option(self):
+        conn = c.Connection(preauthurl='http://127.0.0.1:8080/v1/a',
+                            preauthtoken='token', expect_continue=3)
+        self.assertEqual(3, conn.http_connection()[1].expect_continue)
+        conn = c.Connection(preauthurl='http://127.0.0.1:8080/v1/a',
+                            preauthtoken='token')
+        self.assertIsNone(conn.http_connection()[1].expect_continue)
+
+
 class TestConnection(MockHttpTest):
 
     def test_instance(self):
@@ -1937,6 +2317,19 @@ class TestConnection(MockHttpTest):
         self.assertRaises(c.ClientException, conn.head_account)
         self.assertEqual(conn.attempts, conn.retries + 1)
 
+    def test_backoff_attributes_use_retry_policy(self):
+        conn = c.Connection('http://www.test.com/auth/v1.0', 'asdf', 'asdf',
+                            starting_backoff=2, max_backoff=8)
+        self.assertEqual(2, conn.starting_backoff)
+        self.assertEqual(8, conn.retry_policy.max_backoff)
+        # Changing them after construction still takes effect
+        conn.starting_backoff = 0.5
+        conn.max_backoff = 1
+        conn.retry_on_ratelimit = True
+        self.assertEqual(0.5, conn.retry_policy.starting_backoff)
+        self.assertEqual(1, conn.retry_policy.backoff(5))
+        self.assertTrue(conn.retry_policy.retry_status(498))
+
     def test_retry_on_ratelimit(self):
 
         def quick_sleep(*args):
@@ -1968,6 +2361,165 @@ class TestConnection(MockHttpTest):
         self.assertIn('Account HEAD failed', str(exc_context.exception))
         self.assertEqual(conn.attempts, 1)
 
+    def test_retry_backoff(self):
+        conn = c.Connection('http://www.test.com', 'asdf', 'asdf',
+                            starting_backoff=1, max_backoff=4)
+        code_iter = [500] * (conn.retries + 1)
+        with mock.patch.multiple(
+                'swiftclient.client',
+                http_connection=self.fake_http_connection(*code_iter),
+                sleep=mock.DEFAULT) as mocks:
+            self.assertRaises(c.ClientException, conn.head_account)
+        self.assertEqual([mock.call(delay) for delay in (1, 2, 4, 4, 4)],
+                         mocks['sleep'].mock_calls)
+
+    def test_retry_after(self):
+        conn = c.Connection(preauthurl='http://www.test.com/v1/AUTH_test',
+                            preauthtoken='token', starting_backoff=1,
+                            max_backoff=10)
+        fake_conn = self.fake_http_connection(
+            StubResponse(503, headers={'Retry-After': '5'}), 200)
+        with mock.patch.multiple('swiftclient.client',
+                                 http_connection=fake_conn,
+                                 sleep=mock.DEFAULT) as mocks:
+            conn.head_account()
+        self.assertEqual([mock.call(5)], mocks['sleep'].mock_calls)
+        self.assertEqual(2, conn.attempts)
+
+    def test_retry_policy_status_and_method_rules(self):
+        policy = c.RetryPolicy(status_rules={503: False},
+                               method_rules={'put_object': 1})
+        conn = c.Connection('http://www.test.com', 'asdf', 'asdf',
+                            retry_policy=policy)
+        fake_conn = self.fake_http_connection(503)
+        with mock.patch.multiple('swiftclient.client',
+                                 http_connection=fake_conn,
+                                 sleep=mock.DEFAULT) as mocks:
+            self.assertRaises(c.ClientException, conn.head_account)
+        self.assertEqual(1, conn.attempts)
+        self.assertFalse(mocks['sleep'].called)
+
+        fake_conn = self.fake_http_connection(500, 500)
+        with mock.patch.multiple('swiftclient.client',
+                                 http_connection=fake_conn,
+                                 sleep=mock.DEFAULT) as mocks:
+            self.assertRaises(c.ClientException, conn.put_object,
+                              'c', 'o', 'contents')
+        self.assertEqual(2, conn.attempts)
+        self.assertEqual(1, mocks['sleep'].call_count)
+
+    def test_circuit_breaker(self):
+        breaker = c.CircuitBreaker(failure_threshold=3)
+        conns = [c.Connection(preauthurl='http://www.test.com/v1/AUTH_test',
+                              preauthtoken='token', retries=1,
+                              circuit_breaker=breaker) for _ in range(2)]
+        fake_conn = self.fake_http_connection(500, 500, 500)
+        with mock.patch.multiple('swiftclient.client',
+                                 http_connection=fake_conn,
+                                 sleep=mock.DEFAULT):
+            self.assertRaises(c.ClientException, conns[0].head_account)
+            self.assertEqual('closed', breaker.state('www.test.com'))
+            # The third failure opens the circuit, so the retry fails
+            # without being sent
+            response_dict = {}
+            with self.assertRaises(c.ClientException) as exc_context:
+                conns[1].post_account({}, response_dict=response_dict)
+            self.assertIsNone(exc_context.exception.http_status)
+            self.assertEqual(2, conns[1].attempts)
+            self.assertEqual('open', response_dict['circuit_state'])
+            self.assertEqual(500, response_dict['status'])
+            with self.assertRaises(c.ClientException) as exc_context:
+                conns[0].head_account()
+            self.assertIn('Circuit breaker open for www.test.com',
+                          str(exc_context.exception))
+            self.assertEqual(1, conns[0].attempts)
+
+    def test_endpoint_pool(self):
+        pool = c.EndpointPool(['http://proxy1:8080', 'http://proxy2:8080/'],
+                              strategy=c.EndpointPool.ROUND_ROBIN,
+                              eject_threshold=2)
+        conn = c.Connection(preauthurl='http://www.test.com/v1/AUTH_test',
+                            preauthtoken='token', retries=2,
+                            endpoint_pool=pool)
+        fake_conn = self.fake_http_connection(204, 204, 503, 204, 503, 204,
+                                              204)
+        with mock.patch.multiple('swiftclient.client',
+                                 http_connection=fake_conn,
+                                 sleep=mock.DEFAULT):
+            conn.head_account()
+            conn.head_account()
+            # proxy1 fails, and the retry goes to proxy2
+            conn.head_account()
+            self.assertEqual([], pool.ejected())
+            # proxy1 fails again, and is ejected
+            conn.head_account()
+            self.assertEqual(['http://proxy1:8080'], pool.ejected())
+            conn.head_account()
+        self.assertEqual(
+            ['proxy1', 'proxy2', 'proxy1', 'proxy2', 'proxy1', 'proxy2',
+             'proxy2'],
+            [r['parsed_path'].hostname for r in self.iter_request_log()])
+        self.assertEqual(
+            {'/v1/AUTH_test'},
+            set(r['path'] for r in self.iter_request_log()))
+        # Each endpoint has a connection of its own
+        self.assertEqual(2, len(conn._pool_conns))
+
+    @mock.patch('swiftclient.client.socket.getaddrinfo')
+    def test_endpoint_pool_resolved_host(self, getaddrinfo):
+        getaddrinfo.return_value = [
+            (socket.AF_INET, socket.SOCK_STREAM, 6, '',
+             ('192.0.2.1', 8080))]
+        pool = c.EndpointPool(resolve=True)
+        conn = c.Connection(
+            preauthurl='http://www.test.com:8080/v1/AUTH_test',
+            preauthtoken='token', endpoint_pool=pool)
+        fake_conn = self.fake_http_connection(204)
+        with mock.patch.object(
+                conn, 'http_connection',
+                side_effect=lambda url, host_header=None: fake_conn(url)) \
+                as http_connection:
+            conn.head_account()
+        http_connection.assert_called_once_with(
+            'http://192.0.2.1:8080/v1/AUTH_test', 'www.test.com:8080')
+
+    def test_endpoint_pool_streamed_body(self):
+        pool = c.EndpointPool(['http://proxy1', 'http://proxy2'])
+        conn = c.Connection(preauthurl='http://www.test.com/v1/AUTH_test',
+                            preauthtoken='token', endpoint_pool=pool)
+        fake_conn = self.fake_http_connection(200, 204, body='abcde')
+        with mock.patch.multiple('swiftclient.client',
+                                 http_connection=fake_conn,
+                                 sleep=mock.DEFAULT):
+            _headers, body = conn.get_object('c', 'o', resp_chunk_size=3)
+            # The download holds its endpoint until its body is read, so
+            # the next request goes to the other one
+            conn.head_account()
+            hosts = [r['parsed_path'].hostname
+                     for r in self.iter_request_log()]
+            self.assertEqual(2, len(set(hosts)))
+            self.assertEqual(
+                [0, 1], sorted(state['outstanding']
+                               for state in pool._endpoints.values()))
+            self.assertEqual('abcde', ''.join(body))
+            self.assertEqual(
+                [0, 0], [state['outstanding']
+                         for state in pool._endpoints.values()])
+
+    def test_retry_budget_shared(self):
+        policy = c.RetryPolicy(budget=c.RetryBudget(reserve=2))
+        conns = [c.Connection('http://www.test.com', 'asdf', 'asdf',
+                              retry_policy=policy) for _ in range(2)]
+        fake_conn = self.fake_http_connection(*([500] * 4))
+        with mock.patch.multiple('swiftclient.client',
+                                 http_connection=fake_conn,
+                                 sleep=mock.DEFAULT):
+            self.assertRaises(c.ClientException, conns[0].head_account)
+            self.assertEqual(3, conns[0].attempts)
+            # The budget is spent, so the second connection fails at once
+            self.assertRaises(c.ClientException, conns[1].head_account)
+            self.assertEqual(1, conns[1].attempts)
+
     def test_resp_read_on_server_error(self):
         conn = c.Connection('http://www.test.com', 'asdf', 'asdf', retries=0)
 
@@ -2476,6 +3028,520 @@ class TestConnection(MockHttpTest):
         self.assertEqual(conn.attempts, 1)
 
 
+class TestRetryPolicy(unittest.TestCase):
+
+    def test_no_jitter(self):
+        policy = c.RetryPolicy(starting_backoff=1, max_backoff=10)
+        self.assertEqual([1, 2, 4, 8, 10],
+                         [policy.backoff(retries) for retries in range(5)])
+
+    def test_full_jitter(self):
+        policy = c.RetryPolicy(starting_backoff=1, max_backoff=10,
+                               jitter='full')
+        with mock.patch('random.uniform', return_value=3) as mock_uniform:
+            self.assertEqual(3, policy.backoff(2))
+            self.assertEqual(3, policy.backoff(5))
+        self.assertEqual([mock.call(0, 4), mock.call(0, 10)],
+                         mock_uniform.mock_calls)
+
+    def test_decorrelated_jitter(self):
+        policy = c.RetryPolicy(starting_backoff=1, max_backoff=10,
+                               jitter='decorrelated')
+        with mock.patch('random.uniform', return_value=12) as mock_uniform:
+            self.assertEqual(10, policy.backoff(0))
+            self.assertEqual(10, policy.backoff(1, previous=10))
+        self.assertEqual([mock.call(1, 3), mock.call(1, 30)],
+                         mock_uniform.mock_calls)
+
+    def test_bad_jitter(self):
+        self.assertRaises(ValueError, c.RetryPolicy, jitter='some')
+
+    def test_retry_after(self):
+        policy = c.RetryPolicy(starting_backoff=1, max_backoff=60)
+        err = c.ClientException('test', http_status=503,
+                                http_response_headers={'retry-after': '30'})
+        self.assertEqual(30, policy.backoff(0, err=err))
+        # Retry-After may also be an HTTP date
+        err.http_response_headers['retry-after'] = \
+            'Wed, 21 Oct 2015 07:28:00 GMT'
+        with mock.patch('swiftclient.client.time', return_value=1445412470):
+            self.assertEqual(10, policy.backoff(0, err=err))
+        # ... but is limited to max_backoff
+        err.http_response_headers['retry-after'] = '3600'
+        self.assertEqual(60, policy.backoff(0, err=err))
+
+        policy = c.RetryPolicy(starting_backoff=1,
+                               respect_retry_after=False)
+        self.assertEqual(1, policy.backoff(0, err=err))
+
+    def test_retry_status(self):
+        policy = c.RetryPolicy()
+        for status in (408, 500, 503):
+            self.assertTrue(policy.retry_status(status))
+        for status in (404, 429, 498):
+            self.assertFalse(policy.retry_status(status))
+
+        policy = c.RetryPolicy(retry_on_ratelimit=True,
+                               status_rules={429: True, 501: False})
+        for status in (429, 498, 500):
+            self.assertTrue(policy.retry_status(status))
+        self.assertFalse(policy.retry_status(501))
+
+    def test_budget(self):
+        budget = c.RetryBudget(ratio=0.5, reserve=1, max_tokens=2)
+        policy = c.RetryPolicy(budget=budget)
+        self.assertTrue(policy.allow_retry('head_account', 0))
+        self.assertFalse(policy.allow_retry('head_account', 0))
+        policy.record_success()
+        self.assertFalse(policy.allow_retry('head_account', 0))
+        policy.record_success()
+        self.assertTrue(policy.allow_retry('head_account', 0))
+        for _ in range(10):
+            policy.record_success()
+        self.assertTrue(budget.withdraw())
+        self.assertTrue(budget.withdraw())
+        self.assertFalse(budget.withdraw())
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def test_state_changes(self):
+        breaker = c.CircuitBreaker(failure_threshold=2, reset_timeout=10,
+                                   probe_interval=1)
+        with mock.patch('swiftclient.client.time', return_value=100):
+            breaker.record_failure('host:8080')
+            self.assertEqual('closed', breaker.state('host:8080'))
+            breaker.before_request('host:8080')
+            breaker.record_failure('host:8080')
+            self.assertEqual('open', breaker.state('host:8080'))
+            self.assertRaises(c.ClientException,
+                              breaker.before_request, 'host:8080')
+            # Other endpoints are unaffected
+            self.assertEqual('closed', breaker.state('other:8080'))
+            breaker.before_request('other:8080')
+
+        with mock.patch('swiftclient.client.time', return_value=110):
+            self.assertEqual('half-open', breaker.state('host:8080'))
+            # One probe is allowed through ...
+            breaker.before_request('host:8080')
+            # ... but no more until probe_interval has passed
+            self.assertRaises(c.ClientException,
+                              breaker.before_request, 'host:8080')
+            # A failed probe re-opens the circuit
+            breaker.record_failure('host:8080')
+            self.assertEqual('open', breaker.state('host:8080'))
+
+        with mock.patch('swiftclient.client.time', return_value=120):
+            breaker.before_request('host:8080')
+            breaker.record_success('host:8080')
+            self.assertEqual('closed', breaker.state('host:8080'))
+            breaker.record_failure('host:8080')
+            self.assertEqual('closed', breaker.state('host:8080'))
+
+
+class TestEndpointPool(unittest.TestCase):
+
+    def test_bad_strategy(self):
+        self.assertRaises(ValueError, c.EndpointPool, ['http://proxy1'],
+                          strategy='random')
+
+    def test_bad_endpoint(self):
+        for endpoint in ('proxy1:8080', 'ftp://proxy1', 'http://'):
+            self.assertRaises(ValueError, c.EndpointPool, [endpoint])
+
+    def test_endpoints_normalised(self):
+        pool = c.EndpointPool(['HTTP://Proxy1:8080/some/path',
+                               'http://proxy1:8080'], eject_threshold=1)
+        self.assertEqual(['http://proxy1:8080'], pool.endpoints)
+        url = pool.acquire('http://www.test.com/v1/AUTH_test')
+        self.assertEqual('http://proxy1:8080/v1/AUTH_test', url)
+        pool.release(url, failed=True)
+        self.assertEqual(['http://proxy1:8080'], pool.ejected())
+        self.assertEqual(0, pool._endpoints['http://proxy1:8080'][
+            'outstanding'])
+
+    def test_endpoint_response(self):
+        pool = c.EndpointPool(['http://proxy1'])
+        url = pool.acquire('http://www.test.com/v1/a')
+        resp = mock.Mock()
+        resp.read.side_effect = [b'abc', socket.error('reset')]
+        wrapped = c._EndpointResponse(resp, pool, url)
+        self.assertIs(resp.getheader, wrapped.getheader)
+        self.assertEqual(b'abc', wrapped.read(3))
+        self.assertEqual(1, pool._endpoints['http://proxy1']['outstanding'])
+        self.assertRaises(socket.error, wrapped.read, 3)
+        state = pool._endpoints['http://proxy1']
+        self.assertEqual((0, 1), (state['outstanding'], state['failures']))
+        # It's only released once
+        wrapped.close()
+        self.assertEqual((0, 1), (state['outstanding'], state['failures']))
+        resp.close.assert_called_once_with()
+
+        url = pool.acquire('http://www.test.com/v1/a')
+        c._EndpointResponse(mock.Mock(), pool, url).close()
+        self.assertEqual((0, 0), (state['outstanding'], state['failures']))
+
+    def test_no_endpoints(self):
+        pool = c.EndpointPool()
+        url = 'https://www.test.com/v1/AUTH_test/c/o?x=1'
+        self.assertEqual(url, pool.acquire(url))
+        pool.release(url)
+
+    def test_least_outstanding(self):
+        pool = c.EndpointPool(['http://proxy1', 'https://proxy2:8443'])
+        url = 'http://www.test.com/v1/AUTH_test/c'
+        first = pool.acquire(url)
+        second = pool.acquire(url)
+        self.assertEqual(
+            ['http://proxy1/v1/AUTH_test/c',
+             'https://proxy2:8443/v1/AUTH_test/c'],
+            sorted([first, second]))
+        pool.release(first)
+        # Only the endpoint of the first request is free
+        self.assertEqual(first, pool.acquire(url))
+        pool.release(second)
+        self.assertEqual(second, pool.acquire(url))
+
+    def test_round_robin(self):
+        pool = c.EndpointPool(['http://proxy1', 'http://proxy2'],
+                              strategy=c.EndpointPool.ROUND_ROBIN)
+        hosts = [urlparse(pool.acquire('http://www.test.com/v1/a')).hostname
+                 for _ in range(4)]
+        self.assertEqual(['proxy1', 'proxy2', 'proxy1', 'proxy2'], hosts)
+
+    def test_ejection(self):
+        pool = c.EndpointPool(['http://proxy1', 'http://proxy2'],
+                              eject_threshold=2, eject_time=10)
+        url = 'http://www.test.com/v1/a'
+        with mock.patch('swiftclient.client.time', return_value=100):
+            pool.release('http://proxy1/v1/a', failed=True)
+            pool.release('http://proxy1/v1/a')
+            pool.release('http://proxy1/v1/a', failed=True)
+            self.assertEqual([], pool.ejected())
+            pool.release('http://proxy1/v1/a', failed=True)
+            self.assertEqual(['http://proxy1'], pool.ejected())
+            for _ in range(3):
+                self.assertEqual('http://proxy2/v1/a', pool.acquire(url))
+            # With every endpoint ejected, the one due back first is used
+            pool.release('http://proxy2/v1/a', failed=True)
+        with mock.patch('swiftclient.client.time', return_value=105):
+            pool.release('http://proxy2/v1/a', failed=True)
+            self.assertEqual(['http://proxy1', 'http://proxy2'],
+                             pool.ejected())
+            self.assertEqual('http://proxy1/v1/a', pool.acquire(url))
+        with mock.patch('swiftclient.client.time', return_value=110):
+            self.assertEqual(['http://proxy2'], pool.ejected())
+            # One more failure ejects it again
+            pool.release('http://proxy1/v1/a', failed=True)
+            self.assertEqual(['http://proxy1', 'http://proxy2'],
+                             pool.ejected())
+
+    @mock.patch('swiftclient.client.socket.getaddrinfo')
+    def test_resolve(self, getaddrinfo):
+        getaddrinfo.return_value = [
+            (socket.AF_INET, socket.SOCK_STREAM, 6, '',
+             ('192.0.2.1', 8080)),
+            (socket.AF_INET, socket.SOCK_STREAM, 6, '',
+             ('192.0.2.2', 8080)),
+            (socket.AF_INET6, socket.SOCK_STREAM, 6, '',
+             ('2001:db8::1', 8080, 0, 0)),
+        ]
+        pool = c.EndpointPool(resolve=True,
+                              strategy=c.EndpointPool.ROUND_ROBIN)
+        url = 'http://swift.example.com:8080/v1/AUTH_test'
+        self.assertEqual(
+            ['http://192.0.2.1:8080/v1/AUTH_test',
+             'http://192.0.2.2:8080/v1/AUTH_test',
+             'http://[2001:db8::1]:8080/v1/AUTH_test'],
+            [pool.acquire(url) for _ in range(3)])
+        getaddrinfo.assert_called_once_with('swift.example.com', 8080, 0,
+                                            socket.SOCK_STREAM)
+        # Requests to the addresses are still for the storage URL's host
+        self.assertEqual('swift.example.com:8080', pool.host_header(
+            url, 'http://192.0.2.2:8080/v1/AUTH_test'))
+        self.assertIsNone(pool.host_header(url, url))
+        # https storage URLs are not resolved
+        url = 'https://swift.example.com/v1/AUTH_test'
+        self.assertEqual(url, pool.acquire(url))
+        self.assertEqual(1, getaddrinfo.call_count)
+
+    @mock.patch('swiftclient.client.socket.getaddrinfo')
+    def test_resolve_failure(self, getaddrinfo):
+        getaddrinfo.side_effect = socket.gaierror('no such host')
+        pool = c.EndpointPool(resolve=True)
+        url = 'http://swift.example.com/v1/AUTH_test'
+        self.assertEqual(url, pool.acquire(url))
+
+
+class TestObjectCache(MockHttpTest):
+
+    def setUp(self):
+        super(TestObjectCache, self).setUp()
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+        self.cache = c.ObjectCache(self.cache_dir)
+        self.body = b'abcdef'
+        self.etag = md5(self.body).hexdigest()
+
+    def _conn(self, cache=None):
+        return c.Connection(preauthurl='http://storage.url/v1/AUTH_test',
+                            preauthtoken='tToken',
+                            object_cache=cache or self.cache)
+
+    def _ok(self, body=None):
+        body = self.body if body is None else body
+        return StubResponse(200, body, {
+            'etag': '"%s"' % md5(body).hexdigest(),
+            'content-length': str(len(body)),
+            'x-object-meta-color': 'blue'})
+
+    def test_miss_then_hit(self):
+        c.http_connection = self.fake_http_connection(
+            self._ok(), StubResponse(304, b'', {'etag': self.etag}))
+        conn = self._conn()
+        response_dict = {}
+        headers, body = conn.get_object('c', 'o', resp_chunk_size=4,
+                                        response_dict=response_dict)
+        self.assertEqual(self.body, b''.join(body))
+        self.assertEqual('miss', response_dict['object_cache'])
+
+        response_dict = {}
+        headers, body = conn.get_object('c', 'o', resp_chunk_size=4,
+                                        response_dict=response_dict)
+        self.assertEqual([b'abcd', b'ef'], list(body))
+        self.assertEqual('blue', headers['x-object-meta-color'])
+        self.assertEqual('hit', response_dict['object_cache'])
+        self.assertEqual((1, 1), (self.cache.hits, self.cache.misses))
+        self.assertRequests([
+            ('GET', '/v1/AUTH_test/c/o', '', {'x-auth-token': 'tToken'}),
+            ('GET', '/v1/AUTH_test/c/o', '', {
+                'x-auth-token': 'tToken',
+                'if-none-match': '"%s"' % self.etag}),
+        ])
+
+    def test_hit_without_chunk_size(self):
+        c.http_connection = self.fake_http_connection(
+            self._ok(), StubResponse(304, b'', {}))
+        conn = self._conn()
+        self.assertEqual(self.body, conn.get_object('c', 'o')[1])
+        self.assertEqual(self.body, conn.get_object('c', 'o')[1])
+        self.assertEqual((1, 1), (self.cache.hits, self.cache.misses))
+
+    def test_hit_readinto(self):
+        c.http_connection = self.fake_http_connection(
+            self._ok(), StubResponse(304, b'', {}))
+        conn = self._conn()
+        buf = bytearray(4)
+        _, body = conn.get_object('c', 'o', resp_chunk_size=4)
+        while body.readinto(buf):
+            pass
+        _, body = conn.get_object('c', 'o', resp_chunk_size=4)
+        self.assertEqual(4, body.readinto(buf))
+        self.assertEqual(b'abcd', buf)
+        self.assertEqual(2, body.readinto(buf))
+        self.assertEqual(0, body.readinto(buf))
+        self.assertEqual(1, self.cache.hits)
+
+    def test_changed_object_replaces_cached_copy(self):
+        c.http_connection = self.fake_http_connection(
+            self._ok(), self._ok(b'changed'), StubResponse(304, b'', {}))
+        conn = self._conn()
+        self.assertEqual(self.body, conn.get_object('c', 'o')[1])
+        self.assertEqual(b'changed', conn.get_object('c', 'o')[1])
+        self.assertEqual(b'changed', conn.get_object('c', 'o')[1])
+        self.assertEqual((1, 2), (self.cache.hits, self.cache.misses))
+        requests = list(self.iter_request_log())
+        self.assertEqual('"%s"' % md5(b'changed').hexdigest(),
+                         requests[2]['headers']['If-None-Match'])
+
+    def test_resumed_download_cached(self):
+        c.http_connection = self.fake_http_connection(
+            self._ok(),
+            StubResponse(206, b'cdef', {'etag': self.etag,
+                                        'content-length': '4',
+                                        'content-range': 'bytes 2-5/6'}),
+            StubResponse(304, b'', {}))
+        conn = self._conn()
+        _, body = conn.get_object('c', 'o', resp_chunk_size=2)
+        self.assertEqual(b'ab', next(body))
+        # simulate a dropped connection
+        body.resp.read()
+        self.assertEqual(b'cdef', b''.join(body))
+        self.assertEqual(self.body, conn.get_object('c', 'o')[1])
+        self.assertEqual((1, 1), (self.cache.hits, self.cache.misses))
+
+    def test_incomplete_download_not_cached(self):
+        c.http_connection = self.fake_http_connection(
+            self._ok(), self._ok())
+        conn = self._conn()
+        _, body = conn.get_object('c', 'o', resp_chunk_size=4)
+        self.assertEqual(b'abcd', next(body))
+        conn.get_object('c', 'o')
+        self.assertRequests([
+            ('GET', '/v1/AUTH_test/c/o', '', {'x-auth-token': 'tToken'}),
+            ('GET', '/v1/AUTH_test/c/o', '', {'x-auth-token': 'tToken'}),
+        ])
+
+    def test_bad_checksum_not_cached(self):
+        bad = StubResponse(200, self.body, {'etag': 'bad', 'content-length':
+                                            str(len(self.body))})
+        c.http_connection = self.fake_http_connection(bad, self._ok())
+        conn = self._conn()
+        conn.get_object('c', 'o')
+        conn.get_object('c', 'o')
+        self.assertEqual((0, 2), (self.cache.hits, self.cache.misses))
+        requests = list(self.iter_request_log())
+        self.assertNotIn('If-None-Match', requests[1]['headers'])
+
+    def test_uncacheable_requests(self):
+        c.http_connection = self.fake_http_connection(
+            self._ok(), self._ok(), self._ok(), self._ok())
+        conn = self._conn()
+        conn.get_object('c', 'o')
+        response_dict = {}
+        conn.get_object('c', 'o', headers={'Range': 'bytes=1-'},
+                        response_dict=response_dict)
+        conn.get_object('c', 'o', query_string='multipart-manifest=get')
+        conn.get_object('c', 'o', headers={'If-None-Match': 'foo'})
+        self.assertNotIn('object_cache', response_dict)
+        self.assertEqual((0, 1), (self.cache.hits, self.cache.misses))
+        self.assertEqual([None, None, None, 'foo'],
+                         [req['headers'].get('If-None-Match')
+                          for req in self.iter_request_log()])
+
+    def test_shared_between_instances(self):
+        c.http_connection = self.fake_http_connection(
+            self._ok(), StubResponse(304, b'', {}))
+        self._conn().get_object('c', 'o')
+        other_cache = c.ObjectCache(self.cache_dir)
+        self.assertEqual(self.body,
+                         self._conn(other_cache).get_object('c', 'o')[1])
+        self.assertEqual(1, other_cache.hits)
+
+    def test_keyed_by_account(self):
+        self.assertNotEqual(
+            c.ObjectCache.key('http://a/v1/AUTH_a', 'c', 'o'),
+            c.ObjectCache.key('http://a/v1/AUTH_b', 'c', 'o'))
+        self.assertEqual(
+            c.ObjectCache.key('http://a/v1/AUTH_a', 'c', 'o'),
+            c.ObjectCache.key('http://b:8080/v1/AUTH_a/', 'c', 'o'))
+
+    def test_evicts_least_recently_used(self):
+        cache = c.ObjectCache(self.cache_dir)
+        for i, name in enumerate(('o1', 'o2', 'o3')):
+            key = cache.key('http://a/v1/AUTH_a', 'c', name)
+            writer = cache.writer(key, {'etag': md5(b'x' * 300).hexdigest(),
+                                        'content-length': '300'})
+            writer.write(b'x' * 300)
+            writer.commit()
+            # Make o3 the least recently used, though it was added last
+            os.utime(cache._object_path(key), (100 - i, 100 - i))
+
+        cache.max_size = 1000
+        cache.evict()
+        present = [name for name in ('o1', 'o2', 'o3') if os.path.exists(
+            cache._object_path(cache.key('http://a/v1/AUTH_a', 'c', name)))]
+        self.assertEqual(['o1', 'o2'], present)
+
+    def test_too_big_to_cache(self):
+        cache = c.ObjectCache(self.cache_dir, max_size=5)
+        self.assertIsNone(cache.writer('key', {'etag': self.etag,
+                                               'content-length': '6'}))
+        self.assertIsNone(cache.writer('key', {'etag': self.etag}))
+
+
+class TestSwiftFile(unittest.TestCase):
+
+    def setUp(self):
+        self.data = b''.join(six.int2byte(i % 251) for i in range(10000))
+        self.conn = mock.Mock()
+        self.conn.head_object.return_value = {
+            'content-length': str(len(self.data)), 'etag': 'abc'}
+        self.ranges = []
+
+        def get_object(container, obj, headers=None):
+            self.assertEqual('abc', headers['If-Match'])
+            start, end = headers['Range'][len('bytes='):].split('-')
+            self.ranges.append((int(start), int(end)))
+            return ({'content-range': 'bytes %s-%s/%d' % (
+                start, end, len(self.data))},
+                self.data[int(start):int(end) + 1])
+        self.conn.get_object.side_effect = get_object
+
+    def test_seek_and_read(self):
+        f = c.SwiftFile(self.conn, 'c', 'o', block_size=1000, readahead=0)
+        self.conn.head_object.assert_called_once_with('c', 'o', headers={})
+        self.assertTrue(f.seekable())
+        self.assertEqual(9990, f.seek(-10, io.SEEK_END))
+        self.assertEqual(self.data[-10:], f.read(100))
+        self.assertEqual(b'', f.read(100))
+        self.assertEqual(10000, f.tell())
+        self.assertEqual([(9000, 9999)], self.ranges)
+
+        f.seek(2500)
+        self.assertEqual(self.data[2500:4100], f.read(1600))
+        self.assertEqual(4200, f.seek(100, io.SEEK_CUR))
+        self.assertEqual(self.data[4200:4300], f.read(100))
+        # The missing blocks were fetched with one request, then cached
+        self.assertEqual([(9000, 9999), (2000, 4999)], self.ranges)
+        self.assertRaises(ValueError, f.seek, -1)
+
+        f.close()
+        self.assertRaises(ValueError, f.read, 1)
+
+    def test_readahead(self):
+        f = c.SwiftFile(self.conn, 'c', 'o', block_size=1000, readahead=2)
+        self.assertEqual(self.data[:500], f.read(500))
+        self.assertEqual(self.data[500:3000], f.read(2500))
+        self.assertEqual(self.data[3000:4000], f.read(1000))
+        self.assertEqual(self.data[4000:], f.read())
+        self.assertEqual([(0, 2999), (3000, 5999), (6000, 9999)],
+                         self.ranges)
+
+        # A seek isn't sequential, so doesn't read ahead
+        self.ranges = []
+        f = c.SwiftFile(self.conn, 'c', 'o', block_size=1000, readahead=2)
+        f.seek(5000)
+        self.assertEqual(self.data[5000:5010], f.read(10))
+        self.assertEqual([(5000, 5999)], self.ranges)
+
+    def test_cache_eviction(self):
+        f = c.SwiftFile(self.conn, 'c', 'o', block_size=1000,
+                        cache_blocks=2, readahead=0)
+        for offset in (0, 1000, 0, 2000, 0, 1000):
+            f.seek(offset)
+            self.assertEqual(self.data[offset:offset + 10], f.read(10))
+        # Block 1 was the least recently used when block 2 was fetched
+        self.assertEqual([(0, 999), (1000, 1999), (2000, 2999),
+                          (1000, 1999)], self.ranges)
+
+    def test_buffered_reader(self):
+        f = io.BufferedReader(c.SwiftFile(self.conn, 'c', 'o',
+                                          block_size=4096))
+        self.assertEqual(self.data, f.read())
+        self.assertEqual(1, len(self.ranges))
+
+    def test_range_ignored(self):
+        self.conn.get_object.side_effect = None
+        self.conn.get_object.return_value = ({}, self.data)
+        f = c.SwiftFile(self.conn, 'c', 'o', block_size=1000, readahead=0)
+        f.seek(1500)
+        self.assertEqual(self.data[1500:1600], f.read(100))
+
+    def test_short_body(self):
+        self.conn.get_object.side_effect = None
+        self.conn.get_object.return_value = (
+            {'content-range': 'bytes 0-999/10000'}, b'short')
+        f = c.SwiftFile(self.conn, 'c', 'o', block_size=1000)
+        self.assertRaises(c.ClientException, f.read, 10)
+
+    def test_bad_args(self):
+        self.assertRaises(ValueError, c.SwiftFile, self.conn, 'c', 'o',
+                          block_size=0)
+        self.assertRaises(ValueError, c.SwiftFile, self.conn, 'c', 'o',
+                          readahead=-1)
+
+
 class TestResponseDict(MockHttpTest):
     """
     Verify handling of optional response_dict argument.
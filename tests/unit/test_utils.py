@@ -510,6 +510,177 @@ class TestLengthWrapper(unittest.TestCase):
                 self.assertEqual(md5(s).hexdigest(), data.get_md5sum())
 
 
+class TestContentDefinedChunker(unittest.TestCase):
+
+    def setUp(self):
+        # Deterministic pseudo-random content
+        self.data = b''.join(
+            md5(six.int2byte(i % 256) + str(i).encode('ascii')).digest()
+            for i in range(16384))
+
+    def _boundaries(self, chunker, data):
+        return list(chunker.iter_boundaries(six.BytesIO(data)))
+
+    def test_sizes(self):
+        chunker = u.ContentDefinedChunker(4096)
+        self.assertEqual(1024, chunker.min_size)
+        self.assertEqual(8192, chunker.max_size)
+        # the minimum never drops below twice the hash window
+        chunker = u.ContentDefinedChunker(10)
+        self.assertEqual(64, chunker.min_size)
+        self.assertEqual(64, chunker.max_size)
+
+    def test_boundaries(self):
+        chunker = u.ContentDefinedChunker(4096)
+        boundaries = self._boundaries(chunker, self.data)
+        offset = 0
+        for start, length in boundaries:
+            self.assertEqual(offset, start)
+            self.assertLessEqual(length, chunker.max_size)
+            offset += length
+        self.assertEqual(len(self.data), offset)
+        for _start, length in boundaries[:-1]:
+            self.assertGreaterEqual(length, chunker.min_size)
+        self.assertGreater(len(boundaries), 32)
+
+        chunks = list(chunker.iter_chunks(six.BytesIO(self.data)))
+        self.assertEqual(self.data, b''.join(chunks))
+        self.assertEqual([length for _start, length in boundaries],
+                         [len(c) for c in chunks])
+
+    def test_short_and_empty(self):
+        chunker = u.ContentDefinedChunker(4096)
+        self.assertEqual([(0, 100)], self._boundaries(chunker, b'x' * 100))
+        self.assertEqual([], self._boundaries(chunker, b''))
+        self.assertEqual([], list(chunker.iter_chunks(six.BytesIO(b''))))
+
+    def test_insert_only_changes_nearby_chunks(self):
+        chunker = u.ContentDefinedChunker(4096)
+        before = set(chunker.iter_chunks(six.BytesIO(self.data)))
+        edited = self.data[:100000] + b'inserted' + self.data[100000:]
+        after = set(chunker.iter_chunks(six.BytesIO(edited)))
+        self.assertGreaterEqual(len(before & after), len(before) - 3)
+
+    def test_streamed_boundaries_match_cut_point(self):
+        chunker = u.ContentDefinedChunker(4096)
+        expected = []
+        offset = 0
+        while offset < len(self.data):
+            cut = chunker.cut_point(self.data[offset:])
+            expected.append((offset, cut))
+            offset += cut
+
+        class Reader(six.BytesIO):
+            sizes = []
+
+            def read(self, size=-1):
+                self.sizes.append(size)
+                return six.BytesIO.read(self, size)
+
+        # Scan blocks smaller than a chunk are stitched together by offset,
+        # and no read asks for more than one block
+        for block in (100, 1000, chunker.max_size * 3):
+            Reader.sizes = []
+            with mock.patch.object(chunker, '_SCAN_BLOCK', block):
+                self.assertEqual(expected, list(
+                    chunker.iter_boundaries(Reader(self.data))))
+                chunks = list(chunker.iter_chunks(Reader(self.data)))
+            self.assertEqual({block}, set(Reader.sizes))
+            self.assertEqual([length for _offset, length in expected],
+                             [len(c) for c in chunks])
+            self.assertEqual(self.data, b''.join(chunks))
+
+    def test_python_and_numpy_agree(self):
+        chunker = u.ContentDefinedChunker(4096)
+        with mock.patch.object(u, 'numpy', None):
+            python_boundaries = self._boundaries(chunker, self.data)
+        if u.numpy is None:
+            self.skipTest('numpy is not installed')
+        self.assertEqual(python_boundaries,
+                         self._boundaries(chunker, self.data))
+
+
+class TestCompression(unittest.TestCase):
+    data = b'compressible data ' * 10000
+
+    def _compress(self, codec, data=None, md5=False):
+        data = self.data if data is None else data
+        return u.CompressingIterable(six.BytesIO(data), codec,
+                                     chunk_size=1000, md5=md5)
+
+    def _decompress(self, codec, data, step):
+        decompressor = u.Decompressor(codec)
+        out = [decompressor.decompress(data[i:i + step])
+               for i in range(0, len(data), step)]
+        out.append(decompressor.flush())
+        return b''.join(out)
+
+    def test_gzip(self):
+        self.assertTrue(u.compression_available('gzip'))
+        compressed = b''.join(self._compress('gzip'))
+        self.assertLess(len(compressed), len(self.data) // 10)
+        self.assertEqual(self.data, gzip.GzipFile(
+            fileobj=six.BytesIO(compressed)).read())
+        for step in (1, 7, 1000, len(compressed)):
+            self.assertEqual(self.data,
+                             self._decompress('gzip', compressed, step))
+
+    def test_zstd(self):
+        if not u.compression_available('zstd'):
+            self.skipTest('zstandard is not installed')
+        compressed = b''.join(self._compress('zstd'))
+        self.assertLess(len(compressed), len(self.data) // 10)
+        for step in (1, 7, 1000, len(compressed)):
+            self.assertEqual(self.data,
+                             self._decompress('zstd', compressed, step))
+
+    def test_zstd_unavailable(self):
+        with mock.patch.object(u, 'zstandard', None):
+            self.assertFalse(u.compression_available('zstd'))
+            self.assertRaises(ValueError, u.CompressingIterable,
+                              six.BytesIO(b''), 'zstd')
+            self.assertRaises(ValueError, u.Decompressor, 'zstd')
+
+    def test_unknown_codec(self):
+        self.assertFalse(u.compression_available('lz4'))
+        self.assertRaises(ValueError, u.CompressingIterable,
+                          six.BytesIO(b''), 'lz4')
+        self.assertRaises(ValueError, u.Decompressor, 'lz4')
+
+    def test_md5(self):
+        compressing = self._compress('gzip', md5=True)
+        compressed = b''.join(compressing)
+        self.assertEqual(md5(compressed).hexdigest(),
+                         compressing.get_md5sum())
+        # Without md5, a noop is used
+        compressing = self._compress('gzip')
+        b''.join(compressing)
+        self.assertEqual('', compressing.get_md5sum())
+
+    def test_empty(self):
+        compressed = b''.join(self._compress('gzip', b''))
+        self.assertTrue(compressed)
+        self.assertEqual(b'', self._decompress('gzip', compressed, 7))
+
+    def test_text(self):
+        compressed = b''.join(u.CompressingIterable(
+            six.StringIO(u'text'), 'gzip'))
+        self.assertEqual(b'text', self._decompress('gzip', compressed, 7))
+
+    def test_concatenated_streams(self):
+        # e.g. the compressed segments of a large object
+        first = b''.join(self._compress('gzip', b'first '))
+        second = b''.join(self._compress('gzip', b'second'))
+        for step in (1, 5, len(first), len(first) + 1):
+            self.assertEqual(b'first second', self._decompress(
+                'gzip', first + second, step))
+
+    def test_invalid_data(self):
+        decompressor = u.Decompressor('gzip')
+        self.assertRaises(ValueError, decompressor.decompress,
+                          b'not compressed at all')
+
+
 class TestGroupers(unittest.TestCase):
     def test_n_at_a_time(self):
         result = list(u.n_at_a_time(range(100), 9))
@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+# Copyright (c) 2026 OpenStack Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Measure how swiftclient.service.interruptable_as_completed scales with the
+number of futures it tracks.
+
+Each run completes N futures and times draining them; the per-future cost
+should stay roughly flat as N grows.
+
+    python tools/bench_as_completed.py 10000 20000 40000 80000
+"""
+from __future__ import print_function
+
+import sys
+import time
+
+from concurrent.futures import Future
+
+from swiftclient.service import interruptable_as_completed
+
+
+def bench(n):
+    fs = [Future() for _ in range(n)]
+    for f in fs:
+        f.set_result(None)
+    start = time.time()
+    for _ in interruptable_as_completed(fs):
+        pass
+    return time.time() - start
+
+
+def main(argv):
+    sizes = [int(a) for a in argv] or [10000, 20000, 40000, 80000]
+    print('%10s %12s %14s' % ('futures', 'seconds', 'usec/future'))
+    for n in sizes:
+        elapsed = bench(n)
+        print('%10d %12.4f %14.3f' % (n, elapsed, elapsed * 1e6 / n))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])